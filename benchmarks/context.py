@@ -0,0 +1,11 @@
+import os
+import sys
+
+p = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# overload modules import each other relative to the app directory
+sys.path.insert(0, os.path.join(p, "overload"))
+sys.path.insert(0, p)
+
+OVERLOAD_DIR = os.path.join(p, "overload")
+TESTS_DIR = os.path.join(p, "tests")
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generates synthetic vendor MARC files used by PVF benchmarks
+
+usage:
+    python marc_generator.py output.mrc --count 10000 --dup-rate 0.05
+"""
+
+import argparse
+import random
+
+from pymarc import Record, Field
+
+
+# number of repeatable fields added to each record
+FIELD_MIXES = {
+    "brief": {"subjects": 0, "notes": 0, "series": 0},
+    "standard": {"subjects": 3, "notes": 1, "series": 1},
+    "full": {"subjects": 8, "notes": 4, "series": 2},
+}
+
+SUBJECTS = [
+    "Dragons",
+    "Detective and mystery stories",
+    "Friendship",
+    "Cooking, American",
+    "New York (N.Y.)",
+    "Graphic novels",
+    "World War, 1939-1945",
+    "Science fiction",
+    "Families",
+    "Magic",
+]
+
+
+def isbn13(rng):
+    digits = [9, 7, 8] + [rng.randint(0, 9) for _ in range(9)]
+    total = sum(d * (1 if n % 2 == 0 else 3) for n, d in enumerate(digits))
+    digits.append((10 - total % 10) % 10)
+    return "".join(str(d) for d in digits)
+
+
+def item_barcode(system, number):
+    if system == "nypl":
+        return "33333{:09d}".format(number)
+    else:
+        return "34444{:09d}".format(number)
+
+
+def make_record(
+    n, rng, system="nypl", vendor_code="BTSERIES", barcodes=1, field_mix="standard",
+    control_number=None, first_barcode=0,
+):
+    """
+    creates synthetic vendor record
+    args:
+        n: int, record number
+        rng: random.Random obj
+        system: str, nypl or bpl
+        vendor_code: str, vendor identifier coded in 901$a
+        barcodes: int, number of item fields with barcodes
+        field_mix: str, one of FIELD_MIXES keys
+        control_number: str, 001 value, generated if None
+        first_barcode: int, number of the first barcode of the record
+    returns:
+        pymarc Record obj
+    """
+    mix = FIELD_MIXES[field_mix]
+    record = Record(to_unicode=True, force_utf8=True)
+    record.leader = "00000nam a2200000 a 4500"
+    if control_number is None:
+        control_number = "bench{:08d}".format(n)
+    record.add_field(Field(tag="001", data=control_number))
+    record.add_field(Field(tag="003", data="BTSERIES"))
+    record.add_field(Field(tag="005", data="20180101120000.0"))
+    record.add_field(
+        Field(tag="008", data="180101s2018    nyu    j      000 1 eng d")
+    )
+    record.add_field(
+        Field(tag="020", indicators=[" ", " "], subfields=["a", isbn13(rng)])
+    )
+    record.add_field(
+        Field(
+            tag="040",
+            indicators=[" ", " "],
+            subfields=["a", "BTSERIES", "b", "eng", "c", "BTSERIES"],
+        )
+    )
+    record.add_field(
+        Field(
+            tag="100",
+            indicators=["1", " "],
+            subfields=["a", "Author{}, Test.".format(n % 997)],
+        )
+    )
+    record.add_field(
+        Field(
+            tag="245",
+            indicators=["1", "0"],
+            subfields=[
+                "a",
+                "Benchmark title {} :".format(n),
+                "b",
+                "a synthetic record /",
+                "c",
+                "Test Author.",
+            ],
+        )
+    )
+    record.add_field(
+        Field(
+            tag="264",
+            indicators=[" ", "1"],
+            subfields=["a", "New York :", "b", "Test Press,", "c", "2018."],
+        )
+    )
+    record.add_field(
+        Field(
+            tag="300",
+            indicators=[" ", " "],
+            subfields=["a", "{} pages ;".format(100 + n % 400), "c", "22 cm"],
+        )
+    )
+    for s in range(mix["series"]):
+        record.add_field(
+            Field(
+                tag="490",
+                indicators=["1", " "],
+                subfields=["a", "Benchmark series {} ;".format(s), "v", str(n % 50)],
+            )
+        )
+    for s in range(mix["notes"]):
+        record.add_field(
+            Field(
+                tag="500",
+                indicators=[" ", " "],
+                subfields=["a", "Synthetic note number {}.".format(s)],
+            )
+        )
+    for s in range(mix["subjects"]):
+        record.add_field(
+            Field(
+                tag="650",
+                indicators=[" ", "0"],
+                subfields=["a", rng.choice(SUBJECTS), "v", "Juvenile fiction."],
+            )
+        )
+    record.add_field(
+        Field(tag="901", indicators=[" ", " "], subfields=["a", vendor_code])
+    )
+    for b in range(barcodes):
+        barcode = item_barcode(system, first_barcode + b)
+        if system == "nypl":
+            record.add_field(
+                Field(
+                    tag="949",
+                    indicators=[" ", "1"],
+                    subfields=[
+                        "i",
+                        barcode,
+                        "l",
+                        "myj0f",
+                        "p",
+                        "12.99",
+                        "t",
+                        "101",
+                        "v",
+                        vendor_code,
+                    ],
+                )
+            )
+        else:
+            record.add_field(
+                Field(
+                    tag="960",
+                    indicators=[" ", " "],
+                    subfields=["i", barcode, "l", "13anf", "p", "12.99", "t", "100"],
+                )
+            )
+    return record
+
+
+def generate_marc_file(
+    fh, count, system="nypl", vendor_code="BTSERIES", barcodes=1,
+    field_mix="standard", dup_rate=0.0, seed=0,
+):
+    """
+    writes synthetic vendor records to a MARC file
+    args:
+        fh: str, path to the output file
+        count: int, number of records
+        system: str, nypl or bpl
+        vendor_code: str, vendor identifier coded in 901$a
+        barcodes: int, number of item barcodes per record
+        field_mix: str, one of FIELD_MIXES keys
+        dup_rate: float, share of records reusing 001 of an earlier record
+        seed: int, seed of the random generator
+    returns:
+        fh
+    """
+    rng = random.Random(seed)
+    control_numbers = []
+    with open(fh, "wb") as marcfile:
+        for n in range(count):
+            control_number = None
+            if control_numbers and rng.random() < dup_rate:
+                control_number = rng.choice(control_numbers)
+            record = make_record(
+                n,
+                rng,
+                system=system,
+                vendor_code=vendor_code,
+                barcodes=barcodes,
+                field_mix=field_mix,
+                control_number=control_number,
+                first_barcode=n * barcodes,
+            )
+            control_numbers.append(record["001"].data)
+            marcfile.write(record.as_marc())
+    return fh
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic vendor MARC file")
+    parser.add_argument("fh", help="output MARC file")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--system", choices=["nypl", "bpl"], default="nypl")
+    parser.add_argument("--vendor-code", default="BTSERIES")
+    parser.add_argument("--barcodes", type=int, default=1)
+    parser.add_argument(
+        "--field-mix", choices=sorted(FIELD_MIXES.keys()), default="standard"
+    )
+    parser.add_argument("--dup-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_marc_file(
+        args.fh,
+        args.count,
+        system=args.system,
+        vendor_code=args.vendor_code,
+        barcodes=args.barcodes,
+        field_mix=args.field_mix,
+        dup_rate=args.dup_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local mock of NYPL Platform /bibs endpoint used by PVF benchmarks;
+responses are modeled on tests/platform_test_res.json; each keyword
+is a hit or a miss depending on its checksum, so repeated runs query
+the same way
+
+usage:
+    python mock_platform.py --port 8080 --latency 0.05 --hit-ratio 0.6
+"""
+
+import argparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import copy
+import json
+import os
+from SocketServer import ThreadingMixIn
+import threading
+import time
+from urlparse import urlparse, parse_qs
+import zlib
+
+
+from context import TESTS_DIR
+
+
+TEMPLATE_RESPONSE = os.path.join(TESTS_DIR, "platform_test_res.json")
+
+# query parameters of /bibs endpoint and fields of bib they match
+QUERY_PARAMS = ("standardNumber", "controlNumber", "id")
+
+
+def keyword_checksum(keyword):
+    return zlib.crc32(keyword.encode("utf-8")) & 0xFFFFFFFF
+
+
+def is_hit(keyword, hit_ratio):
+    return keyword_checksum(keyword) % 1000 < hit_ratio * 1000
+
+
+def make_bib(template, param, keyword):
+    """
+    creates Platform bib matching keyword
+    args:
+        template: dict, Platform bib used as a model
+        param: str, query parameter
+        keyword: str
+    returns:
+        dict
+    """
+    bib = copy.deepcopy(template)
+    if param == "id":
+        bib["id"] = keyword
+    else:
+        bib["id"] = str(10000000 + keyword_checksum(keyword) % 90000000)
+    if param == "standardNumber":
+        bib["standardNumbers"] = [keyword]
+    if param == "controlNumber":
+        bib["varFields"].append(
+            {
+                "fieldTag": "o",
+                "marcTag": "001",
+                "ind1": " ",
+                "ind2": " ",
+                "content": keyword,
+                "subfields": None,
+            }
+        )
+    return bib
+
+
+class MockPlatformHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.rstrip("/").endswith("/bibs"):
+            self._respond(405, {"statusCode": 405, "type": "error"})
+            return
+
+        time.sleep(self.server.latency)
+        params = parse_qs(url.query)
+        data = []
+        for param in QUERY_PARAMS:
+            for value in params.get(param, []):
+                for keyword in value.split(","):
+                    if keyword and is_hit(keyword, self.server.hit_ratio):
+                        data.append(make_bib(self.server.template, param, keyword))
+
+        offset = int(params.get("offset", ["0"])[0])
+        limit = int(params.get("limit", ["20"])[0])
+        data = data[offset : offset + limit]
+        if data:
+            self._respond(200, {"data": data, "count": len(data), "statusCode": 200})
+        else:
+            self._respond(
+                404,
+                {
+                    "statusCode": 404,
+                    "type": "NotFoundError",
+                    "message": "No record found",
+                },
+            )
+
+    def _respond(self, code, body):
+        content = json.dumps(body)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # keep benchmark output readable
+        pass
+
+
+class MockPlatformServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded mock of Platform API
+    args:
+        port: int, 0 picks a free port
+        latency: float, seconds each request takes
+        hit_ratio: float, share of keywords found in the catalog
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, hit_ratio=0.5):
+        HTTPServer.__init__(self, ("127.0.0.1", port), MockPlatformHandler)
+        self.latency = latency
+        self.hit_ratio = hit_ratio
+        with open(TEMPLATE_RESPONSE, "r") as fh:
+            self.template = json.load(fh)["data"][0]
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Platform /bibs endpoint")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--hit-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+    server = MockPlatformServer(args.port, args.latency, args.hit_ratio)
+    print("Mock Platform listening at {}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
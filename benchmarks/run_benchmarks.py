@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+
+"""
+Offline PVF throughput benchmarks
+
+Runs cat, sel and acq NYPL pipelines of pvf.manager.run_processing
+headless against synthetic vendor files and a local mock of Platform;
+each case runs in a separate process, so peak memory is measured per case
+
+usage:
+    python run_benchmarks.py --sizes 1000 10000 --save-baseline master
+    python run_benchmarks.py --sizes 1000 10000 --compare master
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import shelve
+import subprocess
+import sys
+import tempfile
+import time
+
+
+from context import BENCHMARKS_DIR, OVERLOAD_DIR
+
+
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+DEFAULT_SIZES = [1000, 10000, 100000]
+PIPELINES = ["cat", "sel", "acq"]
+
+
+class HeadlessProgbar(dict):
+    """stands in for ttk.Progressbar"""
+
+    def update(self):
+        pass
+
+
+class HeadlessLabel:
+    """stands in for tk.StringVar"""
+
+    def set(self, value):
+        pass
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024.0 / 1024.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / 1024.0 / 1024.0
+    return peak / 1024.0
+
+
+def order_template(agent, vendor_code):
+    from datastore import NYPLOrderTemplate
+
+    return NYPLOrderTemplate(
+        tName="benchmark-{}".format(agent),
+        agent=agent,
+        acqType="p",
+        code2="a",
+        orderType="f",
+        status="1",
+        vendor=vendor_code,
+        lang="eng",
+        country="xxu",
+        internalNote="benchmark",
+        bibFormat="a",
+        match1st="020",
+        match2nd="001",
+    )
+
+
+def prepare_workdir(workdir):
+    """
+    points Overload app directory to the workdir, so benchmarks do not
+    touch user's batch data; must be called before importing Overload
+    modules
+    """
+    os.environ["USERPROFILE"] = workdir
+    os.environ.setdefault("USERNAME", "benchmark")
+    from setup_dirs import APP_DIR, TEMP_DIR, LOG_DIR
+
+    for directory in (APP_DIR, TEMP_DIR, LOG_DIR):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+def vendor_file(workdir, args, size):
+    from marc_generator import generate_marc_file
+
+    fh = os.path.join(
+        workdir,
+        "vendor-{}-{}-{}-{}-{}.mrc".format(
+            size, args.field_mix, args.barcodes, args.dup_rate, args.seed
+        ),
+    )
+    if not os.path.isfile(fh):
+        generate_marc_file(
+            fh,
+            size,
+            vendor_code=args.vendor_code,
+            barcodes=args.barcodes,
+            field_mix=args.field_mix,
+            dup_rate=args.dup_rate,
+            seed=args.seed,
+        )
+    return fh
+
+
+def run_case(args):
+    """
+    runs single pipeline on a file of given size; executed in a child
+    process
+    returns:
+        dict of results
+    """
+    prepare_workdir(args.workdir)
+    fh = vendor_file(args.workdir, args, args.size)
+
+    # rules files are referenced relative to the app directory
+    os.chdir(OVERLOAD_DIR)
+    from connectors.platform import PlatformSession
+    from mock_platform import MockPlatformServer
+    from pvf import manager
+    from setup_dirs import BATCH_META
+
+    server = MockPlatformServer(latency=args.latency, hit_ratio=args.hit_ratio)
+    server.start()
+    token = {"id": "benchmark", "expires_on": datetime.now() + timedelta(days=1)}
+    manager.open_platform_session = lambda api_name=None: PlatformSession(
+        server.url, token
+    )
+
+    output_directory = os.path.join(args.workdir, "output-{}".format(args.pipeline))
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    template = None
+    if args.pipeline in ("sel", "acq"):
+        template = order_template(args.pipeline, args.vendor_code)
+
+    start = time.time()
+    try:
+        manager.run_processing(
+            [fh],
+            "nypl",
+            "branches",
+            args.pipeline,
+            "Platform API",
+            "benchmark",
+            template,
+            output_directory,
+            HeadlessProgbar(),
+            HeadlessLabel(),
+            bypass_cache=not args.use_cache,
+        )
+    finally:
+        server.stop()
+    elapsed = time.time() - start
+
+    meta = shelve.open(BATCH_META)
+    stage_times = meta.get("stage_times", {})
+    records = meta["processed_bibs"]
+    meta.close()
+
+    return {
+        "pipeline": args.pipeline,
+        "size": args.size,
+        "records": records,
+        "seconds": elapsed,
+        "records_per_sec": records / elapsed if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_times": stage_times,
+    }
+
+
+def spawn_case(args, pipeline, size):
+    fd, result_fh = tempfile.mkstemp(suffix=".json", dir=args.workdir)
+    os.close(fd)
+    cmd = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--case",
+        pipeline,
+        str(size),
+        "--result",
+        result_fh,
+        "--workdir",
+        args.workdir,
+        "--latency",
+        str(args.latency),
+        "--hit-ratio",
+        str(args.hit_ratio),
+        "--dup-rate",
+        str(args.dup_rate),
+        "--barcodes",
+        str(args.barcodes),
+        "--field-mix",
+        args.field_mix,
+        "--vendor-code",
+        args.vendor_code,
+        "--seed",
+        str(args.seed),
+    ]
+    if args.use_cache:
+        cmd.append("--use-cache")
+    subprocess.check_call(cmd, cwd=BENCHMARKS_DIR)
+    with open(result_fh, "r") as fh:
+        result = json.load(fh)
+    os.remove(result_fh)
+    return result
+
+
+def format_result(result, baseline=None):
+    lines = [
+        "{pipeline} {size}: {records_per_sec:.1f} records/sec, "
+        "{seconds:.1f}s, peak RSS {peak}".format(
+            peak=(
+                "{:.1f} MB".format(result["peak_rss_mb"])
+                if result["peak_rss_mb"] is not None
+                else "n/a"
+            ),
+            **result
+        )
+    ]
+    if baseline is not None and baseline.get("records_per_sec"):
+        change = (result["records_per_sec"] / baseline["records_per_sec"] - 1) * 100
+        lines.append(
+            "  vs baseline: {:.1f} records/sec ({:+.1f}%)".format(
+                baseline["records_per_sec"], change
+            )
+        )
+    for name in sorted(result["stage_times"].keys()):
+        stats = result["stage_times"][name]
+        lines.append(
+            "  {}: count={}, total={:.2f}s, p50={:.4f}s, p95={:.4f}s, "
+            "max={:.4f}s".format(
+                name,
+                stats["count"],
+                stats["total"],
+                stats["p50"],
+                stats["p95"],
+                stats["max"],
+            )
+        )
+    return "\n".join(lines)
+
+
+def baseline_fh(name):
+    return os.path.join(BASELINES_DIR, "{}.json".format(name))
+
+
+def load_baseline(name):
+    with open(baseline_fh(name), "r") as fh:
+        data = json.load(fh)
+    return dict(((r["pipeline"], r["size"]), r) for r in data["results"])
+
+
+def save_baseline(name, args, results):
+    if not os.path.isdir(BASELINES_DIR):
+        os.makedirs(BASELINES_DIR)
+    data = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "latency": args.latency,
+            "hit_ratio": args.hit_ratio,
+            "dup_rate": args.dup_rate,
+            "barcodes": args.barcodes,
+            "field_mix": args.field_mix,
+            "use_cache": args.use_cache,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(baseline_fh(name), "w") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PVF throughput benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="mock Platform latency (s)"
+    )
+    parser.add_argument("--hit-ratio", type=float, default=0.5)
+    parser.add_argument("--dup-rate", type=float, default=0.02)
+    parser.add_argument("--barcodes", type=int, default=1)
+    parser.add_argument("--field-mix", default="standard")
+    parser.add_argument("--vendor-code", default="BTSERIES")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--use-cache", action="store_true", help="use match cache of queries"
+    )
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(BENCHMARKS_DIR, "workdir"),
+        help="directory of generated files and Overload app data",
+    )
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    # internal: run a single case in a child process
+    parser.add_argument("--case", nargs=2, metavar=("PIPELINE", "SIZE"))
+    parser.add_argument("--result")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.workdir = os.path.abspath(args.workdir)
+    if not os.path.isdir(args.workdir):
+        os.makedirs(args.workdir)
+
+    if args.case:
+        args.pipeline = args.case[0]
+        args.size = int(args.case[1])
+        result = run_case(args)
+        with open(args.result, "w") as fh:
+            json.dump(result, fh)
+        return
+
+    baseline = dict()
+    if args.compare:
+        baseline = load_baseline(args.compare)
+
+    results = []
+    for size in args.sizes:
+        # generated once per size, outside of measured processes
+        vendor_file(args.workdir, args, size)
+        for pipeline in args.pipelines:
+            result = spawn_case(args, pipeline, size)
+            results.append(result)
+            print(format_result(result, baseline.get((pipeline, size))))
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, args, results)
+        print("Baseline saved to {}".format(baseline_fh(args.save_baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 # general tools to read, parse, and write MARC files
 
 from pymarc import MARCReader, JSONReader, MARCWriter, Field
-from pymarc.exceptions import RecordLengthInvalid, RecordDirectoryInvalid
 from datetime import datetime
+import os
 
 
 from errors import OverloadError
+from marc_index import scan_marc_file
 from parsers import parse_isbn, parse_issn, parse_upc, parse_sierra_id
 from sierra_dicts import NBIB_DEFAULT_LOCATIONS, NYPL_BRANCHES
 
 
+# size of in-memory buffer of each output file (bytes)
+WRITER_FLUSH_SIZE = 1024 * 1024
+
+
 def read_marc21(file):
     reader = MARCReader(open(file, "r"), to_unicode=True, hide_utf8_warnings=True)
     return reader
@@ -25,6 +30,83 @@ def write_marc21(outfile, bib):
         writer.close()
 
 
+class MarcFileWriter(object):
+    """
+    Batch-scoped MARC21 writer that keeps one open handle per output file
+    for the life of a run instead of reopening the file for each record;
+    records are buffered in memory and written out when buffer of a file
+    reaches flush_size (bytes) or writer is closed; files are fsynced
+    once on close
+    args:
+        flush_size: int, buffer size of each file in bytes
+    usage:
+        with MarcFileWriter() as writer:
+            writer.write(outfile, bib)
+    """
+
+    def __init__(self, flush_size=WRITER_FLUSH_SIZE):
+        self.flush_size = flush_size
+        self._handles = dict()
+        self._buffers = dict()
+        self._buffered = dict()
+
+    def write(self, outfile, bib):
+        self.write_raw(outfile, bib.as_marc())
+
+    def write_raw(self, outfile, data):
+        """
+        writes already encoded MARC21 record
+        """
+        if outfile not in self._buffers:
+            self._buffers[outfile] = []
+            self._buffered[outfile] = 0
+        self._buffers[outfile].append(data)
+        self._buffered[outfile] += len(data)
+        if self._buffered[outfile] >= self.flush_size:
+            self._flush_file(outfile)
+
+    def _flush_file(self, outfile):
+        if not self._buffers.get(outfile):
+            return
+        if outfile not in self._handles:
+            self._handles[outfile] = open(outfile, "ab")
+        handle = self._handles[outfile]
+        handle.write(b"".join(self._buffers[outfile]))
+        handle.flush()
+        self._buffers[outfile] = []
+        self._buffered[outfile] = 0
+
+    def flush(self):
+        for outfile in list(self._buffers.keys()):
+            self._flush_file(outfile)
+
+    def sync(self):
+        """
+        writes out buffered records and forces them to disk
+        """
+        self.flush()
+        for handle in self._handles.values():
+            os.fsync(handle.fileno())
+
+    def close(self):
+        try:
+            self.flush()
+            for handle in self._handles.values():
+                os.fsync(handle.fileno())
+        finally:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = dict()
+            self._buffers = dict()
+            self._buffered = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 def read_marc_in_json(data):
     reader = JSONReader(data)
     return reader
@@ -167,167 +249,151 @@ def create_controlfield(tag, data):
 
 
 def count_bibs(file):
-    reader = read_marc21(file)
-    bib_count = 0
-    try:
-        for bib in reader:
-            bib_count += 1
-        return bib_count
-    except RecordLengthInvalid:
-        raise OverloadError(
-            "Attempted to process non-MARC file,\n"
-            "or invalid MARC file: {}".format(file)
-        )
-    except UnicodeDecodeError:
-        raise OverloadError(
-            "Character encoding error in file:\n{}\n"
-            "Please convert character encoding to UTF-8\n"
-            "using MARCEdit program.".format(file)
-        )
-    except RecordDirectoryInvalid:
-        raise OverloadError(
-            "Encountered malformed MARC record directory\n"
-            'in file "{}".\nUse MARCEdit to identify '
-            "incorrect record.".format(file)
-        )
-
-
-def db_template_to_960(template, vendor_960):
-    """"passed attr must be an instance of NYPLOrderTemplate"""
-
-    # order fixed fields mapping
-    try:
-        vsub = vendor_960.subfields
-        # subfields present on the vendor record
-        ven_subs = set([vsub[x] for x in range(0, len(vsub), 2)])
-
-    except AttributeError:
-        vsub = []
-        ven_subs = set()
-
-    # list of relevalnt to PVR subfields of 960
-    pvr_subs = set(["a", "b", "c", "d", "e", "f", "g", "h", "i", "m", "v", "w", "x"])
-
-    # find extra subfields to be carried over to the new field
-    nsub = []
-    diff_subs = ven_subs - pvr_subs
-    for s in diff_subs:
-        nsub.extend([vsub[vsub.index(s)], vsub[vsub.index(s) + 1]])
-
-    # create list of subfield codes without subfield data as index
-    vinx = [vsub[x] if x % 2 == 0 else None for x in range(0, len(vsub))]
-
-    # use template values if provided else use original if exists
-    try:
-        if template.acqType:
-            nsub.extend(["a", template.acqType])
-        else:
-            nsub.extend(["a", vsub[vinx.index("a") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.claim:
-            nsub.extend(["b", template.claim])
-        else:
-            nsub.extend(["b", vsub[vinx.index("b") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.code1:
-            nsub.extend(["c", template.code1])
-        else:
-            nsub.extend(["c", vsub[vinx.index("c") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.code2:
-            nsub.extend(["d", template.code2])
-        else:
-            nsub.extend(["d", vsub[vinx.index("d") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.code3:
-            nsub.extend(["e", template.code3])
-        else:
-            nsub.extend(["e", vsub[vinx.index("e") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.code4:
-            nsub.extend(["f", template.code4])
-        else:
-            nsub.extend(["f", vsub[vinx.index("f") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.form:
-            nsub.extend(["g", template.form])
-        else:
-            nsub.extend(["g", vsub[vinx.index("g") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.orderNote:
-            nsub.extend(["h", template.orderNote])
-        else:
-            nsub.extend(["h", vsub[vinx.index("h") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.orderType:
-            nsub.extend(["i", template.orderType])
-        else:
-            nsub.extend(["i", vsub[vinx.index("i") + 1]])
-    except ValueError:
-        pass
+    """
+    counts records in MARC21 file using leader-only pre-flight scan
+    args:
+        file: str, path to MARC21 file
+    returns:
+        bib_count: int
+    """
+    scan = scan_marc_file(file)
+    if scan.errors:
+        position, error = scan.errors[0]
+        if error == "length":
+            raise OverloadError(
+                "Attempted to process non-MARC file,\n"
+                "or invalid MARC file: {}".format(file)
+            )
+        elif error == "encoding":
+            raise OverloadError(
+                "Character encoding error in file:\n{}\n"
+                "Please convert character encoding to UTF-8\n"
+                "using MARCEdit program.".format(file)
+            )
+        elif error == "directory":
+            raise OverloadError(
+                "Encountered malformed MARC record directory\n"
+                'in file "{}".\nUse MARCEdit to identify '
+                "incorrect record.".format(file)
+            )
+    return scan.count
+
+
+# PVR-relevant subfields of order fields in the order they are
+# coded and NYPLOrderTemplate attributes they are populated from
+ORDER_960_SUBFIELDS = (
+    ("a", "acqType"),
+    ("b", "claim"),
+    ("c", "code1"),
+    ("d", "code2"),
+    ("e", "code3"),
+    ("f", "code4"),
+    ("g", "form"),
+    ("h", "orderNote"),
+    ("i", "orderType"),
+    ("m", "status"),
+    ("v", "vendor"),
+    ("w", "lang"),
+    ("x", "country"),
+)
+
+ORDER_961_SUBFIELDS = (
+    ("a", "identity"),
+    ("c", "generalNote"),
+    ("d", "internalNote"),
+    ("e", "oldOrdNo"),
+    ("f", "selector"),
+    ("g", "venAddr"),
+    ("h", "venNote"),
+    ("m", "blanketPO"),
+    ("i", "venTitleNo"),
+    ("j", "paidNote"),
+    ("k", "shipTo"),
+    ("l", "requestor"),
+)
+
+
+class OrderTemplatePlan(object):
+    """
+    Merge plan of an order template and vendor order field (960 or 961)
+    compiled once per batch; subfields outside of the PVR set are
+    carried over from the vendor field first, followed by PVR subfields
+    forced from the template or, when the template leaves them empty,
+    taken from the vendor field
+    args:
+        tag: str, 960 or 961
+        template: instance of NYPLOrderTemplate
+        subfields: tuple of (subfield code, template attribute) pairs
+    """
 
-    try:
-        if template.status:
-            nsub.extend(["m", template.status])
+    def __init__(self, tag, template, subfields):
+        self.tag = tag
+        self.pvr_subs = frozenset([code for code, attr in subfields])
+        # template value or None if vendor data should be kept
+        self.plan = []
+        for code, attr in subfields:
+            value = getattr(template, attr)
+            if not value:
+                value = None
+            self.plan.append((code, value))
+
+    def apply(self, vendor_field):
+        """
+        combines vendor and template data in a new order field
+        args:
+            vendor_field: pymarc Field obj or None
+        returns:
+            None (no data coded in the field)
+            field (pymarc Field object)
+        """
+        try:
+            vsub = vendor_field.subfields
+        except AttributeError:
+            vsub = []
+
+        # single pass over vendor subfields; only first occurrence
+        # of each subfield is considered
+        ven_data = dict()
+        nsub = []
+        for code, value in zip(vsub[0::2], vsub[1::2]):
+            if code in ven_data:
+                continue
+            ven_data[code] = value
+            if code not in self.pvr_subs:
+                nsub.extend([code, value])
+
+        for code, value in self.plan:
+            if value is not None:
+                nsub.extend([code, value])
+            elif code in ven_data:
+                nsub.extend([code, ven_data[code]])
+
+        if nsub == []:
+            field = None
         else:
-            nsub.extend(["m", vsub[vinx.index("m") + 1]])
-    except ValueError:
-        pass
+            field = Field(tag=self.tag, indicators=[" ", " "], subfields=nsub)
 
-    try:
-        if template.vendor:
-            nsub.extend(["v", template.vendor])
-        else:
-            nsub.extend(["v", vsub[vinx.index("v") + 1]])
-    except ValueError:
-        pass
+        return field
 
-    try:
-        if template.lang:
-            nsub.extend(["w", template.lang])
-        else:
-            nsub.extend(["w", vsub[vinx.index("w") + 1]])
-    except ValueError:
-        pass
 
-    try:
-        if template.country:
-            nsub.extend(["x", template.country])
-        else:
-            nsub.extend(["x", vsub[vinx.index("x") + 1]])
-    except ValueError:
-        pass
+def order_template_plans(template):
+    """
+    compiles order template into 960 and 961 merge plans
+    args:
+        template: instance of NYPLOrderTemplate
+    returns:
+        tuple of OrderTemplatePlan objs (960 plan, 961 plan)
+    """
+    return (
+        OrderTemplatePlan("960", template, ORDER_960_SUBFIELDS),
+        OrderTemplatePlan("961", template, ORDER_961_SUBFIELDS),
+    )
 
-    if nsub == []:
-        field = None
-    else:
-        field = Field(tag="960", indicators=[" ", " "], subfields=nsub)
 
-    return field
+def db_template_to_960(template, vendor_960):
+    """"passed attr must be an instance of NYPLOrderTemplate"""
+    plan = OrderTemplatePlan("960", template, ORDER_960_SUBFIELDS)
+    return plan.apply(vendor_960)
 
 
 def db_template_to_961(template, vendor_961):
@@ -339,132 +405,8 @@ def db_template_to_961(template, vendor_961):
     returns:
         None (no data coded in the 961)
         field (pymarc Field object)"""
-
-    # order variable fields
-    try:
-        vsub = vendor_961.subfields
-        # subfields present on the vendor record
-        ven_subs = set([vsub[x] for x in range(0, len(vsub), 2)])
-    except AttributeError:
-        vsub = []
-        ven_subs = set()
-
-    # list of relevalnt to PVR subfields of 960
-    pvr_subs = set(["a", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m"])
-
-    # find extra subfield to be carried over to the new field
-    nsub = []
-    diff_subs = ven_subs - pvr_subs
-
-    for s in diff_subs:
-        nsub.extend([vsub[vsub.index(s)], vsub[vsub.index(s) + 1]])
-
-    # create list of subfield codes without subfield data as index
-    vinx = [vsub[x] if x % 2 == 0 else None for x in range(0, len(vsub))]
-
-    # apply from template if provided, else keep the vendor data
-    try:
-        if template.identity:
-            nsub.extend(["a", template.identity])
-        else:
-            nsub.extend(["a", vsub[vinx.index("a") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.generalNote:
-            nsub.extend(["c", template.generalNote])
-        else:
-            nsub.extend(["c", vsub[vinx.index("c") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.internalNote:
-            nsub.extend(["d", template.internalNote])
-        else:
-            nsub.extend(["d", vsub[vinx.index("d") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.oldOrdNo:
-            nsub.extend(["e", template.oldOrdNo])
-        else:
-            nsub.extend(["e", vsub[vinx.index("e") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.selector:
-            nsub.extend(["f", template.selector])
-        else:
-            nsub.extend(["f", vsub[vinx.index("f") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.venAddr:
-            nsub.extend(["g", template.venAddr])
-        else:
-            nsub.extend(["g", vsub[vinx.index("g") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.venNote:
-            nsub.extend(["h", template.venNote])
-        else:
-            nsub.extend(["h", vsub[vinx.index("h") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.blanketPO:
-            nsub.extend(["m", template.blanketPO])
-        else:
-            nsub.extend(["m", vsub[vinx.index("m") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.venTitleNo:
-            nsub.extend(["i", template.venTitleNo])
-        else:
-            nsub.extend(["i", vsub[vinx.index("i") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.paidNote:
-            nsub.extend(["j", template.paidNote])
-        else:
-            nsub.extend(["j", vsub[vinx.index("j") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.shipTo:
-            nsub.extend(["k", template.shipTo])
-        else:
-            nsub.extend(["k", vsub[vinx.index("k") + 1]])
-    except ValueError:
-        pass
-
-    try:
-        if template.requestor:
-            nsub.extend(["l", template.requestor])
-        else:
-            nsub.extend(["l", vsub[vinx.index("l") + 1]])
-    except ValueError:
-        pass
-
-    if nsub == []:
-        field = None
-    else:
-        field = Field(tag="961", indicators=[" ", " "], subfields=nsub)
-
-    return field
+    plan = OrderTemplatePlan("961", template, ORDER_961_SUBFIELDS)
+    return plan.apply(vendor_961)
 
 
 def db_template_to_949(mat_format):
@@ -479,15 +421,46 @@ def create_command_line_field(command):
     return field
 
 
-class BibMeta:
+class BibMeta(object):
     """
-    creates a general record meta object
+    creates a general record meta object;
+    fields of the record are read in a single pass and routed to
+    handlers by their tag
     args:
         bib obj (pymarc)
         sierraId str
     """
 
+    __slots__ = (
+        "t001",
+        "t003",
+        "t005",
+        "t020",
+        "t022",
+        "t024",
+        "t028",
+        "t336",
+        "t901",
+        "t947",
+        "sierraId",
+        "title",
+        "bCallNumber",
+        "rCallNumber",
+    )
+
+    # tags of which only the first occurance is considered
+    _first_only = frozenset(
+        ["001", "003", "005", "049", "091", "099", "907", "945"]
+    )
+
     def __init__(self, bib, sierraId=None):
+        self._read(bib, sierraId)
+
+    def _read(self, bib, sierraId):
+        """
+        sets general attributes; returns scratch dictionary of
+        the fields pass for use by subclasses
+        """
         self.t001 = None
         self.t003 = None
         self.t005 = None
@@ -503,75 +476,110 @@ class BibMeta:
         self.bCallNumber = None
         self.rCallNumber = []
 
+        scratch = self._parse_fields(bib)
+        self._finish(scratch)
+
+        self.title = bib.title()
+        return scratch
+
+    def _parse_fields(self, bib):
+        """
+        walks record fields once; returns scratch dictionary with
+        first occurances of selected tags and data collected by handlers
+        """
+        handlers = self._handlers
+        first_only = self._first_only
+        scratch = dict()
+        for field in bib.fields:
+            tag = field.tag
+            if tag in first_only:
+                if tag not in scratch:
+                    scratch[tag] = field
+            else:
+                handler = handlers.get(tag)
+                if handler is not None:
+                    handler(self, field, scratch)
+        return scratch
+
+    def _finish(self, scratch):
         # parse 001 field (control field)
-        if "001" in bib:
-            self.t001 = bib["001"].data
+        if "001" in scratch:
+            self.t001 = scratch["001"].data
 
         # parse 003 field (control number identifier)
-        if "003" in bib:
-            self.t003 = bib["003"].data
+        if "003" in scratch:
+            self.t003 = scratch["003"].data
 
         # parse 005 field (version date)
-        if "005" in bib:
+        if "005" in scratch:
             try:
-                self.t005 = datetime.strptime(bib["005"].data, "%Y%m%d%H%M%S.%f")
+                self.t005 = datetime.strptime(
+                    scratch["005"].data, "%Y%m%d%H%M%S.%f"
+                )
             except ValueError:
                 pass
 
-        for field in bib.get_fields("020"):
-            for subfield in field.get_subfields("a"):
-                isbn = parse_isbn(subfield)
-                if isbn is not None:
-                    self.t020.append(isbn)
-
-        for field in bib.get_fields("022"):
-            for subfield in field.get_subfields("a"):
-                issn = parse_issn(subfield)
-                if issn is not None:
-                    self.t022.append(issn)
-
-        for field in bib.get_fields("024"):
-            for subfield in field.get_subfields("a"):
-                upc = parse_upc(subfield)
-                if upc is not None:
-                    self.t024.append(upc)
-
-        for field in bib.get_fields("028"):
-            for subfield in field.get_subfields("a"):
-                upc = parse_upc(subfield)
-                if upc is not None:
-                    self.t028.append(upc)
-
-        for field in bib.get_fields("336"):
-            for subfield in field.get_subfields("a"):
-                self.t336.append(subfield)
-
-        for field in bib.get_fields("901"):
-            self.t901.append(field.value())
-
-        for field in bib.get_fields("947"):
-            self.t947.append(field.value())
-
         # parse Sierra number
         if self.sierraId is None:
-            if "907" in bib:
-                self.sierraId = parse_sierra_id(bib.get_fields("907")[0].value())
-            elif "945" in bib:
-                self.sierraId = parse_sierra_id(bib.get_fields("945")[0].value())
+            if "907" in scratch:
+                self.sierraId = parse_sierra_id(scratch["907"].value())
+            elif "945" in scratch:
+                self.sierraId = parse_sierra_id(scratch["945"].value())
 
         # parse branches call number
-        if "099" in bib:
-            self.bCallNumber = bib.get_fields("099")[0].value()
-        elif "091" in bib:
-            self.bCallNumber = bib.get_fields("091")[0].value()
-
+        if "099" in scratch:
+            self.bCallNumber = scratch["099"].value()
+        elif "091" in scratch:
+            self.bCallNumber = scratch["091"].value()
+
+    def _parse_020(self, field, scratch):
+        for subfield in field.get_subfields("a"):
+            isbn = parse_isbn(subfield)
+            if isbn is not None:
+                self.t020.append(isbn)
+
+    def _parse_022(self, field, scratch):
+        for subfield in field.get_subfields("a"):
+            issn = parse_issn(subfield)
+            if issn is not None:
+                self.t022.append(issn)
+
+    def _parse_024(self, field, scratch):
+        for subfield in field.get_subfields("a"):
+            upc = parse_upc(subfield)
+            if upc is not None:
+                self.t024.append(upc)
+
+    def _parse_028(self, field, scratch):
+        for subfield in field.get_subfields("a"):
+            upc = parse_upc(subfield)
+            if upc is not None:
+                self.t028.append(upc)
+
+    def _parse_336(self, field, scratch):
+        self.t336.extend(field.get_subfields("a"))
+
+    def _parse_901(self, field, scratch):
+        self.t901.append(field.value())
+
+    def _parse_947(self, field, scratch):
+        self.t947.append(field.value())
+
+    def _parse_852(self, field, scratch):
         # parese research call numbers
-        if "852" in bib:
-            for field in bib.get_fields("852"):
-                if field.indicators[0] == "8":
-                    self.rCallNumber.append(field.value())
-
-        self.title = bib.title()
+        if field.indicators[0] == "8":
+            self.rCallNumber.append(field.value())
+
+    _handlers = {
+        "020": _parse_020,
+        "022": _parse_022,
+        "024": _parse_024,
+        "028": _parse_028,
+        "336": _parse_336,
+        "852": _parse_852,
+        "901": _parse_901,
+        "947": _parse_947,
+    }
 
     def __repr__(self):
         return (
@@ -604,23 +612,32 @@ class VendorBibMeta(BibMeta):
         dstLibrary str ('research' or 'branches')
     """
 
+    __slots__ = ("vendor", "dstLibrary", "barcodes")
+
     def __init__(self, bib, vendor=None, dstLibrary=None):
-        BibMeta.__init__(self, bib)
+        scratch = self._read(bib, None)
         self.vendor = vendor
         self.dstLibrary = dstLibrary
-        self.barcodes = []
 
+        # NYPL item records first, then BPL item records
+        self.barcodes = scratch.get("949", []) + scratch.get("960", [])
+
+    def _parse_949(self, field, scratch):
         # NYPL item records
-        for tag in bib.get_fields("949"):
-            if tag.indicators == [" ", "1"]:
-                for barcode in tag.get_subfields("i"):
-                    self.barcodes.append(str(barcode))
+        if field.indicators == [" ", "1"]:
+            scratch.setdefault("949", []).extend(
+                [str(barcode) for barcode in field.get_subfields("i")]
+            )
 
+    def _parse_960(self, field, scratch):
         # BPL item records
-        for tag in bib.get_fields("960"):
-            if tag.indicators == [" ", " "]:
-                for barcode in tag.get_subfields("i"):
-                    self.barcodes.append(str(barcode))
+        if field.indicators == [" ", " "]:
+            scratch.setdefault("960", []).extend(
+                [str(barcode) for barcode in field.get_subfields("i")]
+            )
+
+    _handlers = BibMeta._handlers.copy()
+    _handlers.update({"949": _parse_949, "960": _parse_960})
 
     def __repr__(self):
         return (
@@ -657,32 +674,39 @@ class InhouseBibMeta(BibMeta):
         location list
     """
 
+    __slots__ = ("catSource", "ownLibrary")
+
     def __init__(self, bib, sierraId=None, locations=[]):
-        BibMeta.__init__(self, bib)
+        scratch = self._read(bib, None)
         if sierraId is not None:
             self.sierraId = sierraId
         self.catSource = "vendor"
-        self.ownLibrary = self._determine_ownLibrary(bib, locations)
+        self.ownLibrary = self._determine_ownLibrary(scratch, locations)
 
         # source of cataloging
         # check 049 code to determine library
-        if "049" in bib:
-            field = bib.get_fields("049")[0]["a"]
+        if "049" in scratch:
+            field = scratch["049"]["a"]
             if "BKLA" in field:  # BPL
                 if self.t001 is not None:
                     if self.t001[0] == "o" and self.t003 == "OCoLC":
                         self.catSource = "inhouse"
             elif "NYPP" in field:  # NYPL
-                if "901" in bib:
-                    fields = bib.get_fields("901")
-                    for field in fields:
-                        if "b" in field:
-                            subfield = field["b"][0]
-                            if "CAT" in subfield:
-                                self.catSource = "inhouse"
-                                break
-
-    def _determine_ownLibrary(self, bib, locations):
+                for field in scratch.get("901", []):
+                    if "b" in field:
+                        subfield = field["b"][0]
+                        if "CAT" in subfield:
+                            self.catSource = "inhouse"
+                            break
+
+    def _parse_901(self, field, scratch):
+        BibMeta._parse_901(self, field, scratch)
+        scratch.setdefault("901", []).append(field)
+
+    _handlers = BibMeta._handlers.copy()
+    _handlers.update({"901": _parse_901})
+
+    def _determine_ownLibrary(self, scratch, locations):
         # owning library
         # for nypl check also locations
 
@@ -696,13 +720,11 @@ class InhouseBibMeta(BibMeta):
             rl = True
 
         # full bib scenario
-        if "091" in bib or "099" in bib:
+        if "091" in scratch or "099" in scratch:
             bl = True
-        if "852" in bib:
-            for field in bib.get_fields("852"):
-                if field.indicators[0] == "8":
-                    rl = True
-                    break
+        # 852 with first indicator "8"
+        if self.rCallNumber:
+            rl = True
 
         # explicit NYPL locations
         rl_my_locs = ["myd", "myh", "mym", "myt"]
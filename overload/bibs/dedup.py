@@ -1,6 +1,8 @@
 import logging
 
-from bibs import read_marc21, write_marc21, BibMeta
+from bibs import MarcFileWriter
+from marc_index import MarcIndex
+from raw_marc import RawRecord
 from logging_setup import LogglyAdapter
 
 
@@ -18,63 +20,67 @@ def _find_duplicates(indices):
     """
 
     indices_organized = dict()
-    skip_bibs = []
-    for k, v in indices.iteritems():
-        d = []
-        for n, m in indices.iteritems():
-            if m is not None and m == v:
-                d.append(n)
-        indices_organized[v] = d
+    for n, t001 in sorted(indices.iteritems()):
+        if t001 is not None:
+            indices_organized.setdefault(t001, []).append(n)
 
     dups = dict()
-    for k, v in indices_organized.iteritems():
-        if len(v) > 1:
-            dups[k] = v
-            skip_bibs.extend(v)
+    skip_bibs = []
+    for t001, positions in indices_organized.iteritems():
+        if len(positions) > 1:
+            dups[t001] = positions
+            skip_bibs.extend(positions)
     return dups, sorted(skip_bibs)
 
 
-def merge_bibs_combine_items(file, bib_list):
+def _combine_items(records):
+    """
+    merges records using the first one as a base and copying
+    item tags (949 NYPL, 960 BPL) of the following ones to it
+    args:
+        records: list of pymarc Record objs
+    returns:
+        merged record
+    """
+    new_record = records[0]
+    for record in records[1:]:
+        # NYPL
+        tags = record.get_fields('949')
+        for tag in tags:
+            if tag.indicators == [' ', '1']:
+                new_record.add_ordered_field(tag)
+        # BPL
+        tags = record.get_fields('960')
+        for tag in tags:
+            if tag.indicators == [' ', ' ']:
+                new_record.add_ordered_field(tag)
+    return new_record
+
+
+def merge_bibs_combine_items(file, bib_list, index=None):
     """
     merges bibs in bib_list and combines their item record tags
     args:
-        file, bib_list
+        file: string, marc file handle
+        bib_list: list of record positions in the file
+        index: MarcIndex obj of the file (optional)
     returns:
         merged record, number of combined bibs
     """
 
-    reader = read_marc21(file)
-    counter = -1
-    dedup_add = 0
-    for record in reader:
-        counter += 1
-        if counter == bib_list[0]:
-            # use first record in file as a base
-            new_record = record
-            dedup_add += 1
-        elif counter in bib_list:
-            # for the following dups copy item 949 and
-            # add to merged record
-            dedup_add += 1
-
-            # NYPL
-            tags = record.get_fields('949')
-            for tag in tags:
-                if tag.indicators == [' ', '1']:
-                    new_record.add_ordered_field(tag)
-            # BPL
-            tags = record.get_fields('960')
-            for tag in tags:
-                if tag.indicators == [' ', ' ']:
-                    new_record.add_ordered_field(tag)
-
-    return new_record, dedup_add
+    if index is None:
+        index = MarcIndex(file, persist=False)
+    records = list(index.iter_records(bib_list))
+
+    return _combine_items(records), len(records)
 
 
 def dedup_marc_file(file, progbar=None):
     """
     Dedups records in a processed file based on the 001 tag (control field);
-    combies 949 item tags on merged bibs
+    combies 949 item tags on merged bibs;
+    the file is indexed once, unique records are then copied without
+    decoding and merged records are read directly from their offsets
     args:
         file: string, marc file handle
         progbar: instance of ttk.Progressbar
@@ -87,22 +93,25 @@ def dedup_marc_file(file, progbar=None):
     module_logger.debug('Deduping processed file {}'.format(
         file))
 
-    reader = read_marc21(file)
+    # processed file is temporary, do not save its index
+    index = MarcIndex(file, persist=False)
     c = 0
     indices = dict()
-    for record in reader:
-        meta = BibMeta(record)
-        indices[c] = meta.t001
+    # only 001 is needed, records are not decoded with pymarc
+    for data in index.iter_raw():
+        record = RawRecord(data)
+        if '001' in record:
+            indices[c] = record['001'].data
+        else:
+            indices[c] = None
         c += 1
 
     dups, skip_bibs = _find_duplicates(indices)
-    # print skip_bibs
-    # print dups
     dedup_count = 0
     fh_deduped = None
 
     if progbar is not None:
-        progbar['maximum'] = c + (c * len(dups))
+        progbar['maximum'] = c + len(dups)
         n = 0
         progbar['value'] = n
         progbar.update()
@@ -116,30 +125,31 @@ def dedup_marc_file(file, progbar=None):
         fh_deduped = file[:-4] + '-DEDUPED.mrc'
 
         # save files that do not have duplicates
+        skip_bibs = set(skip_bibs)
         n = 0
-        reader = read_marc21(file)
-        dedup_count = 0
-        for record in reader:
-            if n not in skip_bibs:
-                write_marc21(fh_deduped, record)
-            n += 1
-            if progbar is not None:
-                progbar['value'] = n
-
-        for key, bib_list in dups.iteritems():
-            n += (c * len(bib_list))
-            new_record, dedup_add = merge_bibs_combine_items(
-                file, bib_list)
-
-            # add to deduped count
-            dedup_count += dedup_add
-
-            # save new merged record
-            write_marc21(fh_deduped, new_record)
-
-            if progbar is not None:
-                progbar['value'] = n
-                progbar.update()
+        with MarcFileWriter() as writer:
+            for data in index.iter_raw():
+                if n not in skip_bibs:
+                    writer.write_raw(fh_deduped, data)
+                n += 1
+                if progbar is not None:
+                    progbar['value'] = n
+
+            # merged records in order of their first occurance
+            for bib_list in sorted(dups.values()):
+                n += 1
+                new_record, dedup_add = merge_bibs_combine_items(
+                    file, bib_list, index)
+
+                # add to deduped count
+                dedup_count += dedup_add
+
+                # save new merged record
+                writer.write(fh_deduped, new_record)
+
+                if progbar is not None:
+                    progbar['value'] = n
+                    progbar.update()
 
         module_logger.debug(
             'Merged {} duplicate bibs into {} in file {}'.format(
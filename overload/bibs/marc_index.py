@@ -0,0 +1,226 @@
+# byte offset index of records in MARC21 files
+
+import json
+import logging
+import os
+
+from pymarc import Record
+from pymarc.exceptions import RecordLengthInvalid
+
+
+from logging_setup import LogglyAdapter
+
+
+module_logger = LogglyAdapter(logging.getLogger('overload'), None)
+
+
+# extension of index files saved next to indexed MARC files
+INDEX_EXT = '.idx'
+
+
+def iter_raw_records(file):
+    """
+    reads MARC21 file record by record without decoding them;
+    record lengths are taken from the ISO 2709 leader
+    args:
+        file: string, marc file handle
+    yields:
+        tuples (offset, data) where offset is a record position in bytes
+        and data is raw MARC21 record
+    """
+    with open(file, 'rb') as marcfile:
+        offset = 0
+        while True:
+            first5 = marcfile.read(5)
+            if not first5:
+                break
+            if len(first5) < 5:
+                raise RecordLengthInvalid
+            try:
+                length = int(first5)
+            except ValueError:
+                raise RecordLengthInvalid
+            if length < 24:
+                raise RecordLengthInvalid
+            data = first5 + marcfile.read(length - 5)
+            yield offset, data
+            offset += len(data)
+
+
+class MarcFileScan:
+    """
+    Results of pre-flight scan of a MARC21 file
+    args:
+        file: str, path to MARC21 file
+    attributes:
+        count: int, number of records
+        errors: list of tuples (position, error) in order they were
+                found; error is one of 'length', 'directory', 'encoding'
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+        self.errors = []
+
+    def positions(self, error):
+        return [n for n, e in self.errors if e == error]
+
+    def __repr__(self):
+        return '<MarcFileScan(file={}, count={}, errors={})>'.format(
+            self.file, self.count, self.errors)
+
+
+def _directory_valid(data):
+    # mirrors checks pymarc performs when decoding record directory
+    if len(data) < 24:
+        return False
+    try:
+        base_address = int(data[12:17])
+    except ValueError:
+        return False
+    if base_address <= 24 or base_address >= len(data):
+        return False
+    directory = data[24:base_address - 1]
+    if len(directory) % 12 != 0:
+        return False
+    for n in range(0, len(directory), 12):
+        if not directory[n + 3:n + 12].isdigit():
+            return False
+    return True
+
+
+def scan_marc_file(file):
+    """
+    checks structure of MARC21 file without decoding records;
+    reads record lengths from leaders and verifies record terminators,
+    directories and UTF-8 encoding of records flagged as Unicode
+    (leader position 9 'a'); scanning stops on malformed record length
+    since following records can not be located
+    args:
+        file: str, path to MARC21 file
+    returns:
+        MarcFileScan obj
+    """
+    scan = MarcFileScan(file)
+    try:
+        for offset, data in iter_raw_records(file):
+            n = scan.count
+            scan.count += 1
+            if data[-1:] != b'\x1d':
+                scan.errors.append((n, 'length'))
+                break
+            if not _directory_valid(data):
+                scan.errors.append((n, 'directory'))
+                continue
+            if data[9:10] == b'a':
+                try:
+                    data.decode('utf-8')
+                except UnicodeDecodeError:
+                    scan.errors.append((n, 'encoding'))
+    except RecordLengthInvalid:
+        scan.errors.append((scan.count, 'length'))
+    return scan
+
+
+def decode_record(data):
+    # same decoding settings as bibs.read_marc21
+    return Record(data=data, to_unicode=True, hide_utf8_warnings=True)
+
+
+class MarcIndex:
+    """
+    Index of byte offsets and lengths of records in a MARC21 file
+    allowing to read record N without scanning the file from the start;
+    the index is saved next to the file and reused as long as the file
+    size and modification time did not change
+    args:
+        file: str, path to MARC21 file
+        persist: boolean, save index next to the file
+    """
+
+    def __init__(self, file, persist=True):
+        self.file = file
+        self.fh_index = file + INDEX_EXT
+        self.persist = persist
+        self.offsets = []
+        self.lengths = []
+        if not (persist and self._load()):
+            self.build()
+
+    def _file_stamp(self):
+        stat = os.stat(self.file)
+        return stat.st_size, stat.st_mtime
+
+    def _load(self):
+        try:
+            with open(self.fh_index, 'r') as idx:
+                data = json.load(idx)
+        except (IOError, ValueError):
+            return False
+        size, mtime = self._file_stamp()
+        if data.get('size') != size or data.get('mtime') != mtime:
+            module_logger.debug(
+                'Stale MARC index of file {}.'.format(self.file))
+            return False
+        self.offsets = data['offsets']
+        self.lengths = data['lengths']
+        return True
+
+    def build(self):
+        module_logger.debug('Indexing MARC file {}.'.format(self.file))
+        self.offsets = []
+        self.lengths = []
+        for offset, data in iter_raw_records(self.file):
+            self.offsets.append(offset)
+            self.lengths.append(len(data))
+        if self.persist:
+            self.save()
+
+    def save(self):
+        size, mtime = self._file_stamp()
+        try:
+            with open(self.fh_index, 'w') as idx:
+                json.dump(
+                    {'size': size, 'mtime': mtime,
+                     'offsets': self.offsets, 'lengths': self.lengths},
+                    idx)
+        except (IOError, OSError) as e:
+            # index is still usable in memory
+            module_logger.warning(
+                'Unable to save MARC index of file {}. Error: {}'.format(
+                    self.file, e))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def iter_raw(self, positions=None):
+        """
+        yields raw MARC21 records at given positions
+        args:
+            positions: list of record positions, all records if None
+        """
+        if positions is None:
+            positions = range(len(self.offsets))
+        with open(self.file, 'rb') as marcfile:
+            for n in positions:
+                marcfile.seek(self.offsets[n])
+                yield marcfile.read(self.lengths[n])
+
+    def get_raw(self, n):
+        return next(self.iter_raw([n]))
+
+    def iter_records(self, positions=None):
+        """
+        yields pymarc Record objs at given positions in the given order
+        args:
+            positions: list of record positions, all records if None
+        """
+        for data in self.iter_raw(positions):
+            yield decode_record(data)
+
+    def get_record(self, n):
+        """
+        returns pymarc Record obj at position n (counted from 0)
+        """
+        return decode_record(self.get_raw(n))
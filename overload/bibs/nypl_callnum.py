@@ -1,5 +1,4 @@
 from datetime import date
-import json
 
 # module general call number rules
 from pymarc import Field
@@ -17,6 +16,10 @@ from parsers import (
     is_fiction,
     get_audience_code,
 )
+from rules_cache import load_rules, load_json
+
+
+RECAP_CODES = "./rules/nyp_recap_codes.json"
 
 
 def remove_special_characters(data):
@@ -251,8 +254,7 @@ def create_nypl_recap_callnum(recap_no=None):
 def create_nypl_recap_item(order_data, recap_no=None):
     callNum = recap_call(recap_no)
 
-    settings_data = open("./rules/nyp_recap_codes.json", "r")
-    settings_dict = json.load(settings_data)
+    settings_dict = load_rules(RECAP_CODES, load_json, RECAP_CODES)
     recap_codes = settings_dict["ReCAP"]
 
     # determine correct codes based on order data
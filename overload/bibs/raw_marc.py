@@ -0,0 +1,136 @@
+# extraction of selected fields from raw ISO 2709 records
+
+from marc_index import iter_raw_records
+
+
+FIELD_TERMINATOR = b'\x1e'
+SUBFIELD_INDICATOR = b'\x1f'
+
+
+class RawField:
+    """
+    Field sliced out of raw MARC21 record; only subfields that are
+    requested are decoded; mirrors pymarc Field attributes used to
+    read identifiers and item data
+    args:
+        tag: str
+        data: bytes, field data without field terminator
+        utf8: boolean, record is encoded in UTF-8 (leader position 9 'a')
+    """
+
+    def __init__(self, tag, data, utf8):
+        self.tag = tag
+        self._raw = data
+        self._utf8 = utf8
+        self.data = None
+        self.indicators = None
+        self._subfields = None
+        if tag < '010' and tag.isdigit():
+            self.data = self._decode(data)
+        else:
+            subs = data.split(SUBFIELD_INDICATOR)
+            indicators = subs[0].decode('ascii')
+            # missing indicators are recorded as blanks as in pymarc
+            indicators = (indicators + '  ')[:2]
+            self.indicators = [indicators[0], indicators[1]]
+            self._subfields = subs[1:]
+
+    def _decode(self, value):
+        if self._utf8:
+            return value.decode('utf-8')
+        # identifiers and item data are plain ASCII, MARC-8 diacritics
+        # are not translated
+        return value.decode('latin-1')
+
+    def is_control_field(self):
+        return self.data is not None
+
+    def get_subfields(self, *codes):
+        values = []
+        if self._subfields is None:
+            return values
+        for subfield in self._subfields:
+            if not subfield:
+                continue
+            if subfield[0:1].decode('ascii') in codes:
+                values.append(self._decode(subfield[1:]))
+        return values
+
+    def __getitem__(self, code):
+        values = self.get_subfields(code)
+        if values:
+            return values[0]
+
+    def __contains__(self, code):
+        return self[code] is not None
+
+    def value(self):
+        if self.data is not None:
+            return self.data
+        return ' '.join(
+            [self._decode(s[1:]) for s in self._subfields if s])
+
+
+class RawRecord:
+    """
+    Reads directory of raw MARC21 record and gives access to its
+    fields without building pymarc Record; supports the subset of
+    pymarc Record interface used to look up fields
+    (get_fields, 'tag' in record, record['tag'])
+    args:
+        data: bytes, raw MARC21 record
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.leader = data[:24].decode('ascii')
+        self._utf8 = self.leader[9] == 'a'
+        base_address = int(data[12:17])
+        directory = data[24:base_address - 1]
+        self._entries = []
+        for n in range(0, len(directory), 12):
+            entry = directory[n:n + 12]
+            tag = entry[0:3].decode('ascii')
+            length = int(entry[3:7])
+            start = base_address + int(entry[7:12])
+            self._entries.append((tag, start, length))
+
+    @property
+    def fields(self):
+        return self.get_fields()
+
+    def get_fields(self, *tags):
+        fields = []
+        for tag, start, length in self._entries:
+            if not tags or tag in tags:
+                data = self.data[start:start + length]
+                if data[-1:] == FIELD_TERMINATOR:
+                    data = data[:-1]
+                fields.append(RawField(tag, data, self._utf8))
+        return fields
+
+    def __contains__(self, tag):
+        for entry_tag, _, _ in self._entries:
+            if entry_tag == tag:
+                return True
+        return False
+
+    def __getitem__(self, tag):
+        fields = self.get_fields(tag)
+        if fields:
+            return fields[0]
+
+    def as_marc(self):
+        return self.data
+
+
+def iter_raw_marc21(file):
+    """
+    reads MARC21 file without decoding records with pymarc
+    args:
+        file: str, path to MARC21 file
+    yields:
+        RawRecord objs
+    """
+    for _, data in iter_raw_records(file):
+        yield RawRecord(data)
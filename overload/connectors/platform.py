@@ -1,8 +1,158 @@
 import requests
 from requests.exceptions import ConnectionError, Timeout
 from datetime import datetime, timedelta
+from email.utils import parsedate_tz, mktime_tz
+import random
+import threading
+import time
+from timeit import default_timer
 
-from errors import APITokenError, APITokenExpiredError
+from errors import APICriticalError, APITokenError, APITokenExpiredError
+
+
+# response codes of transient Platform errors worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# seconds before expiration access token is renewed
+TOKEN_REFRESH_MARGIN = 60.0
+# seconds between attempts to renew token after failed one
+TOKEN_RETRY_INTERVAL = 10.0
+
+
+class RetryPolicy:
+    """
+    defines how failed Platform requests are retried
+    args:
+        max_attempts: int, attempts of a request including the first one
+        backoff: float, base delay in seconds doubled with each attempt
+        max_backoff: float, maximum delay between attempts
+        deadline: float, seconds a request with its retries may take
+        statuses: tuple, response codes retried
+    """
+
+    def __init__(self, max_attempts=4, backoff=0.5, max_backoff=8.0,
+                 deadline=30.0, statuses=RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = statuses
+
+    def delay(self, attempt, retry_after=None):
+        """
+        exponential backoff with full jitter; delay requested by server
+        in Retry-After header is honored
+        args:
+            attempt: int, number of failed attempt
+            retry_after: float, seconds requested by server
+        returns:
+            float, seconds to wait before next attempt
+        """
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def parse_retry_after(response):
+    """
+    returns:
+        float, seconds to wait as requested in Retry-After header
+        or None
+    """
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(mktime_tz(parsed) - time.time(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to Platform after consecutive failures;
+    once reset_timeout passes a single trial request is let through,
+    its success closes the breaker again
+    args:
+        failure_threshold: int, consecutive failed attempts opening breaker
+        reset_timeout: float, seconds before trial request is allowed
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and \
+                    default_timer() - self.opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or \
+                    self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = default_timer()
+
+
+class RetryStats:
+    """
+    Counts retried Platform requests and latency added by retries;
+    shared by threads using the same session
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.retried_requests = 0
+        self.failed_requests = 0
+        self.rejected_requests = 0
+        self.added_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, retries=0, added_latency=0.0, failed=False,
+               rejected=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            if retries:
+                self.retried_requests += 1
+            if failed:
+                self.failed_requests += 1
+            if rejected:
+                self.rejected_requests += 1
+            self.added_latency += added_latency
+
+    def summary(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'retried_requests': self.retried_requests,
+                'failed_requests': self.failed_requests,
+                'rejected_requests': self.rejected_requests,
+                'added_latency': self.added_latency}
 
 
 class AuthorizeAccess:
@@ -63,20 +213,124 @@ class AuthorizeAccess:
                 'to Platform auth server')
 
 
+class PlatformTokenProvider:
+    """
+    Keeps Platform access token valid for all sessions and threads
+    using it; a background thread renews the token refresh_margin
+    seconds before it expires, so requests do not wait on expired
+    token; if renewal fails, current token is used until it expires
+    args:
+        auth: AuthorizeAccess obj
+        token: dict, previously obtained token to reuse (optional)
+        refresh_margin: float, seconds before expiration token is renewed
+        on_refresh: callable receiving each new token (optional)
+    """
+
+    def __init__(self, auth, token=None,
+                 refresh_margin=TOKEN_REFRESH_MARGIN, on_refresh=None):
+        self.auth = auth
+        self.refresh_margin = refresh_margin
+        self.on_refresh = on_refresh
+        self._token = token
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def token(self):
+        """
+        latest token obtained by the provider
+        """
+        return self._token
+
+    def _seconds_to_refresh(self, token):
+        if token is None:
+            return 0.0
+        remaining = token.get('expires_on') - datetime.now()
+        return remaining.total_seconds() - self.refresh_margin
+
+    def get_token(self):
+        """
+        returns:
+            token dict valid for at least refresh_margin seconds or,
+            when renewal failed, the last token until it expires
+        """
+        token = self._token
+        if self._seconds_to_refresh(token) > 0:
+            return token
+
+        # only one thread renews the token, the others wait for it
+        with self._lock:
+            token = self._token
+            if self._seconds_to_refresh(token) > 0:
+                return token
+            try:
+                token = self.auth.get_token()
+            except (APITokenError, ConnectionError, Timeout):
+                if self._token is None or \
+                        self._token.get('expires_on') < datetime.now():
+                    raise
+                return self._token
+            self._token = token
+
+        if self.on_refresh is not None:
+            self.on_refresh(token)
+        return token
+
+    def start(self):
+        """
+        starts background renewal of the token
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            wait = self._seconds_to_refresh(self._token)
+            if wait <= 0:
+                try:
+                    self.get_token()
+                except (APITokenError, ConnectionError, Timeout):
+                    # expired token is requested again by next query
+                    pass
+                wait = max(
+                    self._seconds_to_refresh(self._token),
+                    TOKEN_RETRY_INTERVAL)
+            self._stopped.wait(wait)
+
+
 class PlatformSession(requests.Session):
     """
     NYPL Platform wrapper
     args:
         base_url str
         token (dict token obj {id: token_id, expires_on: datetime}
+        retry_policy RetryPolicy obj (optional)
+        breaker CircuitBreaker obj (optional)
+        retry_stats RetryStats obj (optional)
+        token_provider PlatformTokenProvider obj (optional, used
+                       instead of token)
     creates requests.Session object tailored to NYPL Platform
     """
 
-    def __init__(self, base_url=None, token=None):
+    def __init__(self, base_url=None, token=None, retry_policy=None,
+                 breaker=None, retry_stats=None, token_provider=None):
         requests.Session.__init__(self)
         self.base_url = base_url
+        self.token_provider = token_provider
+        if token is None and token_provider is not None:
+            token = token_provider.get_token()
         self.token = token
         self.timeout = (5, 5)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_stats = retry_stats or RetryStats()
 
         if base_url is None or token is None:
             raise ValueError(
@@ -89,18 +343,84 @@ class PlatformSession(requests.Session):
         self._validate_token()
 
     def _validate_token(self):
-        if self.token.get('expires_on') < datetime.now():
+        if self.token_provider is not None:
+            token = self.token_provider.get_token()
+            if token is not self.token:
+                self.token = token
+                self.headers['Authorization'] = 'Bearer ' + token.get('id')
+        elif self.token.get('expires_on') < datetime.now():
             raise APITokenExpiredError(
                 'Platform access token expired')
 
+    def _request(self, endpoint, payload=None):
+        """
+        sends GET request retrying connection errors, timeouts and
+        transient error responses according to retry policy
+        args:
+            endpoint str
+            payload dict
+        return:
+            response
+        """
+        policy = self.retry_policy
+        if not self.breaker.allow():
+            self.retry_stats.record(rejected=True)
+            raise APICriticalError(
+                'Platform appears to be down. Requests suspended '
+                'after repeated failures.')
+
+        start = default_timer()
+        attempt = 0
+        added_latency = 0.0
+        while True:
+            attempt += 1
+            attempt_start = default_timer()
+            error = None
+            response = None
+            try:
+                response = self.get(
+                    endpoint, params=payload, timeout=self.timeout)
+            except Timeout:
+                error = Timeout(
+                    'request timed out while trying to connect '
+                    'to Platform endpoint ({})'.format(endpoint))
+            except ConnectionError:
+                error = ConnectionError(
+                    'unable to connect to Platform')
+
+            if error is None and \
+                    response.status_code not in policy.statuses:
+                self.breaker.record_success()
+                self.retry_stats.record(attempt - 1, added_latency)
+                return response
+
+            self.breaker.record_failure()
+            added_latency += default_timer() - attempt_start
+            delay = policy.delay(attempt, parse_retry_after(response))
+            elapsed = default_timer() - start
+            if attempt >= policy.max_attempts or \
+                    elapsed + delay > policy.deadline or \
+                    not self.breaker.allow():
+                self.retry_stats.record(
+                    attempt - 1, added_latency, failed=True)
+                if error is not None:
+                    raise error
+                # error response is interpreted by the caller
+                return response
+
+            time.sleep(delay)
+            added_latency += delay
+
     def query_bibStandardNo(
-            self, keywords=[], source='sierra-nypl', deleted=False, limit=20):
+            self, keywords=[], source='sierra-nypl', deleted=False, limit=20,
+            offset=None):
         """
         performs standar number query
         args:
             keywords list
             source str
             limit int
+            offset int (used for paging through results)
         return:
             results
         """
@@ -114,17 +434,9 @@ class PlatformSession(requests.Session):
             limit=limit,
             deleted=deleted,
             standardNumber=','.join(keywords))
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        if offset is not None:
+            payload['offset'] = offset
+        return self._request(endpoint, payload)
 
     def query_bibControlNo(
             self, keywords=[], source='sierra-nypl', deleted=False, limit=20):
@@ -147,17 +459,7 @@ class PlatformSession(requests.Session):
             limit=limit,
             deleted=deleted,
             controlNumber=','.join(keywords))
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_bibId(
             self, keywords=[], source='sierra-nypl', deleted=False, limit=20):
@@ -178,17 +480,7 @@ class PlatformSession(requests.Session):
             limit=limit,
             deleted=deleted,
             id=','.join(keywords))
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_bibCreatedDate(
             self, start_date, end_date,
@@ -210,17 +502,7 @@ class PlatformSession(requests.Session):
             nyplSource=source,
             deleted=False,
             limit=limit)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_bibUpdatedDate(
             self, start_date, end_date,
@@ -242,17 +524,7 @@ class PlatformSession(requests.Session):
             nyplSource=source,
             deleted=False,
             limit=limit)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def get_bibItems(self, keyword, source='sierra-nypl'):
         """
@@ -267,17 +539,7 @@ class PlatformSession(requests.Session):
         self._validate_token()
         endpoint = self.base_url + '/bibs/{}/{}/items'.format(
             source, keyword)
-        try:
-            response = self.get(
-                endpoint, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint)
 
     def query_itemId(
             self, keywords=[],
@@ -299,17 +561,7 @@ class PlatformSession(requests.Session):
             deleted=deleted,
             limit=limit,
             id=','.join(keywords))
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_itemBarcode(
             self, keyword, source='sierra-nypl',
@@ -331,17 +583,7 @@ class PlatformSession(requests.Session):
             deleted=deleted,
             limit=limit,
             barcode=keyword)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_itemBibId(
             self, keyword, source='sierra-nypl',
@@ -363,17 +605,7 @@ class PlatformSession(requests.Session):
             deleted=deleted,
             limit=limit,
             bibId=keyword)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_itemCreatedDate(
             self, start_date, end_date, source='sierra-nypl',
@@ -396,17 +628,7 @@ class PlatformSession(requests.Session):
             nyplSource=source,
             deleted=deleted,
             limit=limit)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def query_itemUpdateddDate(
             self, start_date, end_date, source='sierra-nypl',
@@ -429,17 +651,7 @@ class PlatformSession(requests.Session):
             nyplSource=source,
             deleted=deleted,
             limit=limit)
-        try:
-            response = self.get(
-                endpoint, params=payload, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint, payload)
 
     def get_item(self, keyword, source='sierra-nypl'):
         """
@@ -454,14 +666,4 @@ class PlatformSession(requests.Session):
         self._validate_token()
         endpoint = self.base_url + '/items/{}/{}'.format(
             source, keyword)
-        try:
-            response = self.get(
-                endpoint, timeout=self.timeout)
-            return response
-        except Timeout:
-            raise Timeout(
-                'request timed out while trying to connect '
-                'to Platform endpoint ({})'.format(endpoint))
-        except ConnectionError:
-            raise ConnectionError(
-                'unable to connect to Platform')
+        return self._request(endpoint)
@@ -1,5 +1,8 @@
 # handles Z3950 requests
 
+import threading
+
+
 from PyZ3950 import zoom
 
 
@@ -15,35 +18,157 @@ Z3950_QUALIFIERS = {
     'keyword': '(1,1016)'
 }
 
+# number of open connections kept for each target
+Z3950_POOL_SIZE = 2
+
+
+def z3950_connect(target):
+    """
+    opens and initializes connection to Z3950 target
+    args:
+        target: dict, Z3950 target settings
+    returns:
+        zoom.Connection obj
+    """
+    user = target['user']
+    password = target['password']
+    if user is not None \
+            and password is not None:
+        conn = zoom.Connection(
+            target['host'], target['port'],
+            user=user, password=password)
+    else:
+        conn = zoom.Connection(target['host'], target['port'])
+
+    conn.databaseName = target['database']
+    conn.preferredRecordSyntax = target['syntax']
+    return conn
+
+
+class Z3950ConnectionPool:
+    """
+    Keeps initialized connections to a Z3950 target for reuse by
+    subsequent queries; a connection is used by one query at a time,
+    broken connections are replaced by new ones
+    args:
+        target: dict, Z3950 target settings
+        size: int, maximum number of open connections
+    """
+
+    def __init__(self, target, size=Z3950_POOL_SIZE):
+        self.target = target
+        self.size = size
+        self._idle = []
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+
+    def _acquire(self, fresh=False):
+        self._slots.acquire()
+        if not fresh:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop()
+        try:
+            return z3950_connect(self.target)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+        self._slots.release()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            # connection is already broken
+            pass
+        self._slots.release()
+
+    def _discard_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def search(self, query):
+        """
+        runs query reconnecting once if connection turns out to be broken;
+        idle connections opened as long ago as the broken one are likely
+        dropped by the target as well, so they are closed and the query
+        is retried on a new connection
+        args:
+            query: zoom.Query obj
+        returns:
+            list of retrieved records
+        """
+        for attempt in (1, 2):
+            conn = self._acquire(fresh=attempt == 2)
+            try:
+                # records are retrieved before connection is reused
+                results = list(conn.search(query))
+            except zoom.ConnectionError:
+                self._discard(conn)
+                if attempt == 2:
+                    raise
+                self._discard_idle()
+                continue
+            except Exception:
+                self._discard(conn)
+                raise
+            self._release(conn)
+            return results
+
+    def close(self):
+        self._discard_idle()
+
+
+# connection pools of Z3950 targets used in this process
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def _pool_key(target):
+    return (
+        target['host'], target['port'], target['database'],
+        target['syntax'], target['user'], target['password'])
+
+
+def z3950_pool(target):
+    """
+    returns:
+        Z3950ConnectionPool obj shared by all queries of the target
+    """
+    key = _pool_key(target)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = Z3950ConnectionPool(target)
+        return _pools[key]
+
+
+def close_z3950_pools():
+    """
+    closes connections to all Z3950 targets
+    """
+    with _pools_lock:
+        pools = _pools.values()
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 
 def z3950_query(target=None, keyword=None, qualifier='(1,1016)',
                 query_type='CCL'):
     if target is not None:
-        host = target['host']
-        database = target['database']
-        port = target['port']
-        syntax = target['syntax']
-        user = target['user']
-        password = target['password']
+        query_str = qualifier + '=' + keyword
+        query = zoom.Query(query_type, query_str)
+        res = z3950_pool(target).search(query)
 
-        try:
-            if user is not None \
-                    and password is not None:
-                conn = zoom.Connection(
-                    host, port,
-                    user=user, password=password)
-            else:
-                conn = zoom.Connection(host, port)
-
-            conn.databaseName = database
-            conn.preferredRecordSyntax = syntax
-            query_str = qualifier + '=' + keyword
-            query = zoom.Query(query_type, query_str)
-            res = conn.search(query)
-
-            return True, res
-
-        except zoom.ConnectionError:
-            raise
+        return True, res
     else:
         raise ValueError('Z3950 target not provided.')
@@ -53,3 +53,10 @@ class UnhandledException(OverloadError):
     fixing"""
 
     pass
+
+
+class BatchCancelledError(OverloadError):
+    """Exception raised when user cancels processing of a batch
+    """
+
+    pass
@@ -6,13 +6,15 @@ import shelve
 
 
 from bibs.bibs import BibOrderMeta
-from errors import OverloadError, APITokenExpiredError
+from errors import OverloadError
 from logging_setup import LogglyAdapter
 from bibs.crosswalks import platform2meta, bibs2meta
 from pvf.analyzer import PVR_NYPLReport, PVR_BPLReport
-from pvf.platform_comms import open_platform_session, platform_queries_manager
+from pvf.platform_comms import open_platform_session, \
+    platform_queries_manager, save_platform_tokens
 from setup_dirs import USER_DATA, GETBIB_REP
-from pvf.z3950_comms import z3950_query_manager
+from pvf.z3950_comms import z3950_query_manager, \
+    close_z3950_connections
 from utils import save2csv
 
 
@@ -99,69 +101,68 @@ def launch_process(
         target = user_data['Z3950s'][target['name']]
         user_data.close()
 
-    for i in ids:
-        meta_in = BibOrderMeta(
-            system=system, dstLibrary=library)  # like vendor meta in PVR
-        meta_in.dstLibrary = library
-        if id_type == 'ISBN':
-            meta_in.t020 = [i]
-        elif id_type == 'ISSN':
-            meta_in.t022 = [i]
-        elif id_type == 'UPC':
-            meta_in.t024 = [i]
-        elif id_type == 'OCLC #':
-            meta_in.t001 = i
-
-        module_logger.debug(str(meta_in))
-
-        # query NYPL Platform
-        if target['method'] == 'Platform API':
-            try:
-                result = platform_queries_manager(
-                    target['method'], session, meta_in, matchpoint)
-            except APITokenExpiredError:
-                module_logger.info(
-                    'Platform token expired. '
-                    'Requesting new one and opening new session.')
-                session = open_platform_session(target['method'])
+    try:
+        for i in ids:
+            meta_in = BibOrderMeta(
+                system=system, dstLibrary=library)  # like vendor meta in PVR
+            meta_in.dstLibrary = library
+            if id_type == 'ISBN':
+                meta_in.t020 = [i]
+            elif id_type == 'ISSN':
+                meta_in.t022 = [i]
+            elif id_type == 'UPC':
+                meta_in.t024 = [i]
+            elif id_type == 'OCLC #':
+                meta_in.t001 = i
+
+            module_logger.debug(str(meta_in))
+
+            # query NYPL Platform
+            if target['method'] == 'Platform API':
                 result = platform_queries_manager(
                     target['method'], session, meta_in, matchpoint)
 
-            meta_out = []
-            if result[0] == 'hit':
-                hit_counter.set(hit_counter.get() + 1)
-                meta_out = platform2meta(result[1])
-            elif result[0] == 'nohit':
-                nohit_counter.set(nohit_counter.get() + 1)
-
-        elif target['method'] == 'Z3950':
-            meta_out = []
-            status, bibs = z3950_query_manager(
-                target, meta_in, matchpoint)
-            if status == 'hit':
-                hit_counter.set(hit_counter.get() + 1)
-                meta_out = bibs2meta(bibs)
-            elif status == 'nohit':
-                nohit_counter.set(nohit_counter.get() + 1)
-
-        if system == 'NYPL':
-            analysis = PVR_NYPLReport('cat', meta_in, meta_out)
-        elif system == 'BPL':
-            analysis = PVR_BPLReport('cat', meta_in, meta_out)
-        module_logger.debug(str(analysis))
-
-        if not header:
-            header = analysis.to_dict().keys()
-            header.insert(0, 'pos')
-            save2csv(GETBIB_REP, header)
-        if analysis.target_sierraId:
-            analysis.target_sierraId = 'b{}a'.format(analysis.target_sierraId)
-        row = analysis.to_dict().values()
-        row.insert(0, progbar['value'])
-        save2csv(GETBIB_REP, row)
-
-        progbar['value'] += 1
-        progbar.update()
+                meta_out = []
+                if result[0] == 'hit':
+                    hit_counter.set(hit_counter.get() + 1)
+                    meta_out = platform2meta(result[1])
+                elif result[0] == 'nohit':
+                    nohit_counter.set(nohit_counter.get() + 1)
+
+            elif target['method'] == 'Z3950':
+                meta_out = []
+                status, bibs = z3950_query_manager(
+                    target, meta_in, matchpoint)
+                if status == 'hit':
+                    hit_counter.set(hit_counter.get() + 1)
+                    meta_out = bibs2meta(bibs)
+                elif status == 'nohit':
+                    nohit_counter.set(nohit_counter.get() + 1)
+
+            if system == 'NYPL':
+                analysis = PVR_NYPLReport('cat', meta_in, meta_out)
+            elif system == 'BPL':
+                analysis = PVR_BPLReport('cat', meta_in, meta_out)
+            module_logger.debug(str(analysis))
+
+            if not header:
+                header = analysis.to_dict().keys()
+                header.insert(0, 'pos')
+                save2csv(GETBIB_REP, header)
+            if analysis.target_sierraId:
+                analysis.target_sierraId = 'b{}a'.format(
+                    analysis.target_sierraId)
+            row = analysis.to_dict().values()
+            row.insert(0, progbar['value'])
+            save2csv(GETBIB_REP, row)
+
+            progbar['value'] += 1
+            progbar.update()
+    finally:
+        if target['method'] == 'Z3950':
+            close_z3950_connections()
+        elif target['method'] == 'Platform API':
+            save_platform_tokens()
 
     # record data about the batch
     timestamp_end = datetime.now()
@@ -1,21 +1,36 @@
 import logging
+import Queue
+import threading
+import time
 import traceback
 
 
+import requests
+
+
+# capacity of the queue of log events waiting to be shipped to Loggly
+LOG_QUEUE_SIZE = 10000
+# max number of events posted to Loggly bulk endpoint in one request
+LOG_BATCH_SIZE = 200
+# max time (seconds) an event waits in the queue before it is shipped
+LOG_FLUSH_INTERVAL = 5.0
+
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'standard': {
-            'format': '{"app":"%(name)s", "asciTime":"%(asctime)s", "fileName":"%(filename)s", "lineNo":"%(lineno)d", "levelName":"%(levelname)s", "message":"%(message)s"}'
+            '()': 'logging_setup.LogglyFormatter',
+            'fmt': '{"app":"%(name)s", "asciTime":"%(asctime)s", "fileName":"%(filename)s", "lineNo":"%(lineno)d", "levelName":"%(levelname)s", "message":"%(message)s"}'
         },
     },
     'handlers': {
         'loggly': {
             'level': 'INFO',
-            'class': 'loggly.handlers.HTTPSHandler',
+            'class': 'logging_setup.LogglyBulkHandler',
             'formatter': 'standard',
-            'url': 'https://logs-01.loggly.com/inputs/[token]/tag/python',
+            'url': 'https://logs-01.loggly.com/bulk/[token]/tag/python/',
         },
     },
     'loggers': {
@@ -36,7 +51,8 @@ DEV_LOGGING = {
             'format': '%(name)s-%(asctime)s-%(filename)s-%(lineno)s-%(levelname)s-%(levelno)s-%(message)s'
         },
         'standard': {
-            'format': '{"app":"%(name)s", "asciTime":"%(asctime)s", "fileName":"%(filename)s", "lineNo":"%(lineno)d", "levelName":"%(levelname)s", "message":"%(message)s"}'
+            '()': 'logging_setup.LogglyFormatter',
+            'fmt': '{"app":"%(name)s", "asciTime":"%(asctime)s", "fileName":"%(filename)s", "lineNo":"%(lineno)d", "levelName":"%(levelname)s", "message":"%(message)s"}'
         },
     },
     'handlers': {
@@ -47,9 +63,9 @@ DEV_LOGGING = {
         },
         'loggly': {
             'level': 'DEBUG',
-            'class': 'loggly.handlers.HTTPSHandler',
+            'class': 'logging_setup.LogglyBulkHandler',
             'formatter': 'standard',
-            'url': 'https://logs-01.loggly.com/inputs/[token]/tag/python',
+            'url': 'https://logs-01.loggly.com/bulk/[token]/tag/python/',
         },
     },
     'loggers': {
@@ -62,22 +78,157 @@ DEV_LOGGING = {
 }
 
 
+def escape_json(msg):
+    """
+    escapes JSON special characters in log message
+    """
+    try:
+        return '%s' % (
+            msg.replace('\\', '/').
+            replace('"', "'").
+            replace('\n', '\\n').
+            replace('\t', '\\t'))
+    except AttributeError:
+        return msg
+
+
 class LogglyAdapter(logging.LoggerAdapter):
     """
-    Adapter for Loggly service that escapes JSON special characters in msg
+    Adapter of the app logger; messages should pass their data as
+    logger arguments (module_logger.debug('Record: %s', record)) so they
+    are formatted only if the level is enabled; JSON special characters
+    are escaped by LogglyFormatter after the arguments are merged
     """
 
     def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+class LogglyFormatter(logging.Formatter):
+    """
+    Formatter of Loggly JSON events; escapes JSON special characters
+    in a message merged with its arguments
+    """
+
+    def format(self, record):
+        escaped = logging.makeLogRecord(record.__dict__)
+        escaped.msg = escape_json(record.getMessage())
+        escaped.args = ()
+        return logging.Formatter.format(self, escaped)
+
+
+class LogglyBulkHandler(logging.Handler):
+    """
+    Queues formatted log events and lets LogglyListener ship them to
+    Loggly bulk endpoint from a background thread; events are dropped
+    and counted when the queue is full, so logging never blocks
+    processing
+    args:
+        url: str, Loggly bulk endpoint url
+        capacity: int, max number of events waiting in the queue
+        batch_size: int, max number of events in one request
+        flush_interval: float, max seconds an event waits in the queue
+    """
+
+    def __init__(self, url, capacity=LOG_QUEUE_SIZE,
+                 batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL):
+        logging.Handler.__init__(self)
+        self.queue = Queue.Queue(capacity)
+        self.dropped = 0
+        self.listener = LogglyListener(
+            self.queue, url, batch_size, flush_interval)
+
+    def emit(self, record):
+        try:
+            event = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(event)
+        except Queue.Full:
+            self.dropped += 1
+            return
+        self.listener.start()
+
+    def close(self):
+        self.listener.stop()
+        logging.Handler.close(self)
+
+
+class LogglyListener:
+    """
+    Background thread draining the queue of log events and posting
+    them to Loggly bulk endpoint in batches (one event per line)
+    args:
+        queue: Queue obj of formatted events
+        url: str, Loggly bulk endpoint url
+        batch_size: int, max number of events in one request
+        flush_interval: float, max seconds an event waits in the queue
+    """
+
+    def __init__(self, queue, url, batch_size, flush_interval):
+        self.queue = queue
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.failed = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop_event = object()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        """
+        ships remaining events and stops the thread
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            # sentinel is always accepted, blocks only when queue is full
+            self.queue.put(self._stop_event)
+            thread.join(self.flush_interval * 2)
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=timeout)
+                except Queue.Empty:
+                    break
+                if event is self._stop_event:
+                    stopped = True
+                    break
+                batch.append(event)
+            if batch:
+                self.post(batch)
+
+    def post(self, batch):
         try:
-            format_msg = '%s' % (
-                msg.replace('\\', '/').
-                replace('"', "'").
-                replace('\n', '\\n').
-                replace('\t', '\\t'))
-        except AttributeError:
-            format_msg = msg
-
-        return format_msg, kwargs
+            response = requests.post(
+                self.url, data='\n'.join(batch),
+                headers={'content-type': 'text/plain'},
+                timeout=self.flush_interval)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            # logging failures must not interrupt the app
+            self.failed += len(batch)
 
 
 def format_traceback(exc, exc_traceback=None):
@@ -7,7 +7,6 @@ import keyring
 from keyring.backends.Windows import WinVaultKeyring
 import logging
 import logging.config
-import loggly.handlers
 import os
 import os.path
 import re
@@ -29,6 +28,7 @@ from errors import OverloadError
 from gui_utils import BusyManager, ToolTip
 from logging_setup import LOGGING, DEV_LOGGING, LogglyAdapter
 import overload_help
+from pvf.platform_comms import discard_platform_connection
 from pvf.pvf_gui import ProcessVendorFiles
 from pvf.reports import (
     cumulative_nypl_stats,
@@ -1100,6 +1100,7 @@ class PlatformAPIs(tk.Frame):
 
             # store critical data in Windows Vault
             credentials.store_in_vault(oauth_server, client_id, client_secret)
+            discard_platform_connection(new_conn_name)
 
             tkMessageBox.showinfo("Input", "Settings have been saved")
             self.observer()
@@ -1181,6 +1182,7 @@ class PlatformAPIs(tk.Frame):
                 # delete from user_data
                 user_data["PlatformAPIs"].pop(self.conn_name.get(), None)
                 user_data.close()
+                discard_platform_connection(self.conn_name.get())
                 # update indexes & reset to blank form
                 self.observer()
 
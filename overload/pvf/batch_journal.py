@@ -0,0 +1,147 @@
+# write-ahead journal of PVF batch allowing interrupted batches to resume
+
+import json
+import os
+
+
+from errors import OverloadError
+
+
+# number of records processed between checkpoints
+CHECKPOINT_INTERVAL = 100
+
+
+def file_offsets(fhs):
+    """
+    returns:
+        dict (key: file path, value: size in bytes)
+    """
+    offsets = dict()
+    for fh in fhs:
+        if os.path.isfile(fh):
+            offsets[fh] = os.path.getsize(fh)
+        else:
+            offsets[fh] = 0
+    return offsets
+
+
+def truncate_files(offsets):
+    """
+    restores files to their committed sizes discarding content written
+    after the last checkpoint
+    args:
+        offsets: dict (key: file path, value: size in bytes)
+    """
+    for fh, offset in offsets.iteritems():
+        if not os.path.isfile(fh):
+            if offset:
+                raise OverloadError(
+                    'Unable to resume batch. File {} is missing.'.format(fh))
+            continue
+        if os.path.getsize(fh) < offset:
+            raise OverloadError(
+                'Unable to resume batch. File {} has been modified.'.format(
+                    fh))
+        with open(fh, 'r+b') as file:
+            file.truncate(offset)
+
+
+class BatchJournal(object):
+    """
+    Append-only journal of a batch; the first entry records batch
+    parameters, following entries are checkpoints of committed records
+    with sizes of output files; an entry is written only after output
+    files have been synced to disk; closed journal is reopened by the
+    next entry
+    args:
+        fh: str, path to the journal file
+    """
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.params = None
+        self.last_checkpoint = None
+        self.completed = False
+        self._file = None
+
+    @classmethod
+    def start(cls, fh, params):
+        """
+        starts journal of a new batch replacing previous one
+        args:
+            fh: str, path to the journal file
+            params: dict, batch parameters
+        """
+        journal = cls(fh)
+        journal.params = params
+        journal._file = open(fh, 'w')
+        journal._append(dict(type='start', params=params))
+        return journal
+
+    @classmethod
+    def load(cls, fh):
+        """
+        reads journal of the previous batch; entry torn by a crash
+        is ignored
+        returns:
+            BatchJournal obj or None if journal does not exist
+        """
+        if not os.path.isfile(fh):
+            return None
+        journal = cls(fh)
+        with open(fh, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry['type'] == 'start':
+                    journal.params = entry['params']
+                elif entry['type'] == 'checkpoint':
+                    journal.last_checkpoint = entry
+                elif entry['type'] == 'complete':
+                    journal.completed = True
+        if journal.params is None:
+            return None
+        return journal
+
+    @property
+    def resumable(self):
+        return not self.completed and self.last_checkpoint is not None
+
+    def reopen(self):
+        """
+        continues writing to loaded journal
+        """
+        self._file = open(self.fh, 'a')
+
+    def checkpoint(self, n, f, pos, offsets, stage='records'):
+        """
+        commits processed records
+        args:
+            n: int, number of processed records in the batch
+            f: int, number of the file in progress
+            pos: int, number of processed records of that file
+            offsets: dict, sizes of output files
+            stage: str, 'records' or 'deduped'
+        """
+        entry = dict(
+            type='checkpoint', n=n, f=f, pos=pos, offsets=offsets,
+            stage=stage)
+        self._append(entry)
+        self.last_checkpoint = entry
+
+    def complete(self):
+        self._append(dict(type='complete'))
+        self.completed = True
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def _append(self, entry):
+        if self._file is None or self._file.closed:
+            self.reopen()
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,142 @@
+# append-only storage of PVF analysis of each processed record
+
+import os
+import unicodecsv as csv
+
+from pandas import read_csv
+
+
+# columns of the stats file and their pandas types
+STATS_COLUMNS = [
+    ('vendor_id', object),
+    ('vendor', object),
+    ('updated_by_vendor', bool),
+    ('callNo_match', bool),
+    ('target_callNo', object),
+    ('vendor_callNo', object),
+    ('inhouse_dups', object),
+    ('target_sierraId', object),
+    ('target_title', object),
+    ('mixed', object),
+    ('other', object),
+    ('action', object)]
+
+INDEX_COLUMN = 'n'
+
+# analysis values stored as comma separated Sierra bib numbers
+LIST_COLUMNS = ['inhouse_dups', 'mixed', 'other']
+
+
+def format_sierra_id(sierra_id):
+    """
+    formats Sierra id of target record as it is displayed in Sierra
+    (b12345678a for bibs, o1234567a for orders)
+    """
+    if sierra_id is not None:
+        if len(sierra_id) == 8:
+            return 'b{}a'.format(sierra_id)
+        elif len(sierra_id) == 7:
+            return 'o{}a'.format(sierra_id)
+    return None
+
+
+def format_bib_ids(sierra_ids):
+    if not sierra_ids:
+        return None
+    return ','.join(['b{}a'.format(bid) for bid in sierra_ids])
+
+
+def analysis2row(n, analysis):
+    """
+    converts analysis dict of a record to a row of the stats file
+    args:
+        n: int, record sequence number in the batch
+        analysis: dict, created by PVR_NYPLReport or PVR_BPLReport
+    returns:
+        list of values
+    """
+    row = [n]
+    for column, dtype in STATS_COLUMNS:
+        value = analysis.get(column)
+        if column == 'target_sierraId':
+            value = format_sierra_id(value)
+        elif column in LIST_COLUMNS:
+            value = format_bib_ids(value)
+        elif dtype is bool:
+            value = bool(value)
+        row.append(value)
+    return row
+
+
+class BatchStatsWriter:
+    """
+    Writes analysis of each record to a csv file as records are processed,
+    so stats of large batches are not kept in memory
+    args:
+        fh: str, path to the stats file
+        append: boolean, continue stats of resumed batch instead of
+                removing previous content
+    """
+
+    def __init__(self, fh, append=False):
+        self.fh = fh
+        if append:
+            self._file = open(fh, 'ab')
+        else:
+            self._file = open(fh, 'wb')
+        self._writer = csv.writer(
+            self._file,
+            encoding='utf-8',
+            delimiter=',',
+            lineterminator='\n',
+            quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if not append:
+            self._writer.writerow(
+                [INDEX_COLUMN] + [column for column, dtype in STATS_COLUMNS])
+
+    def write(self, n, analysis):
+        self._writer.writerow(analysis2row(n, analysis))
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def clear_batch_stats(fh):
+    """
+    replaces stats of the previous batch with an empty stats file
+    """
+    BatchStatsWriter(fh).close()
+
+
+def read_batch_stats(fh):
+    """
+    loads stats file into a dataframe indexed by record sequence number
+    args:
+        fh: str, path to the stats file
+    returns:
+        pandas.DataFrame
+    """
+    df = read_csv(
+        fh,
+        header=0,
+        index_col=INDEX_COLUMN,
+        encoding='utf-8',
+        dtype=dict(STATS_COLUMNS),
+        keep_default_na=False,
+        na_values=[''])
+    # empty values are reported as None as in analysis
+    for column, dtype in STATS_COLUMNS:
+        if dtype is object:
+            df[column] = df[column].where(df[column].notnull(), None)
+    return df
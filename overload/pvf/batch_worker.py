@@ -0,0 +1,147 @@
+# runs PVF batch on a worker thread reporting progress to Tk main thread
+
+import Queue
+import sys
+import threading
+
+
+from errors import BatchCancelledError
+
+
+# interval (ms) in which GUI applies progress posted by the worker
+FRAME_INTERVAL = 100
+
+
+class BatchControl:
+    """
+    Pause and cancel requests of the processed batch; the worker
+    honors them between records by calling checkpoint method
+    """
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # paused worker must wake up to stop
+        self._running.set()
+
+    def checkpoint(self):
+        """
+        blocks while batch is paused and raises BatchCancelledError
+        if it was cancelled
+        """
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise BatchCancelledError('Processing cancelled by user.')
+
+
+class ProgressbarProxy:
+    """
+    Stands in for ttk.Progressbar on the worker thread; options are
+    posted to the events queue and applied by the GUI
+    args:
+        events: Queue obj
+        options: initial options of the progress bar (maximum, value)
+    """
+
+    def __init__(self, events, **options):
+        self._events = events
+        self._options = options
+
+    def __setitem__(self, key, value):
+        self._options[key] = value
+        self._events.put(('progbar', key, value))
+
+    def __getitem__(self, key):
+        return self._options[key]
+
+    def update(self):
+        # GUI redraws at its own pace
+        pass
+
+
+class StringVarProxy:
+    """
+    Stands in for tk.StringVar on the worker thread
+    args:
+        events: Queue obj
+        value: str, initial value
+    """
+
+    def __init__(self, events, value=''):
+        self._events = events
+        self._value = value
+
+    def set(self, value):
+        self._value = value
+        self._events.put(('label', None, value))
+
+    def get(self):
+        return self._value
+
+
+class BatchWorker:
+    """
+    Runs target function on a worker thread; exception raised by the
+    target is re-raised with its traceback when result is requested
+    args:
+        events: Queue obj shared with proxies passed to the target
+        target: function
+        args, kwargs: arguments passed to the target
+    """
+
+    def __init__(self, events, target, *args, **kwargs):
+        self.events = events
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _run(self):
+        try:
+            self._result = self._target(*self._args, **self._kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def drain(self):
+        """
+        returns list of events posted since the last call
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except Queue.Empty:
+                return events
+
+    def result(self):
+        if self._exc_info is not None:
+            exc_type, exc_value, exc_traceback = self._exc_info
+            raise exc_type, exc_value, exc_traceback
+        return self._result
@@ -2,19 +2,22 @@
 # logging and passing exception to gui happens here
 
 from datetime import datetime, date
+from itertools import islice
 import logging
 import os
 import shelve
+from timeit import default_timer
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 
 from analyzer import PVR_NYPLReport, PVR_BPLReport
 from bibs import patches
+from bibs.raw_marc import RawRecord
 from bibs.bibs import VendorBibMeta, read_marc21, \
-    create_target_id_field, write_marc21, check_sierra_id_presence, \
+    create_target_id_field, MarcFileWriter, check_sierra_id_presence, \
     sierra_command_tag, create_field_from_template, \
-    db_template_to_960, db_template_to_961, db_template_to_949, \
+    order_template_plans, db_template_to_949, \
     set_nypl_sierra_bib_default_location
 from bibs.crosswalks import platform2meta, bibs2meta
 from bibs.dedup import dedup_marc_file
@@ -22,111 +25,229 @@ from datastore import session_scope, Vendor, \
     PVR_Batch, PVR_File, NYPLOrderTemplate
 from db_worker import insert_or_ignore, retrieve_records, \
     retrieve_record, update_nypl_template, delete_record
-from errors import OverloadError, APITokenExpiredError
+from errors import OverloadError
 from logging_setup import LogglyAdapter
-from platform_comms import open_platform_session, platform_queries_manager
-from pvf.vendors import vendor_index, identify_vendor, get_query_matchpoint
+from match_cache import MatchCache, MATCH_CACHE_TTL
+from platform_comms import open_platform_session, PlatformQueryEngine
+from pvf.batch_journal import BatchJournal, CHECKPOINT_INTERVAL, \
+    file_offsets, truncate_files
+from pvf.batch_stats import BatchStatsWriter
+from pvf.stage_timer import StageTimer
+from pvf.vendors import vendor_matcher, identify_vendor, get_query_matchpoint
 from pvf import reports
-from setup_dirs import BARCODES, BATCH_META, BATCH_STATS, USER_DATA, USER_NAME
+from rules_cache import load_rules
+from setup_dirs import BARCODES, BATCH_JOURNAL, BATCH_META, BATCH_STATS, \
+    USER_DATA, USER_NAME
 from utils import remove_files
-from validators.default import validate_processed_files_integrity
-from z3950_comms import z3950_query_manager
+from validators.default import BarcodeVerifier
+from z3950_comms import z3950_query_manager, close_z3950_connections
 
 
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 
 
-def run_platform_queries(api_type, session, meta_in, matchpoint):
-    try:
-        results = platform_queries_manager(
-            api_type, session, meta_in, matchpoint)
-        return results
-    except OverloadError:
-        raise
+def prep_vendor_bibs(
+        reader, file, system, library, agent, vx, template,
+        query_matchpoints, timer=None):
+    """
+    identifies vendor and parses vendor bib meta of each record in a file
+    args:
+        reader: pymarc.MARCReader obj
+        file: str, path to the processed file
+        query_matchpoints: dict, matchpoints of sel/acq template
+        timer: StageTimer obj (optional)
+    yields:
+        tuples (meta_in, query_matchpoints, (bib, vendor))
+    """
+    if timer is None:
+        timer = StageTimer()
+    pos = 0
+    for bib in reader:
+        pos += 1
+        start = default_timer()
+
+        if agent == 'cat':
+            vendor = identify_vendor(bib, vx)
+
+            try:
+                query_matchpoints = get_query_matchpoint(vendor, vx)
+                module_logger.debug(
+                    'Cat vendor index has following query matchpoints: '
+                    '%s for vendor %s.',
+                    query_matchpoints, vendor)
+
+            except KeyError:
+                module_logger.critical(
+                    'Unable to match vendor %s with data '
+                    'in cat vendor index', vendor)
+        elif agent in ('sel', 'acq'):
+            # vendor code
+            if system == 'nypl':
+                vendor = template.vendor
+                if vendor is None:
+                    # do not apply but keep for stats
+                    vendor = 'UNKNOWN'
+
+        if vendor == 'UNKNOWN':
+            module_logger.debug(
+                'Encounted unidentified vendor in record # : %s '
+                'in file %s (system=%s, library=%s, agent=%s)',
+                pos, file, system, library, agent)
+        timer.add('vendor identification', default_timer() - start)
+
+        # determine vendor bib meta
+        start = default_timer()
+        meta_in = VendorBibMeta(bib, vendor=vendor, dstLibrary=library)
+        module_logger.info('Vendor bib meta: %s', meta_in)
+        timer.add('vendor bib meta', default_timer() - start)
+
+        yield meta_in, query_matchpoints, (bib, vendor)
+
+
+def run_z3950_queries(target, vendor_bibs, cache=None, timer=None):
+    """
+    queries Z3950 target for each of the vendor bibs falling back on
+    secondary and tertiary matchpoints if no match was found
+    args:
+        target: dict, Z3950 target settings
+        vendor_bibs: iterable of tuples (meta, query_matchpoints, payload)
+        cache: MatchCache obj (optional)
+        timer: StageTimer obj (optional)
+    yields:
+        tuples (payload, meta, meta_out)
+    """
+    if timer is None:
+        timer = StageTimer()
+
+    for meta_in, query_matchpoints, payload in vendor_bibs:
+        meta_out = []
+        with timer.stage('query results'):
+            for preference in ('primary', 'secondary', 'tertiary'):
+                if preference not in query_matchpoints:
+                    break
+                matchpoint = query_matchpoints[preference][1]
+                module_logger.debug(
+                    'Using %s matchpoint: %s',
+                    preference, matchpoint)
+                status, bibs = z3950_query_manager(
+                    target, meta_in, matchpoint, cache, timer)
+                if status == 'hit':
+                    meta_out = bibs2meta(bibs)
+                if status != 'nohit':
+                    break
+        module_logger.info(
+            'Retrieved bibs meta: %s',
+            meta_out)
+        yield payload, meta_in, meta_out
 
 
 def run_processing(
     files, system, library, agent, api_type, api_name,
-        template, output_directory, progbar, current_process_label):
+        template, output_directory, progbar, current_process_label,
+        bypass_cache=False, control=None, resume=False,
+        cache_ttl=MATCH_CACHE_TTL):
 
     """
     args:
         template: instance of NYPLOrderTemplate class
+        bypass_cache: boolean, ignore query results cached by previous runs
+        control: BatchControl obj, pause and cancel requests honored
+                 between records (optional)
+        resume: boolean, continue interrupted batch after the last
+                record committed in the batch journal
+        cache_ttl: int, seconds after which cached query results are
+                   requeried
     """
 
     # agent argument is 3 letter code
 
     module_logger.debug('PVR process launched.')
 
-    # tokens and sessions are opened on this level
+    # tokens and sessions are opened on this level,
+    # once the batch has been set up
 
     # determine destination API
-    if api_type == 'Platform API':
-        module_logger.debug('Creating Platform API session.')
-        try:
-            session = open_platform_session(api_name)
-        except OverloadError:
-            raise
-    elif api_type == 'Z3950':
-        module_logger.debug('retrieving Z3950 settings for {}'.format(
-            api_name))
+    if api_type == 'Z3950':
+        module_logger.debug('retrieving Z3950 settings for %s', api_name)
         user_data = shelve.open(USER_DATA)
         target = user_data['Z3950s'][api_name]
         user_data.close()
 
     elif api_type == 'Sierra API':
-        module_logger.debug('Connecting to Sierra API')
+        module_logger.error('Sierra API is not implemented yet.')
+        raise OverloadError('Sierra API is not implemented yet.')
+    elif api_type != 'Platform API':
+        module_logger.error('Invalid api_type')
+        raise OverloadError('Invalid api_type encountered.')
+
+    timer = StageTimer()
 
     # clean-up batch metadata & stats
     if not template:
         template_name = None
     else:
         template_name = template.tName
-    module_logger.debug('Opening BATCH_META.')
-    batch = shelve.open(BATCH_META, writeback=True)
-    module_logger.debug(
-        'BATCH_META has been emptied from previous content.')
-    timestamp = datetime.now()
-    batch['timestamp'] = timestamp
-    batch['system'] = system
-    batch['library'] = library
-    batch['agent'] = agent
-    batch['template'] = template_name
-    batch['file_names'] = files
-    batch.close()
-    module_logger.debug(
-        'BATCH_META new data: {}, {}, {}, {}, {}, {}'.format(
-            timestamp, system, library, agent, template_name, files))
-
-    stats = shelve.open(BATCH_STATS, writeback=True)
-    stats.clear()
-
-    if not remove_files(BARCODES):
-        module_logger.error(
-            'Unable to empty BARCODES storage at location {}'.format(
-                BARCODES))
-        raise OverloadError('Unable to delete barcodes from previous batch.')
+    params = dict(
+        files=list(files), system=system, library=library, agent=agent,
+        api_type=api_type, api_name=api_name, template=template_name,
+        output_directory=output_directory)
+
+    journal = None
+    checkpoint = None
+    if resume:
+        journal = BatchJournal.load(BATCH_JOURNAL)
+        if journal is None or not journal.resumable:
+            raise OverloadError('There is no interrupted batch to resume.')
+        for key, value in params.iteritems():
+            if journal.params.get(key) != value:
+                module_logger.error(
+                    'Batch parameter %s (%s) does not match journal (%s).',
+                    key, value, journal.params.get(key))
+                raise OverloadError(
+                    'Unable to resume batch. Parameters do not match '
+                    'the interrupted batch.')
+        checkpoint = journal.last_checkpoint
+        module_logger.info(
+            'Resuming batch after record %s (file %s, record %s).',
+            checkpoint['n'], checkpoint['f'], checkpoint['pos'])
     else:
+        module_logger.debug('Opening BATCH_META.')
+        batch = shelve.open(BATCH_META, writeback=True)
+        module_logger.debug(
+            'BATCH_META has been emptied from previous content.')
+        timestamp = datetime.now()
+        batch['timestamp'] = timestamp
+        batch['system'] = system
+        batch['library'] = library
+        batch['agent'] = agent
+        batch['template'] = template_name
+        batch['file_names'] = files
+        batch.close()
         module_logger.debug(
-            'BATCH_STATS has been emptied from previous content.')
+            'BATCH_META new data: %s, %s, %s, %s, %s, %s',
+            timestamp, system, library, agent, template_name, files)
+
+        if not remove_files(BARCODES):
+            module_logger.error(
+                'Unable to empty BARCODES storage at location %s',
+                BARCODES)
+            raise OverloadError(
+                'Unable to delete barcodes from previous batch.')
 
     # determine output mrc files namehandles
-    if agent == 'cat':
+    if resume:
+        # output files keep names given when the batch started
+        outfiles = journal.params['outfiles']
+    elif agent == 'cat':
         date_today = date.today().strftime('%y%m%d')
-        fh_dups = os.path.join(
-            output_directory, '{}.DUP-0.mrc'.format(
-                date_today))
-        fh_new = os.path.join(
-            output_directory,
-            '{}.NEW-0.mrc'.format(
-                date_today))
-
-        # delete existing files to start over from scratch
-        if not remove_files([fh_new, fh_dups]):
-            module_logger.warning(
-                'Unable to delete PVF output files from previous batch.')
-            raise OverloadError(
-                'Unable to delete output files from previous batch.')
+        outfiles = [
+            os.path.join(
+                output_directory, '{}.DUP-0.mrc'.format(
+                    date_today)),
+            os.path.join(
+                output_directory,
+                '{}.NEW-0.mrc'.format(
+                    date_today))]
 
     elif agent in ('sel', 'acq'):
         # remove mrc extention if exists
@@ -134,22 +255,24 @@ def run_processing(
         if tail[-4:] == '.mrc':
             tail = tail[:-4]
         tail = '{}.PRC-0.mrc'.format(tail)
-        fh = os.path.join(output_directory, tail)
+        outfiles = [os.path.join(output_directory, tail)]
 
-        # delete existing files to start over from scratch
-        if not remove_files([fh]):
-            module_logger.warning(
-                'Unable to delete PVF output files from previous batch.')
-            raise OverloadError(
-                'Unable to delete output files from previous batch.')
+    if agent == 'cat':
+        fh_dups, fh_new = outfiles
+    elif agent in ('sel', 'acq'):
+        fh = outfiles[0]
 
     # create reference index
     module_logger.debug(
-        'Creatig vendor index data for {}-{}'.format(
-            system, agent))
+        'Creatig vendor index data for %s-%s',
+        system, agent)
+    vx = None
+    query_matchpoints = None
+    plan_960 = None
+    plan_961 = None
     if agent == 'cat':
         rules = './rules/cat_rules.xml'
-        vx = vendor_index(rules, system)  # wrap in exception?
+        vx = load_rules(rules, vendor_matcher, rules, system)
     elif agent in ('sel', 'acq'):
         if system == 'nypl':
             query_matchpoints = dict()
@@ -174,6 +297,9 @@ def run_processing(
                     else:
                         query_matchpoints['tertiary'] = (
                             'tag', template.match3rd)
+                # order template is merged with vendor order fields
+                # of each bib the same way
+                plan_960, plan_961 = order_template_plans(template)
             except NoResultFound:
                 raise OverloadError(
                     'Unable to find template {}.\n'
@@ -189,343 +315,298 @@ def run_processing(
     # run queries and results analysis for each bib in each file
     n = 0
     f = 0
-    for file in files:
-        f += 1
-        module_logger.debug(
-            'Opening new MARC reader for file: {}'.format(
-                file))
-        reader = read_marc21(file)
-
-        current_process_label.set('quering...')
-        for bib in reader:
-            n += 1
-
-            if agent == 'cat':
-                vendor = identify_vendor(bib, vx)
-
-                try:
-                    query_matchpoints = get_query_matchpoint(vendor, vx)
-                    module_logger.debug(
-                        'Cat vendor index has following query matchpoints: '
-                        '{} for vendor {}.'.format(
-                            query_matchpoints, vendor))
-
-                except KeyError:
-                    module_logger.critical(
-                        'Unable to match vendor {} with data '
-                        'in cat vendor index'.format(
-                            vendor))
-            elif agent in ('sel', 'acq'):
-                # vendor code
-                if system == 'nypl':
-                    vendor = template.vendor
-                    if vendor is None:
-                        # do not apply but keep for stats
-                        vendor = 'UNKNOWN'
+    pos = 0
+    resume_f = 0
+    resume_pos = 0
+    if checkpoint is not None:
+        n = checkpoint['n']
+        resume_f = checkpoint['f']
+        resume_pos = checkpoint['pos']
+        progbar['value'] = n
+        progbar.update()
+    deduped = checkpoint is not None and checkpoint['stage'] == 'deduped'
+    # files restored to the last checkpoint when resuming
+    journal_files = outfiles + [BATCH_STATS, BARCODES]
+    writer = MarcFileWriter()
+    verifier = BarcodeVerifier()
+    stats = None
+    barcodes_file = None
+
+    def commit():
+        # output files must be on disk before they are journaled
+        with timer.stage('journal'):
+            writer.sync()
+            stats.sync()
+            barcodes_file.flush()
+            os.fsync(barcodes_file.fileno())
+            journal.checkpoint(n, f, pos, file_offsets(journal_files))
+
+    # batch files and query resources are closed when processing ends
+    # on any path
+    engine = None
+    cache = None
+    try:
+        if resume:
+            truncate_files(checkpoint['offsets'])
+        else:
+            # delete existing files to start over from scratch
+            if not remove_files(outfiles):
+                module_logger.warning(
+                    'Unable to delete PVF output files from previous '
+                    'batch.')
+                raise OverloadError(
+                    'Unable to delete output files from previous batch.')
+            journal = BatchJournal.start(
+                BATCH_JOURNAL, dict(params, outfiles=outfiles))
 
-            if vendor == 'UNKNOWN':
-                module_logger.debug(
-                    'Encounted unidentified vendor in record # : {} '
-                    'in file {} (system={}, library={}, agent={})'.format(
-                        n, file, system, library, agent))
+        stats = BatchStatsWriter(BATCH_STATS, append=resume)
+        if resume and agent == 'cat':
+            for outfile in outfiles:
+                verifier.rescan(outfile)
+        barcodes_file = open(BARCODES, 'a')
 
-            # determine vendor bib meta
-            meta_in = VendorBibMeta(bib, vendor=vendor, dstLibrary=library)
-            module_logger.info('Vendor bib meta: {}'.format(str(meta_in)))
+        if not resume:
+            # batch can be resumed even before first records are committed
+            commit()
 
-            # store barcodes found in vendor files for verification
-            module_logger.debug('Storing barcodes for verification.')
-            with open(BARCODES, 'a') as barcodes_file:
-                for b in meta_in.barcodes:
-                    barcodes_file.write(b + '\n')
+        module_logger.debug(
+            'Opening match cache (bypass=%s, ttl=%s).',
+            bypass_cache, cache_ttl)
+        cache = MatchCache(ttl=cache_ttl, bypass=bypass_cache)
+        if api_type == 'Platform API':
+            module_logger.debug('Creating Platform API session.')
+            session = open_platform_session(api_name)
+            engine = PlatformQueryEngine(
+                api_type, api_name, session, cache=cache, timer=timer)
 
-            # Platform API workflow
+        for file in files:
+            f += 1
+            if f < resume_f:
+                continue
+            module_logger.debug(
+                'Opening new MARC reader for file: %s',
+                file)
+            reader = read_marc21(file)
+            pos = 0
+            if f == resume_f:
+                # skip records committed before interruption
+                pos = resume_pos
+                reader = islice(reader, resume_pos, None)
+            reader = timer.timed_iter('marc parsing', reader)
+
+            current_process_label.set('quering...')
+            vendor_bibs = prep_vendor_bibs(
+                reader, file, system, library, agent,
+                vx, template, query_matchpoints, timer)
+
+            # queries are run ahead of the analysis, but results
+            # are returned in the order of records in the file
             if api_type == 'Platform API':
-                matchpoint = query_matchpoints['primary'][1]
-                module_logger.debug(
-                    'Using primary marchpoint: {}.'.format(
-                        matchpoint))
-                try:
-                    result = run_platform_queries(
-                        api_type, session, meta_in, matchpoint)
-
-                except APITokenExpiredError:
-                    module_logger.info(
-                        'Platform token expired. '
-                        'Requesting new one and opening new session.')
-                    session = open_platform_session(api_name)
-                    result = platform_queries_manager(
-                        api_type, session, meta_in, matchpoint)
-
-                # run_patform_queries returns tuple (status, response in json)
-                meta_out = []
-
-                if result[0] == 'hit':
-                    meta_out = platform2meta(result[1])
-
-                elif result[0] == 'nohit':
-                    # requery with alternative matchpoint
-                    if 'secondary' in query_matchpoints:
-                        matchpoint = query_matchpoints['secondary'][1]
-                        module_logger.debug(
-                            'Using secondary marchpoint: {}.'.format(
-                                matchpoint))
-
-                        # run platform request for the secondary matchpoint
-                        try:
-                            result = run_platform_queries(
-                                api_type, session, meta_in, matchpoint)
-
-                        except APITokenExpiredError:
-                            module_logger.info(
-                                'Requesting new Platform token. '
-                                'Opening new session.')
-
-                            session = open_platform_session(api_name)
-                            result = run_platform_queries(
-                                api_type, session, meta_in, matchpoint)
-                            # other exceptions raised in run_platform_queries
-
-                        if result[0] == 'hit':
-                            meta_out = platform2meta(result[1])
-                        elif result[0] == 'nohit':
-                            # run query for the 3rd matchpoint
-                            if 'tertiary' in query_matchpoints:
-                                matchpoint = query_matchpoints['tertiary'][1]
-                                module_logger.debug(
-                                    'Using tertiary marchpoint: {}.'.format(
-                                        matchpoint))
-
-                                # run platform request for the tertiary
-                                # matchpoint
-                                try:
-                                    result = run_platform_queries(
-                                        api_type, session, meta_in, matchpoint)
-
-                                except APITokenExpiredError:
-                                    module_logger.info(
-                                        'Requesting new Platform token. '
-                                        'Opening new session.')
-
-                                    session = open_platform_session(api_name)
-                                    result = run_platform_queries(
-                                        api_type, session, meta_in, matchpoint)
-                                if result[0] == 'hit':
-                                    meta_out = platform2meta(result[1])
-                                elif result[0] == 'error':
-                                    raise OverloadError(
-                                        'Platform server error.')
-                        elif result[0] == 'error':
-                            raise OverloadError('Platform server error.')
-                    else:
-                        module_logger.debug(
-                            'No secondary matchpoint specified. '
-                            'Ending queries.')
-                elif result[0] == 'error':
-                    raise OverloadError('Platform server error.')
-
-            # queries performed via Z3950
+                queried_bibs = engine.map(vendor_bibs)
             elif api_type == 'Z3950':
-                meta_out = []
-                matchpoint = query_matchpoints['primary'][1]
-                module_logger.debug(
-                    'Using primary marchpoint: {}.'.format(
-                        matchpoint))
-                status, bibs = z3950_query_manager(
-                    target, meta_in, matchpoint)
-                if status == 'hit':
-                    meta_out = bibs2meta(bibs)
-                elif status == 'nohit' and \
-                        'secondary' in query_matchpoints:
-                    matchpoint = query_matchpoints['secondary'][1]
-                    module_logger.debug(
-                        'Using secondary matchpoint: {}'.format(
-                            matchpoint))
-                    status, bibs = z3950_query_manager(
-                        target, meta_in, matchpoint)
-                    if status == 'hit':
-                        meta_out = bibs2meta(bibs)
-                    elif status == 'nohit' and \
-                            'tertiary' in query_matchpoints:
-                        matchpoint = query_matchpoints['tertiary'][1]
-                        module_logger.debug(
-                            'Using tertiary matchpoint: {}'.format(
-                                matchpoint))
-                        status, bibs = z3950_query_manager(
-                            target, meta_in, matchpoint)
-                        if status == 'hit':
-                            meta_out = bibs2meta(bibs)
-                module_logger.info(
-                    'Retrieved bibs meta: {}'.format(
-                        meta_out))
-
-            # queries performed via Sierra API
-            elif api_type == 'Sierra API':
-                module_logger.error('Sierra API is not implemented yet.')
-                raise OverloadError('Sierra API is not implemented yet.')
-            else:
-                module_logger.error('Invalid api_type')
-                raise OverloadError('Invalid api_type encountered.')
+                queried_bibs = run_z3950_queries(
+                    target, vendor_bibs, cache, timer)
 
-            if system == 'nypl':
-                analysis = PVR_NYPLReport(agent, meta_in, meta_out)
-            elif system == 'bpl':
-                analysis = PVR_BPLReport(agent, meta_in, meta_out)
+            for (bib, vendor), meta_in, meta_out in queried_bibs:
+                n += 1
+                pos += 1
+                start = default_timer()
+                if system == 'nypl':
+                    analysis = PVR_NYPLReport(agent, meta_in, meta_out)
+                elif system == 'bpl':
+                    analysis = PVR_BPLReport(agent, meta_in, meta_out)
 
-            module_logger.debug('Analyzing query results and vendor bib')
-            analysis = analysis.to_dict()
+                module_logger.debug('Analyzing query results and vendor bib')
+                analysis = analysis.to_dict()
+                timer.add('analysis', default_timer() - start)
 
-            # apply patches if needed
-            try:
-                bib = patches.bib_patches(system, library, agent, vendor, bib)
-            except AssertionError as e:
-                module_logger.warning(
-                    'Unable to patch bib. Error: {}'.format(e))
-                analysis['callNo_match'] = False
+                # apply patches if needed
+                start = default_timer()
+                try:
+                    bib = patches.bib_patches(
+                        system, library, agent, vendor, bib)
+                except AssertionError as e:
+                    module_logger.warning(
+                        'Unable to patch bib. Error: %s', e)
+                    analysis['callNo_match'] = False
+
+                module_logger.info('PVF analysis results: %s', analysis)
 
-            module_logger.info('PVF analysis results: {}'.format(analysis))
+                # save analysis for statistical purposes
+                stats.write(n, analysis)
 
-            # save analysis to shelf for statistical purposes
-            stats[str(n)] = analysis
+                # store barcodes found in vendor files for verification
+                for b in meta_in.barcodes:
+                    barcodes_file.write(b + '\n')
 
-            # output processed records according to analysis
-            # add Sierra bib id if matched
+                # output processed records according to analysis
+                # add Sierra bib id if matched
 
-            # enforce utf-8 encoding in MARC leader
-            bib.leader = bib.leader[:9] + 'a' + bib.leader[10:]
+                # enforce utf-8 encoding in MARC leader
+                bib.leader = bib.leader[:9] + 'a' + bib.leader[10:]
 
-            sierra_id_present = check_sierra_id_presence(
-                system, bib)
-            module_logger.debug(
-                'Checking if vendor bib has Sierra ID provided: '
-                '{}'.format(sierra_id_present))
+                sierra_id_present = check_sierra_id_presence(
+                    system, bib)
+                module_logger.debug(
+                    'Checking if vendor bib has Sierra ID provided: '
+                    '%s', sierra_id_present)
 
-            if not sierra_id_present and \
-                    analysis['target_sierraId'] is not None:
+                if not sierra_id_present and \
+                        analysis['target_sierraId'] is not None:
 
-                try:
-                    module_logger.info(
-                        'Adding target Sierra id ({}) MARC field '
-                        'to vendor record {}.'.format(
+                    try:
+                        module_logger.info(
+                            'Adding target Sierra id (%s) MARC field '
+                            'to vendor record %s.',
                             analysis['vendor_id'],
-                            analysis['target_sierraId']))
-                    bib.add_field(
-                        create_target_id_field(
-                            system, analysis['target_sierraId']))
+                            analysis['target_sierraId'])
+                        bib.add_field(
+                            create_target_id_field(
+                                system, analysis['target_sierraId']))
 
-                except ValueError as e:
-                    module_logger.error(e)
-                    raise OverloadError(e)
+                    except ValueError as e:
+                        module_logger.error(e)
+                        raise OverloadError(e)
 
-            # add fields form bib & order templates
-            module_logger.debug(
-                'Adding template field(s) to the vendor record.')
-
-            if agent == 'cat':
-                templates = vx[vendor].get('bib_template')
+                # add fields form bib & order templates
                 module_logger.debug(
-                    'Selected CAT templates for {}: {}'.format(
-                        vendor, templates))
-                for catTemp in templates:
-                    # skip if present or always add
-                    if catTemp['tag'] == '949' and \
-                            analysis['action'] == 'attach':
-                        pass
-                    elif catTemp['option'] == 'skip':
-                        if catTemp['tag'] not in bib:
+                    'Adding template field(s) to the vendor record.')
+
+                if agent == 'cat':
+                    templates = vx[vendor].get('bib_template')
+                    module_logger.debug(
+                        'Selected CAT templates for %s: %s',
+                        vendor, templates)
+                    for catTemp in templates:
+                        # skip if present or always add
+                        if catTemp['tag'] == '949' and \
+                                analysis['action'] == 'attach':
+                            pass
+                        elif catTemp['option'] == 'skip':
+                            if catTemp['tag'] not in bib:
+                                module_logger.debug(
+                                    'Field %s not present, adding '
+                                    'from template',
+                                    catTemp['tag'])
+                                new_field = create_field_from_template(catTemp)
+                                bib.add_field(new_field)
+                            else:
+                                module_logger.debug(
+                                    'Field %s found. Skipping.',
+                                    catTemp['tag'])
+                        elif catTemp['option'] == 'add':
                             module_logger.debug(
-                                'Field {} not present, adding '
-                                'from template'.format(
-                                    catTemp['tag']))
+                                'Field %s being added without checking '
+                                'if already present',
+                                catTemp['tag'])
                             new_field = create_field_from_template(catTemp)
                             bib.add_field(new_field)
-                        else:
-                            module_logger.debug(
-                                'Field {} found. Skipping.'.format(
-                                    catTemp['tag']))
-                    elif catTemp['option'] == 'add':
-                        module_logger.debug(
-                            'Field {} being added without checking '
-                            'if already present'.format(
-                                catTemp['tag']))
-                        new_field = create_field_from_template(catTemp)
-                        bib.add_field(new_field)
 
-            elif agent in ('sel', 'acq'):
-                # batch template details should be retrieved instead for the
-                # whole batch = no need to pull it for each bib
-
-                new_fields = []
-                if '960' in bib:
-                    for t960 in bib.get_fields('960'):
-                        new_field = db_template_to_960(template, t960)
+                elif agent in ('sel', 'acq'):
+                    new_fields = []
+                    if '960' in bib:
+                        for t960 in bib.get_fields('960'):
+                            new_field = plan_960.apply(t960)
+                            if new_field:
+                                new_fields.append(new_field)
+                        bib.remove_fields('960')
+                    else:
+                        new_field = plan_960.apply(None)
                         if new_field:
                             new_fields.append(new_field)
-                    bib.remove_fields('960')
-                else:
-                    new_field = db_template_to_960(template, None)
-                    if new_field:
-                        new_fields.append(new_field)
-
-                # add modified fields back to record
-                for field in new_fields:
-                    bib.add_field(field)
-
-                new_fields = []
-                if '961' in bib:
-                    for t961 in bib.get_fields('961'):
-                        new_field = db_template_to_961(template, t961)
+
+                    # add modified fields back to record
+                    for field in new_fields:
+                        bib.add_field(field)
+
+                    new_fields = []
+                    if '961' in bib:
+                        for t961 in bib.get_fields('961'):
+                            new_field = plan_961.apply(t961)
+                            if new_field:
+                                new_fields.append(new_field)
+                        # remove existing fields
+                        # (will be replaced by modified ones)
+                        bib.remove_fields('961')
+                    else:
+                        new_field = plan_961.apply(None)
                         if new_field:
                             new_fields.append(new_field)
-                    # remove existing fields
-                    # (will be replaced by modified ones)
-                    bib.remove_fields('961')
-                else:
-                    new_field = db_template_to_961(template, None)
-                    if new_field:
-                        new_fields.append(new_field)
-
-                # add modified fields to bib
-                for field in new_fields:
-                    bib.add_field(field)
-
-                if template.bibFormat and \
-                        not sierra_command_tag(bib) and \
-                        agent == 'sel':
-                    new_field = db_template_to_949(template.bibFormat)
-                    bib.add_field(new_field)
-                    # it's safer for acquisition to skip command in 949 -
-                    # there are conflicts with Import Invoices load table
-
-            # apply bibliographic default location to NYPL brief records
-            if system == 'nypl' and agent == 'sel':
-                bib = set_nypl_sierra_bib_default_location(library, bib)
-
-            # append to appropirate output file
-            if agent == 'cat':
-                if analysis['action'] == 'attach':
-                    module_logger.debug(
-                        'Appending vendor record to the dup file.')
-                    write_marc21(fh_dups, bib)
+
+                    # add modified fields to bib
+                    for field in new_fields:
+                        bib.add_field(field)
+
+                    if template.bibFormat and \
+                            not sierra_command_tag(bib) and \
+                            agent == 'sel':
+                        new_field = db_template_to_949(template.bibFormat)
+                        bib.add_field(new_field)
+                        # it's safer for acquisition to skip command in 949 -
+                        # there are conflicts with Import Invoices load table
+
+                # apply bibliographic default location to NYPL brief records
+                if system == 'nypl' and agent == 'sel':
+                    bib = set_nypl_sierra_bib_default_location(library, bib)
+                timer.add('patching', default_timer() - start)
+
+                # append to appropirate output file
+                start = default_timer()
+                if agent == 'cat':
+                    if analysis['action'] == 'attach':
+                        module_logger.debug(
+                            'Appending vendor record to the dup file.')
+                        outfile = fh_dups
+                    else:
+                        module_logger.debug(
+                            'Appending vendor record to the new file.')
+                        outfile = fh_new
+                    # count barcodes of the record as it is written
+                    data = bib.as_marc()
+                    writer.write_raw(outfile, data)
+                    verifier.add_record(outfile, RawRecord(data))
                 else:
                     module_logger.debug(
-                        'Appending vendor record to the new file.')
-                    write_marc21(fh_new, bib)
-            else:
-                module_logger.debug(
-                    'Appending vendor record to a prc file.')
-                write_marc21(fh, bib)
-
-            # update progbar
-            progbar['value'] = n
-            progbar.update()
+                        'Appending vendor record to a prc file.')
+                    writer.write(fh, bib)
+                timer.add('writing', default_timer() - start)
+
+                # update progbar
+                progbar['value'] = n
+                progbar.update()
+
+                if n % CHECKPOINT_INTERVAL == 0:
+                    commit()
+
+                if control is not None:
+                    control.checkpoint()
+
+        if not deduped:
+            commit()
+    finally:
+        # output files must be complete before dedup and integrity checks
+        with timer.stage('writing'):
+            writer.close()
+            if stats is not None:
+                stats.close()
+            if barcodes_file is not None:
+                barcodes_file.close()
+        if journal is not None:
+            journal.close()
+        if engine is not None:
+            engine.close()
+        if api_type == 'Z3950':
+            close_z3950_connections()
+        if cache is not None:
+            cache.close()
 
     # dedup new cataloging file
-    if agent == 'cat' and os.path.isfile(fh_new):
+    if agent == 'cat' and os.path.isfile(fh_new) and not deduped:
         current_process_label.set('deduping...')
 
-        dups, combined_count, deduped_fh = dedup_marc_file(
-            fh_new, progbar)
+        with timer.stage('dedup'):
+            dups, combined_count, deduped_fh = dedup_marc_file(
+                fh_new, progbar)
 
         batch = shelve.open(BATCH_META, writeback=True)
         batch['duplicate_bibs'] = '{} dups merged into {} bibs'.format(
@@ -541,53 +622,80 @@ def run_processing(
                 raise OverloadError(
                     'Unable to manipulate deduped file')
 
+            # merged records are written anew
+            verifier.rescan(fh_new)
+            journal.checkpoint(
+                n, f, pos, file_offsets(journal_files), 'deduped')
+            journal.close()
+
     # validate intergrity of process files for cataloging
-    files_out = []
     if agent == 'cat':
-        if os.path.isfile(fh_dups):
-            files_out.append(fh_dups)
-        if os.path.isfile(fh_new):
-            files_out.append(fh_new)
-
-        valid, missing_barcodes = validate_processed_files_integrity(
-            files_out, BARCODES)
+        with timer.stage('integrity validation'):
+            if os.path.isfile(BARCODES):
+                verifier.load_expected(BARCODES)
+                valid = verifier.valid
+                missing_barcodes = verifier.missing()
+                extra_barcodes = verifier.extra()
+                duplicate_barcodes = verifier.duplicates()
+            else:
+                # no barcodes to check
+                valid = True
+                missing_barcodes = set()
+                extra_barcodes = set()
+                duplicate_barcodes = set()
         module_logger.debug(
-            'Integrity validation: {}, missing_barcodes: {}'.format(
-                valid, missing_barcodes))
+            'Integrity validation: %s, missing_barcodes: %s',
+            valid, missing_barcodes)
         if not valid:
             module_logger.error(
-                'Barcodes integrity error: {}'.format(
-                    missing_barcodes))
+                'Barcodes integrity error: missing=%s, extra=%s, '
+                'duplicates=%s',
+                missing_barcodes, extra_barcodes, duplicate_barcodes)
 
     batch = shelve.open(BATCH_META, writeback=True)
     processing_time = datetime.now() - batch['timestamp']
 
     module_logger.info(
-        'Batch processing stats: system={}, library={}, agent={}, user={}, '
-        'used template={}, file count={}, files={}, record count={}, '
-        'processing time={}'.format(
-            system, library, agent, USER_NAME, template_name,
-            f, [os.path.split(file)[1] for file in files], n, processing_time))
+        'Batch processing stats: system=%s, library=%s, agent=%s, user=%s, '
+        'used template=%s, file count=%s, files=%s, record count=%s, '
+        'processing time=%s',
+        system, library, agent, USER_NAME, template_name,
+        f, [os.path.split(file)[1] for file in files], n, processing_time)
     batch['processing_time'] = processing_time
+    batch['stage_times'] = timer.summary()
+    if engine is not None:
+        batch['platform_retries'] = engine.retry_summary()
     batch['processed_files'] = f
     batch['processed_bibs'] = n
     if agent == 'cat':
         batch['processed_integrity'] = valid
         batch['missing_barcodes'] = missing_barcodes
+        batch['extra_barcodes'] = extra_barcodes
+        batch['duplicate_barcodes'] = duplicate_barcodes
     batch.close()
-    stats.close()
 
-    # clean-up
-    # close any open session if Platform or Sierra API has been used
-    if api_type in ('Platform API', 'Sierra API') and session is not None:
-        session.close()
-        module_logger.debug('Closing API session.')
+    journal.complete()
+    journal.close()
 
     if agent == 'cat' and not valid:
         raise OverloadError(
             'Duplicate or missing barcodes found in processed files.')
 
 
+def interrupted_batch():
+    """
+    returns:
+        dict of parameters of interrupted batch that can be resumed
+        or None
+    """
+    journal = BatchJournal.load(BATCH_JOURNAL)
+    if journal is None or not journal.resumable:
+        return None
+    params = dict(journal.params)
+    params['processed_bibs'] = journal.last_checkpoint['n']
+    return params
+
+
 def save_stats():
     module_logger.debug('Saving batch stats.')
     batch = shelve.open(BATCH_META)
@@ -599,7 +707,7 @@ def save_stats():
     batch.close()
 
     try:
-        df = reports.shelf2dataframe(BATCH_STATS, system)
+        df = reports.stats2dataframe(BATCH_STATS, system)
     except ValueError:
         df = None
 
@@ -664,7 +772,7 @@ def save_template(record):
             insert_or_ignore(session, NYPLOrderTemplate, **record)
     except IntegrityError as e:
         module_logger.error(
-            'IntegrityError on template save: {}'.format(e))
+            'IntegrityError on template save: %s', e)
         raise OverloadError(
             'Duplicate/missing template name\n'
             'or missing primary matchpoint')
@@ -676,7 +784,7 @@ def update_template(otid, record):
             update_nypl_template(session, otid, **record)
     except IntegrityError as e:
         module_logger.error(
-            'IntegrityError on template update: {}'.format(e))
+            'IntegrityError on template update: %s', e)
         raise OverloadError(
             'Duplicate/missing template name\n'
             'or missing primary matchpoint')
@@ -0,0 +1,200 @@
+# persistent cache of Platform and Z3950 query results
+
+import logging
+import shelve
+import threading
+import time
+
+from cachetools import TTLCache
+from pymarc import Record
+
+
+from logging_setup import LogglyAdapter
+from setup_dirs import MATCH_CACHE
+
+
+module_logger = LogglyAdapter(logging.getLogger('overload'), None)
+
+
+# default time (in seconds) after which cached results are requeried
+MATCH_CACHE_TTL = 12 * 60 * 60
+# maximum number of results kept on disk
+MATCH_CACHE_MAXSIZE = 100000
+# share of maxsize evicted at once when cache grows larger than maxsize
+MATCH_CACHE_EVICT_RATIO = 0.1
+# maximum number of results kept in memory
+MATCH_CACHE_MEMORY_MAXSIZE = 5000
+
+
+def query_keywords(meta, matchpoint):
+    """
+    determines normalized keywords used in a query of particular matchpoint
+    args:
+        meta: BibMeta obj
+        matchpoint: str, '020', '022', '024', '001', or 'sierra_id'
+    returns:
+        keywords: str or None if no keywords to query
+    """
+    if matchpoint == '020':
+        keywords = meta.t020
+    elif matchpoint == '022':
+        keywords = meta.t022
+    elif matchpoint == '024':
+        keywords = meta.t024
+    elif matchpoint == '001':
+        keywords = [meta.t001]
+    elif matchpoint == 'sierra_id':
+        keywords = [meta.sierraId]
+    else:
+        return None
+
+    keywords = sorted(set([k.strip() for k in keywords if k]))
+    if keywords:
+        return u','.join(keywords)
+
+
+class MatchCache:
+    """
+    Two tier (memory and disk) cache of raw query results keyed by
+    query target, matchpoint and normalized keywords;
+    disk entries expire after ttl and least recently used entries are
+    evicted as soon as cache grows larger than maxsize; access times of
+    results used in this run are written back when cache is closed;
+    when bypass is True cached results are ignored, but the cache is
+    still refreshed with new results
+    args:
+        fh: str, path to the shelve file
+        ttl: int, time to live of cached results in seconds
+        maxsize: int, maximum number of results kept on disk
+        bypass: boolean, ignore cached results
+    """
+
+    def __init__(self, fh=MATCH_CACHE, ttl=MATCH_CACHE_TTL,
+                 maxsize=MATCH_CACHE_MAXSIZE, bypass=False):
+        self.fh = fh
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = TTLCache(
+            maxsize=min(MATCH_CACHE_MEMORY_MAXSIZE, maxsize), ttl=ttl)
+        self._accessed = dict()
+        self._store = shelve.open(fh, protocol=2)
+        self._size = len(self._store)
+
+    @staticmethod
+    def make_key(target, matchpoint, keywords):
+        key = u'|'.join([target, matchpoint, keywords])
+        return key.encode('utf-8')
+
+    def get(self, key):
+        """
+        returns cached result or None if not cached or expired
+        """
+        if self.bypass:
+            return None
+        with self._lock:
+            try:
+                value = self._memory[key]
+            except KeyError:
+                value = None
+                entry = self._store.get(key)
+                if entry is not None:
+                    stored_on, _, cached_value = entry
+                    if time.time() - stored_on > self.ttl:
+                        del self._store[key]
+                        self._size -= 1
+                    else:
+                        value = cached_value
+                        self._memory[key] = value
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._accessed[key] = time.time()
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            if key not in self._store:
+                self._size += 1
+            self._store[key] = (now, now, value)
+            self._memory[key] = value
+            self._accessed.pop(key, None)
+            if self._size > self.maxsize:
+                self._evict()
+
+    def _evict(self):
+        """
+        removes expired and least recently used results making room
+        for a share of maxsize new results, so the disk is not
+        scanned with each new result
+        """
+        now = time.time()
+        entries = []
+        for key in self._store.keys():
+            stored_on, accessed_on, _ = self._store[key]
+            if now - stored_on > self.ttl:
+                del self._store[key]
+                self._memory.pop(key, None)
+                self._accessed.pop(key, None)
+                continue
+            entries.append((self._accessed.get(key, accessed_on), key))
+        keep = self.maxsize - int(self.maxsize * MATCH_CACHE_EVICT_RATIO)
+        overflow = max(len(entries) - keep, 0)
+        if overflow:
+            entries.sort()
+            for _, key in entries[:overflow]:
+                del self._store[key]
+                self._memory.pop(key, None)
+                self._accessed.pop(key, None)
+        self._size = len(entries) - overflow
+        module_logger.debug(
+            'Match cache evicted %s entries.', overflow)
+
+    def _write_access_times(self):
+        for key, accessed_on in self._accessed.iteritems():
+            entry = self._store.get(key)
+            if entry is not None:
+                stored_on, _, value = entry
+                self._store[key] = (stored_on, accessed_on, value)
+        self._accessed.clear()
+
+    def close(self):
+        with self._lock:
+            if self._store is None:
+                return
+            module_logger.debug(
+                'Closing match cache: hits=%s, misses=%s',
+                self.hits, self.misses)
+            self._write_access_times()
+            self._store.close()
+            self._store = None
+            self._memory.clear()
+
+
+def platform_target(session):
+    return session.base_url
+
+
+def z3950_target(target):
+    return u'{}:{}/{}'.format(
+        target['host'], target['port'], target['database'])
+
+
+def serialize_z3950_result(result):
+    # pymarc records are stored as raw MARC21 data
+    status, bibs = result
+    if bibs is not None:
+        bibs = [bib.as_marc() for bib in bibs]
+    return (status, bibs)
+
+
+def deserialize_z3950_result(result):
+    status, bibs = result
+    if bibs is not None:
+        bibs = [Record(data=data) for data in bibs]
+    return (status, bibs)
@@ -0,0 +1,153 @@
+# parse-once stream of vendor records shared by batch checks
+
+import logging
+
+
+from bibs.bibs import read_marc21
+from bibs.raw_marc import iter_raw_marc21
+from errors import OverloadError
+from logging_setup import LogglyAdapter
+from validators import default, local_specs
+
+
+module_logger = LogglyAdapter(logging.getLogger('overload'), None)
+
+
+class RecordVisitor:
+    """
+    Base class of RecordStream visitors; subclasses override hooks
+    they need and return their findings from report method;
+    visitors that only read fields with get_fields, indicators and
+    get_subfields set raw to True and may be given
+    bibs.raw_marc.RawRecord objs instead of pymarc records
+    """
+
+    raw = False
+
+    def start_file(self, file):
+        pass
+
+    def visit(self, file, pos, bib):
+        pass
+
+    def end_file(self, file):
+        pass
+
+    def report(self):
+        return None
+
+
+class RecordCounter(RecordVisitor):
+    """
+    counts records in each file of the batch
+    """
+
+    raw = True
+
+    def __init__(self):
+        self.counts = dict()
+
+    def start_file(self, file):
+        self.counts[file] = 0
+
+    def visit(self, file, pos, bib):
+        self.counts[file] += 1
+
+    def report(self):
+        return sum(self.counts.values())
+
+
+class BarcodeDupsVisitor(RecordVisitor):
+    """
+    collects item barcodes of the batch and reports duplicates;
+    equivalent of validators.default.barcode_duplicates
+    args:
+        system: str, nypl or bpl
+    """
+
+    raw = True
+
+    def __init__(self, system):
+        self.system = system
+        self.barcodes = dict()
+
+    def visit(self, file, pos, bib):
+        for b in default.item_barcodes(bib, self.system):
+            self.barcodes.setdefault(b, []).append((file, pos))
+
+    def report(self):
+        return default.find_barcode_duplicates(self.barcodes)
+
+
+class LocalSpecsVisitor(RecordVisitor):
+    """
+    validates records against local specification;
+    equivalent of validators.local_specs.local_specs_validation
+    args:
+        system: str, nypl or bpl
+        specs: list, local specification created by local_specs.local_specs
+               or its compiled form (LocalSpecsValidator obj)
+    """
+
+    def __init__(self, system, specs):
+        self.system = system
+        self.specs = local_specs.compile_specs(specs)
+        self.files_issues = []
+
+    def start_file(self, file):
+        self.files_issues.append((file, []))
+
+    def visit(self, file, pos, bib):
+        bib_issues = local_specs.validate_bib(self.system, bib, self.specs)
+        if bib_issues != []:
+            self.files_issues[-1][1].append(
+                local_specs.record_issues(pos, bib_issues))
+
+    def report(self):
+        return local_specs.format_report(self.files_issues)
+
+
+class RecordStream:
+    """
+    Reads each record of the batch once and passes it to all
+    registered visitors; records are decoded with pymarc only
+    if any of the visitors requires it
+    args:
+        files: list of MARC files
+    usage:
+        stream = RecordStream(files)
+        counter = stream.register(RecordCounter())
+        stream.run()
+        counter.report()
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.visitors = []
+
+    def register(self, visitor):
+        self.visitors.append(visitor)
+        return visitor
+
+    def run(self):
+        for file in self.files:
+            module_logger.debug(
+                'Streaming records of file {} to {} visitor(s).'.format(
+                    file, len(self.visitors)))
+            for visitor in self.visitors:
+                visitor.start_file(file)
+            try:
+                if all([visitor.raw for visitor in self.visitors]):
+                    reader = iter_raw_marc21(file)
+                else:
+                    reader = read_marc21(file)
+                pos = 0
+                for bib in reader:
+                    pos += 1
+                    for visitor in self.visitors:
+                        visitor.visit(file, pos, bib)
+            except UnicodeDecodeError as e:
+                raise OverloadError(e)
+            for visitor in self.visitors:
+                visitor.end_file(file)
+        return self.visitors
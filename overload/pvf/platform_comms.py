@@ -1,77 +1,152 @@
 # module responsible for PVF communication with Platform
 
 import base64
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from requests.exceptions import ConnectionError, Timeout
 import shelve
+import threading
 
 
-from connectors.platform import AuthorizeAccess, PlatformSession
+from bibs.crosswalks import platform2meta
+from connectors.platform import AuthorizeAccess, PlatformSession, \
+    PlatformTokenProvider
 import credentials
-from errors import OverloadError, APITokenError, APITokenExpiredError
+from errors import OverloadError, APICriticalError, APITokenError, \
+    APITokenExpiredError
 from logging_setup import LogglyAdapter
 from pvf import queries
+from pvf.match_cache import query_keywords, platform_target
+from pvf.stage_timer import StageTimer
 from setup_dirs import USER_DATA
 
 
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 
 
-def open_platform_session(api_name=None):
+# number of Platform requests allowed to be in flight at the same time
+PLATFORM_WORKERS = 4
+# number of records read ahead of the one being currently analyzed
+PLATFORM_WINDOW = 16
+# number of records which standard numbers are sent in a single request
+PLATFORM_BATCH_SIZE = 10
+
+
+# Platform connections opened in this process (key: api name,
+# value: tuple of base_url and PlatformTokenProvider obj); the token
+# provider is shared by all sessions and workers of the connection
+_platform_connections = dict()
+_platform_connections_lock = threading.Lock()
+
+
+def save_platform_tokens():
+    """
+    stores latest tokens of opened Platform connections in user_data
+    for reuse by next app launch; tokens renewed in the background are
+    kept in memory only, so user_data is written solely by the caller,
+    which should be the GUI thread
+    """
+    with _platform_connections_lock:
+        connections = _platform_connections.items()
+    if not connections:
+        return
+
+    ud = shelve.open(USER_DATA)
+    try:
+        apis = ud.get('PlatformAPIs', {})
+        changed = False
+        for api_name, (_, provider) in connections:
+            if api_name not in apis:
+                module_logger.warning(
+                    'Platform connection %s no longer in user_data. '
+                    'Token not saved.', api_name)
+                continue
+            if apis[api_name].get('last_token') != provider.token:
+                apis[api_name]['last_token'] = provider.token
+                changed = True
+        if changed:
+            ud['PlatformAPIs'] = apis
+    finally:
+        ud.close()
+
+
+def _connect_platform(api_name):
     """
-    wrapper around platform authorization and platform session obj
+    reads Platform connection settings and starts its token provider
     args:
-        api_type str
         api_name str
     return:
-        session obj
+        tuple (base_url, PlatformTokenProvider obj)
     """
-    module_logger.debug('Preping to open Platform session.')
-    reusing_token = False
+    ud = shelve.open(USER_DATA)
     try:
-        ud = shelve.open(USER_DATA, writeback=True)
-
         # retrieve specified Platform authorization
         conn_data = ud['PlatformAPIs'][api_name]
         client_id = base64.b64decode(conn_data['client_id'])
         auth_server = conn_data['oauth_server']
         base_url = conn_data['host']
         last_token = conn_data['last_token']  # encrypt?
+    finally:
+        ud.close()
 
-        # retrieve secret from Windows Vault
-        client_secret = credentials.get_from_vault(
-            auth_server, client_id)
-
-        # check if valid token exists and reuse if can
-        if last_token is not None:
-            if last_token.get('expires_on') < datetime.now():
-                # token expired, request new one
-                module_logger.info(
-                    'Platform token expired. Requesting new one.')
-                auth = AuthorizeAccess(
-                    client_id, client_secret, auth_server)
-                token = auth.get_token()
-            else:
-                module_logger.debug(
-                    'Last Platform token still valid. Re-using.')
-                reusing_token = True
-                token = last_token
-        else:
-            module_logger.debug('Requesting Platform access token.')
-            auth = AuthorizeAccess(
-                client_id, client_secret, auth_server)
-            token = auth.get_token()
-
-        # save token for reuse
-        if not reusing_token:
-            module_logger.debug('Saving Platform token for reuse.')
-            ud['PlatformAPIs'][api_name]['last_token'] = token
+    # retrieve secret from Windows Vault
+    client_secret = credentials.get_from_vault(
+        auth_server, client_id)
+
+    auth = AuthorizeAccess(client_id, client_secret, auth_server)
+    provider = PlatformTokenProvider(auth, token=last_token)
+
+    # token is obtained upfront, so errors are reported here,
+    # and then kept valid in the background
+    if last_token is not None and \
+            provider.get_token() is last_token:
+        module_logger.debug('Last Platform token still valid. Re-using.')
+    else:
+        module_logger.debug('Obtained new Platform access token.')
+    provider.start()
+    return base_url, provider
+
+
+def discard_platform_connection(api_name):
+    """
+    stops token renewal of Platform connection, so changed settings
+    are read again when the next session is opened
+    args:
+        api_name str
+    """
+    with _platform_connections_lock:
+        connection = _platform_connections.pop(api_name, None)
+    if connection is not None:
+        connection[1].stop()
+
+
+def open_platform_session(api_name=None):
+    """
+    wrapper around platform authorization and platform session obj;
+    settings and token of the connection are read only when its first
+    session is opened
+    args:
+        api_name str
+    return:
+        session obj
+    """
+    module_logger.debug('Preping to open Platform session.')
+    try:
+        with _platform_connections_lock:
+            if api_name not in _platform_connections:
+                _platform_connections[api_name] = _connect_platform(
+                    api_name)
+            base_url, provider = _platform_connections[api_name]
+
+        module_logger.debug('Auth obtained. Opening Platform session.')
+        session = PlatformSession(base_url, token_provider=provider)
+        return session
 
     except KeyError as e:
         module_logger.error(
-            'KeyError in user_data: api name: {}. Error msg:{}'.format(
-                api_name, e))
+            'KeyError in user_data: api name: %s. Error msg:%s',
+            api_name, e)
         raise OverloadError(
             'Error parsing user_data while retrieving connection info.')
 
@@ -80,36 +155,28 @@ def open_platform_session(api_name=None):
         raise OverloadError(e)
 
     except APITokenError as e:
-        module_logger.error('Platform API Token Error: {}'.format(e))
+        module_logger.error('Platform API Token Error: %s', e)
         raise OverloadError(e)
 
     except ConnectionError as e:
-        module_logger.error('Platform Connection Error: {}'.format(e))
+        module_logger.error('Platform Connection Error: %s', e)
         raise OverloadError(e)
 
     except Timeout as e:
-        module_logger.error('Platform Timeout Error: {}'.format(e))
+        module_logger.error('Platform Timeout Error: %s', e)
         raise OverloadError(e)
 
-    finally:
-        ud.close()
 
-    # open Platform session
-    try:
-        module_logger.debug('Auth obtained. Opening Platform session.')
-        session = PlatformSession(base_url, token)
-        return session
-
-    except ValueError as e:
-        module_logger.error(e)
-        raise OverloadError(e)
+def _cache_key(cache, session, meta, matchpoint):
+    if cache is not None:
+        keywords = query_keywords(meta, matchpoint)
+        if keywords is not None:
+            return cache.make_key(
+                platform_target(session), matchpoint, keywords)
 
-    except APITokenExpiredError as e:
-        module_logger.error('Platform API token expired: {}'.format(e))
-        raise OverloadError(e)
 
-
-def platform_queries_manager(api_type, session, meta, matchpoint):
+def platform_queries_manager(
+        api_type, session, meta, matchpoint, cache=None):
     """
     Oversees queries sent to platform
     args:
@@ -117,20 +184,76 @@ def platform_queries_manager(api_type, session, meta, matchpoint):
         session obj
         meta obj
         matchpoint
+        cache MatchCache obj (optional)
     return:
         query result
     """
+    key = _cache_key(cache, session, meta, matchpoint)
+    if key is not None:
+        result = cache.get(key)
+        if result is not None:
+            module_logger.debug(
+                'Using cached Platform result for %s.', key)
+            return result
+
     module_logger.debug('Making new Platform request.')
+    result = _run_managed_query(
+        session, queries.query_runner, api_type, session, meta, matchpoint)
+
+    if key is not None and result[0] in ('hit', 'nohit'):
+        cache.set(key, result)
+    return result
+
+
+def platform_batch_queries_manager(session, metas, matchpoint, cache=None):
+    """
+    Oversees batched standard number queries sent to platform
+    args:
+        session obj
+        metas list of meta objs
+        matchpoint
+        cache MatchCache obj (optional)
+    return:
+        list of query results, one for each meta
+    """
+    results = [None] * len(metas)
+    keys = [_cache_key(cache, session, meta, matchpoint) for meta in metas]
+    for n, key in enumerate(keys):
+        if key is not None:
+            results[n] = cache.get(key)
+    positions = [n for n, result in enumerate(results) if result is None]
+    if not positions:
+        module_logger.debug('Using cached Platform results for the batch.')
+        return results
+
+    module_logger.debug('Making new Platform batch request.')
+    new_results = _run_managed_query(
+        session, queries.batch_query_runner, session,
+        [metas[n] for n in positions], matchpoint)
+
+    for n, result in zip(positions, new_results):
+        results[n] = result
+        if keys[n] is not None and result[0] in ('hit', 'nohit'):
+            cache.set(keys[n], result)
+    return results
+
+
+def _run_managed_query(session, runner, *args):
     try:
-        result = queries.query_runner(
-            api_type, session, meta, matchpoint)
-        return result
+        return runner(*args)
 
     except APITokenExpiredError:
         session.close()
         raise APITokenExpiredError(
             'Unable to perform query. Platform token expired.')
 
+    except APICriticalError:
+        module_logger.error(
+            'Platform requests suspended by circuit breaker. '
+            'Closing session and aborting processing.')
+        session.close()
+        raise
+
     except ConnectionError as e:
         module_logger.error(
             'ConnectionError while running Platform queries. '
@@ -149,3 +272,224 @@ def platform_queries_manager(api_type, session, meta, matchpoint):
         session.close()
         module_logger.error(e)
         raise OverloadError(e)
+
+
+class TimedPlatformSession:
+    """
+    Proxy of PlatformSession recording latency of requests sent to
+    each of the Platform endpoints (query_* methods)
+    args:
+        session: PlatformSession obj
+        timer: StageTimer obj
+    """
+
+    def __init__(self, session, timer):
+        self.session = session
+        self.timer = timer
+
+    def __getattr__(self, name):
+        attr = getattr(self.session, name)
+        if not name.startswith('query_'):
+            return attr
+
+        def timed_request(*args, **kwargs):
+            with self.timer.stage('platform {}'.format(name[6:])):
+                return attr(*args, **kwargs)
+        return timed_request
+
+
+class PlatformQueryEngine:
+    """
+    Runs Platform queries of many vendor records at the same time using
+    a bounded pool of worker threads; results are always returned in the
+    order records were submitted;
+    when batch_size is larger than 1, records with 020 or 024 primary
+    matchpoint are looked up together in a single request
+    args:
+        api_type: str, 'Platform API'
+        api_name: str, name of Platform connection in user_data
+        session: PlatformSession obj
+        workers: int, number of concurrent requests
+        window: int, maximum number of records queued ahead
+        batch_size: int, number of records sharing one standard number
+                    request
+        cache: MatchCache obj, cache of query results (optional)
+        timer: StageTimer obj, records latency of endpoints and time
+               spent waiting for query results (optional)
+    """
+
+    def __init__(self, api_type, api_name, session,
+                 workers=PLATFORM_WORKERS, window=PLATFORM_WINDOW,
+                 batch_size=PLATFORM_BATCH_SIZE, cache=None, timer=None):
+        self.api_type = api_type
+        self.api_name = api_name
+        self.timer = timer
+        self.session = self._timed(session)
+        self.cache = cache
+        self.workers = workers
+        self.batch_size = max(batch_size, 1)
+        # window is counted in groups of records sent to a worker
+        self.window = max(window // self.batch_size, workers, 1)
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _timed(self, session):
+        if self.timer is None or session is None:
+            return session
+        return TimedPlatformSession(session, self.timer)
+
+    def _run_query(self, meta, matchpoint):
+        # token of the session is kept valid by its token provider
+        return platform_queries_manager(
+            self.api_type, self.session, meta, matchpoint, self.cache)
+
+    def _run_batch_query(self, metas, matchpoint):
+        return platform_batch_queries_manager(
+            self.session, metas, matchpoint, self.cache)
+
+    def query(self, meta, query_matchpoints, result=None):
+        """
+        queries Platform using primary matchpoint and falls back
+        on secondary and tertiary ones if no match was found
+        args:
+            meta: VendorBibMeta obj
+            query_matchpoints: dict, matchpoints by preference
+            result: tuple, already obtained result of the primary query
+        returns:
+            meta_out: list of InhouseBibMeta objs
+        """
+        meta_out = []
+        for preference in ('primary', 'secondary', 'tertiary'):
+            if preference not in query_matchpoints:
+                module_logger.debug(
+                    'No %s matchpoint specified. Ending queries.',
+                    preference)
+                break
+            matchpoint = query_matchpoints[preference][1]
+            if preference == 'primary' and result is not None:
+                module_logger.debug(
+                    'Using batched primary matchpoint: %s.',
+                    matchpoint)
+            else:
+                module_logger.debug(
+                    'Using %s matchpoint: %s.',
+                    preference, matchpoint)
+                result = self._run_query(meta, matchpoint)
+
+            # query results are tuples (status, response)
+            if result[0] == 'hit':
+                meta_out = platform2meta(result[1])
+                break
+            elif result[0] == 'error':
+                raise OverloadError('Platform server error.')
+            elif result[0] != 'nohit':
+                break
+        return meta_out
+
+    def query_group(self, group):
+        """
+        queries Platform for a group of records; primary standard number
+        queries of the group are combined into one request for each
+        matchpoint
+        args:
+            group: list of tuples (meta, query_matchpoints)
+        returns:
+            list of meta_out lists in the order of the group
+        """
+        primary_results = [None] * len(group)
+        if self.batch_size > 1:
+            batched = dict()
+            for n, (meta, query_matchpoints) in enumerate(group):
+                try:
+                    matchpoint = query_matchpoints['primary'][1]
+                except (KeyError, TypeError):
+                    continue
+                if matchpoint in ('020', '024'):
+                    batched.setdefault(matchpoint, []).append(n)
+            for matchpoint, positions in batched.iteritems():
+                if len(positions) < 2:
+                    continue
+                results = self._run_batch_query(
+                    [group[n][0] for n in positions], matchpoint)
+                for n, result in zip(positions, results):
+                    primary_results[n] = result
+
+        return [
+            self.query(meta, query_matchpoints, result)
+            for (meta, query_matchpoints), result in zip(
+                group, primary_results)]
+
+    def _groups(self, items):
+        group = []
+        for meta, query_matchpoints, payload in items:
+            group.append((meta, query_matchpoints, payload))
+            if len(group) == self.batch_size:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    def map(self, items):
+        """
+        queries Platform for each of the items concurrently
+        args:
+            items: iterable of tuples (meta, query_matchpoints, payload)
+        yields:
+            tuples (payload, meta, meta_out) in the original order
+        """
+        # only waiting for results is timed, records are read and
+        # identified upstream in their own stages
+        timer = self.timer
+        if timer is None:
+            timer = StageTimer()
+
+        if self._executor is None:
+            for group in self._groups(items):
+                with timer.stage('query results'):
+                    results = self.query_group(
+                        [(meta, matchpoints)
+                         for meta, matchpoints, _ in group])
+                for (meta, _, payload), meta_out in zip(group, results):
+                    yield payload, meta, meta_out
+            return
+
+        pending = deque()
+        try:
+            for group in self._groups(items):
+                future = self._executor.submit(
+                    self.query_group,
+                    [(meta, matchpoints) for meta, matchpoints, _ in group])
+                pending.append((group, future))
+                if len(pending) >= self.window:
+                    group, future = pending.popleft()
+                    with timer.stage('query results'):
+                        results = future.result()
+                    for (meta, _, payload), meta_out in zip(group, results):
+                        yield payload, meta, meta_out
+            while pending:
+                group, future = pending.popleft()
+                with timer.stage('query results'):
+                    results = future.result()
+                for (meta, _, payload), meta_out in zip(group, results):
+                    yield payload, meta, meta_out
+        finally:
+            # abandon queued requests if processing was interrupted
+            for _, future in pending:
+                future.cancel()
+
+    def retry_summary(self):
+        """
+        returns:
+            dict of retried requests counts (see RetryStats.summary)
+        """
+        if self.session is None:
+            return None
+        return self.session.retry_stats.summary()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.session is not None:
+            self.session.close()
@@ -3,6 +3,7 @@ from ftplib import error_perm
 import logging
 import os
 import os.path
+import Queue
 import shelve
 import shutil
 import sys
@@ -19,16 +20,21 @@ from datastore import NYPLOrderTemplate, session_scope
 from db_worker import retrieve_record, create_db_object
 import connectors.goo as goo
 from connectors.goo_settings.access_names import GAPP, GUSER
-from errors import OverloadError
+from errors import OverloadError, BatchCancelledError
 from ftp_manager import store_connection, delete_connection, \
     get_ftp_connections, get_connection_details, connect2ftp, \
     disconnect_ftp, read_ftp_content, move2ftp, move2local
 from gui_utils import ToolTip, BusyManager
 from logging_setup import format_traceback, LogglyAdapter
 from manager import run_processing, save_stats, save_template, \
-    update_template, delete_template, get_template_names
+    update_template, delete_template, get_template_names, interrupted_batch
 import overload_help
 from pvf import goo_comms
+from pvf.batch_stats import clear_batch_stats
+from pvf.batch_worker import BatchControl, BatchWorker, FRAME_INTERVAL, \
+    ProgressbarProxy, StringVarProxy
+from pvf.match_cache import MATCH_CACHE_TTL
+from pvf.platform_comms import save_platform_tokens
 import reports
 from setup_dirs import MY_DOCS, USER_DATA, CVAL_REP, \
     LSPEC_REP, DVAL_REP, BATCH_META, BATCH_STATS
@@ -1733,6 +1739,11 @@ class ProcessVendorFiles(tk.Frame):
         self.last_used_agent = None
         self.template = tk.StringVar()
         self.templateChange = tk.IntVar()
+        self.bypassCache = tk.IntVar()
+        self.cacheHours = tk.IntVar()
+        self.cacheHours.set(MATCH_CACHE_TTL // 3600)
+        self.batch_control = None
+        self.paused_process = ''
 
         # logos
         self.nyplLogo = tk.PhotoImage(file='./icons/nyplLogo.gif')
@@ -1911,6 +1922,40 @@ class ProcessVendorFiles(tk.Frame):
             variable=self.locVal).grid(
             row=8, column=3, columnspan=2, sticky='snw', padx=15)
 
+        # queries area
+        self.queriesLbl = ttk.Label(
+            self.baseFrm,
+            text='queries:')
+        self.queriesLbl.grid(
+            row=10, column=1, sticky='nw')
+        self.bypassCacheCbtn = ttk.Checkbutton(
+            self.baseFrm,
+            cursor='hand2',
+            text='bypass query cache',
+            variable=self.bypassCache)
+        self.bypassCacheCbtn.grid(
+            row=10, column=2, sticky='snw')
+        self.createToolTip(
+            self.bypassCacheCbtn,
+            'requery Platform/Z3950 instead of using results\n'
+            'cached by earlier runs of the same records')
+        ttk.Label(
+            self.baseFrm,
+            text='cache results (hours):').grid(
+            row=10, column=3, sticky='snw', padx=15)
+        self.cacheHoursCbx = ttk.Combobox(
+            self.baseFrm,
+            textvariable=self.cacheHours,
+            values=(1, 6, 12, 24, 48, 168),
+            state='readonly',
+            width=4)
+        self.cacheHoursCbx.grid(
+            row=10, column=4, sticky='snw')
+        self.createToolTip(
+            self.cacheHoursCbx,
+            'time after which cached Platform/Z3950 results\n'
+            'are considered outdated and requeried')
+
         self.processBtn = ttk.Button(
             self.baseFrm,
             text='process',
@@ -1933,6 +1978,39 @@ class ProcessVendorFiles(tk.Frame):
         self.current_processLbl.grid(
             row=13, column=3, columnspan=2, sticky='snw', padx=5, pady=10)
 
+        self.pauseBtn = ttk.Button(
+            self.baseFrm,
+            text='pause',
+            command=self.pause_processing,
+            cursor='hand2',
+            state=tk.DISABLED,
+            width=12)
+        self.pauseBtn.grid(
+            row=13, column=5, sticky='nw')
+
+        self.cancelBtn = ttk.Button(
+            self.baseFrm,
+            text='cancel',
+            command=self.cancel_processing,
+            cursor='hand2',
+            state=tk.DISABLED,
+            width=12)
+        self.cancelBtn.grid(
+            row=13, column=6, sticky='nw')
+
+        self.resumeBtn = ttk.Button(
+            self.baseFrm,
+            text='resume batch',
+            command=self.resume_batch,
+            cursor='hand2',
+            width=12)
+        self.resumeBtn.grid(
+            row=14, column=1, sticky='nw')
+        self.createToolTip(
+            self.resumeBtn,
+            'continue interrupted batch after\n'
+            'the last saved record')
+
         # report layout
         self.reportFrm = ttk.Frame(
             self.baseFrm,
@@ -2127,6 +2205,7 @@ class ProcessVendorFiles(tk.Frame):
         user_data['pvr_locval'] = self.locVal.get()
         user_data['pvr_marcval'] = self.marcVal.get()
         user_data['pvr_template'] = self.template.get()
+        user_data['pvr_cache_hours'] = self.cacheHours.get()
         # delete any stored SEL or ACQ template
         user_data['pvr_order_template'] = None
 
@@ -2250,9 +2329,7 @@ class ProcessVendorFiles(tk.Frame):
             batch.clear()
             batch.close()
 
-            stats = shelve.open(BATCH_STATS)
-            stats.clear()
-            stats.close()
+            clear_batch_stats(BATCH_STATS)
 
             # calculate maximum for progbar
             legal_files = True
@@ -2343,13 +2420,14 @@ class ProcessVendorFiles(tk.Frame):
                     user_data.close()
 
                 try:
-                    run_processing(
+                    self.run_batch(
                         self.files, self.system.get().lower(),
                         self.library.get(), self.agent.get()[:3],
                         self.target['method'], self.target['target'],
                         template,
                         self.last_directory,
-                        self.progbar, self.current_process)
+                        bypass_cache=self.bypassCache.get() == 1,
+                        cache_ttl=self.cacheHours.get() * 3600)
 
                     # confirm files have been processed
                     self.processed.set(
@@ -2361,6 +2439,10 @@ class ProcessVendorFiles(tk.Frame):
                     # launch processing report
                     self.batch_summary_window()
 
+                except BatchCancelledError as e:
+                    self.current_process.set('cancelled...')
+                    self.cur_manager.notbusy()
+                    tkMessageBox.showinfo('Processing Cancelled', e)
                 except OverloadError as e:
                     self.current_process.set('interrupted...')
                     self.cur_manager.notbusy()
@@ -2378,8 +2460,142 @@ class ProcessVendorFiles(tk.Frame):
                         'Processing Error', exc)
                 finally:
                     self.templateChange.set(0)
+                    self.bypassCache.set(0)
                     self.cur_manager.notbusy()
 
+    def run_batch(self, *args, **kwargs):
+        """
+        runs run_processing on a worker thread keeping the GUI
+        responsive; progress posted by the worker is applied every
+        FRAME_INTERVAL; exceptions raised by the worker are re-raised
+        here
+        """
+        self.batch_control = BatchControl()
+        events = Queue.Queue()
+        worker = BatchWorker(
+            events, run_processing, *args,
+            progbar=ProgressbarProxy(
+                events, maximum=self.progbar['maximum'], value=0),
+            current_process_label=StringVarProxy(
+                events, self.current_process.get()),
+            control=self.batch_control, **kwargs)
+        done = tk.IntVar(self, 0)
+
+        def apply_progress():
+            alive = worker.is_alive()
+            for kind, key, value in worker.drain():
+                if kind == 'progbar':
+                    self.progbar[key] = value
+                elif kind == 'label':
+                    self.current_process.set(value)
+            if alive:
+                self.after(FRAME_INTERVAL, apply_progress)
+            else:
+                done.set(1)
+
+        self.processBtn['state'] = tk.DISABLED
+        self.resumeBtn['state'] = tk.DISABLED
+        self.pauseBtn['state'] = tk.NORMAL
+        self.cancelBtn['state'] = tk.NORMAL
+        try:
+            worker.start()
+            self.after(FRAME_INTERVAL, apply_progress)
+            self.wait_variable(done)
+        finally:
+            # tokens renewed during the batch are stored by GUI thread
+            save_platform_tokens()
+            self.batch_control = None
+            self.processBtn['state'] = tk.NORMAL
+            self.resumeBtn['state'] = tk.NORMAL
+            self.pauseBtn['text'] = 'pause'
+            self.pauseBtn['state'] = tk.DISABLED
+            self.cancelBtn['state'] = tk.DISABLED
+        return worker.result()
+
+    def resume_batch(self):
+        params = interrupted_batch()
+        if params is None:
+            tkMessageBox.showinfo(
+                'Resume Batch', 'There is no interrupted batch to resume.')
+            return
+
+        m = 'Resume processing of {} file(s) after record {}?\n' \
+            'system: {}, library: {}, department: {}'.format(
+                len(params['files']), params['processed_bibs'],
+                params['system'].upper(), params['library'],
+                params['agent'].upper())
+        if not tkMessageBox.askyesno('Resume Batch', m):
+            return
+
+        self.reset()
+        self.cur_manager.busy()
+
+        # order template used by interrupted batch
+        user_data = shelve.open(USER_DATA)
+        template = user_data['pvr_order_template']
+        user_data.close()
+
+        try:
+            total_bib_count = 0
+            for file in params['files']:
+                total_bib_count += bibs.count_bibs(file)
+            self.progbar['maximum'] = total_bib_count
+            self.last_directory = params['output_directory']
+
+            self.run_batch(
+                params['files'], params['system'], params['library'],
+                params['agent'], params['api_type'], params['api_name'],
+                template, params['output_directory'], resume=True,
+                cache_ttl=self.cacheHours.get() * 3600)
+
+            self.processed.set(
+                'processed: {} file(s) including {} record(s)'.format(
+                    len(params['files']), total_bib_count))
+            self.current_process.set('')
+
+            # launch processing report
+            self.batch_summary_window()
+
+        except BatchCancelledError as e:
+            self.current_process.set('cancelled...')
+            tkMessageBox.showinfo('Processing Cancelled', e)
+        except OverloadError as e:
+            self.current_process.set('interrupted...')
+            tkMessageBox.showerror('Processing Error', e)
+        except Exception as exc:
+            self.current_process.set('interrupted...')
+            # log and display error
+            _, _, exc_traceback = sys.exc_info()
+            tb = format_traceback(exc, exc_traceback)
+            module_logger.error(
+                'Unhandled error: {}'.format(tb))
+            tkMessageBox.showerror(
+                'Processing Error', exc)
+        finally:
+            self.cur_manager.notbusy()
+
+    def pause_processing(self):
+        if self.batch_control is None:
+            return
+        if self.batch_control.paused:
+            self.batch_control.resume()
+            self.pauseBtn['text'] = 'pause'
+            self.current_process.set(self.paused_process)
+        else:
+            self.batch_control.pause()
+            self.pauseBtn['text'] = 'resume'
+            self.paused_process = self.current_process.get()
+            self.current_process.set('paused...')
+
+    def cancel_processing(self):
+        if self.batch_control is None:
+            return
+        if tkMessageBox.askyesno(
+                'Cancel Processing',
+                'Stop processing of the batch?\n'
+                'Output files will be incomplete.'):
+            self.batch_control.cancel()
+
     def archive(self):
         try:
             save_stats()
@@ -2742,7 +2958,7 @@ class ProcessVendorFiles(tk.Frame):
             module_logger.debug(
                 'Mapping BATCH_STATS to dataframe for general '
                 'stats report for {}.'.format(self.last_used_sys))
-            df = reports.shelf2dataframe(BATCH_STATS, self.last_used_sys)
+            df = reports.stats2dataframe(BATCH_STATS, self.last_used_sys)
         except KeyError as e:
             module_logger.error(
                 'Unable to map BATCH_STATS to dataframe. '
@@ -2830,7 +3046,7 @@ class ProcessVendorFiles(tk.Frame):
 
         # create dataframe to be tabulated
         try:
-            df = reports.shelf2dataframe(BATCH_STATS, self.last_used_sys)
+            df = reports.stats2dataframe(BATCH_STATS, self.last_used_sys)
         except KeyError as e:
             module_logger.error(
                 'Unable to map BATCH_STATS to dataframe. '
@@ -3261,6 +3477,8 @@ class ProcessVendorFiles(tk.Frame):
                 self.marcVal.set(user_data['pvr_marcval'])
             if 'pvr_locval' in user_data:
                 self.locVal.set(user_data['pvr_locval'])
+            if 'pvr_cache_hours' in user_data:
+                self.cacheHours.set(user_data['pvr_cache_hours'])
             if 'pvr_default_save_dir' in user_data[
                     'paths']:
                 self.last_directory = user_data[
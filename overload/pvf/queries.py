@@ -4,6 +4,7 @@ from pymarc import Record
 
 
 from connectors.sierra_z3950 import Z3950_QUALIFIERS, z3950_query
+from bibs.parsers import parse_isbn
 from bibs.patches import remove_oclc_prefix
 from logging_setup import LogglyAdapter
 
@@ -11,6 +12,10 @@ from logging_setup import LogglyAdapter
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 
 
+# number of bibs requested per page in batched Platform queries
+PLATFORM_PAGE_LIMIT = 50
+
+
 def platform_status_interpreter(response=None):
     """
     iterprets request status codes results and raises appropriate msg to
@@ -24,8 +29,8 @@ def platform_status_interpreter(response=None):
     if response is not None:
         code = response.status_code
         module_logger.info(
-            'Platform response status code: {}'.format(
-                code))
+            'Platform response status code: %s',
+            code)
         if code == 200:
             status = 'hit'
         elif code == 404:
@@ -41,9 +46,9 @@ def platform_status_interpreter(response=None):
         else:
             module_logger.error(
                 'Platform returned unidentified '
-                'status code: {}, text: {}'.format(
-                    response.status_code,
-                    response.text))
+                'status code: %s, text: %s',
+                response.status_code,
+                response.text)
             status = None
     else:
         module_logger.debug(
@@ -52,6 +57,140 @@ def platform_status_interpreter(response=None):
     return status
 
 
+def isbn10to13(isbn):
+    """
+    converts 10 digit ISBN to its 13 digit form
+    args:
+        isbn: str
+    return:
+        str or None if isbn is not 10 digit ISBN
+    """
+    if len(isbn) != 10 or not isbn[:9].isdigit():
+        return None
+    digits = '978' + isbn[:9]
+    total = sum(
+        int(d) * (1 if n % 2 == 0 else 3) for n, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def normalize_standard_numbers(numbers):
+    """
+    normalizes standard numbers, so numbers returned by Platform can be
+    compared with vendor 020/024 values; ISBNs are also given in their
+    13 digit form
+    args:
+        numbers: list of str
+    return:
+        set of str
+    """
+    normalized = set()
+    for number in numbers:
+        try:
+            normalized.add(number.replace('-', '').split(' ')[0])
+            isbn = parse_isbn(number)
+            if isbn is not None:
+                normalized.add(isbn)
+                isbn13 = isbn10to13(isbn)
+                if isbn13 is not None:
+                    normalized.add(isbn13)
+        except AttributeError:
+            pass
+    return normalized
+
+
+def batch_query_runner(session, metas, matchpoint, limit=PLATFORM_PAGE_LIMIT):
+    """
+    sends 020 or 024 keywords of many vendor bibs in a single Platform
+    request (paging through results if needed) and splits returned bibs
+    back to the vendor bibs whose keywords they match
+    args:
+        session: PlatformSession obj
+        metas: list of VendorBibMeta objs
+        matchpoint: str, '020' or '024'
+        limit: int, number of bibs requested per page
+    return:
+        list of (status, response) tuples, one for each meta
+    """
+    if matchpoint == '020':
+        metas_keywords = [meta.t020 for meta in metas]
+    elif matchpoint == '024':
+        metas_keywords = [meta.t024 for meta in metas]
+    else:
+        module_logger.error(
+            'Unsupported batch matchpoint specified: %s',
+            matchpoint)
+        raise ValueError(
+            'unsupported batch matchpoint specified: {}'.format(
+                matchpoint))
+
+    keywords = []
+    for meta_keywords in metas_keywords:
+        for keyword in meta_keywords:
+            if keyword not in keywords:
+                keywords.append(keyword)
+
+    if not keywords:
+        module_logger.debug(
+            'No data to query. Skipping request.')
+        return [('nohit', None)] * len(metas)
+
+    module_logger.info(
+        'Platform bibStandardNo endpoint batch request, '
+        'keywords (%s): %s',
+        matchpoint, keywords)
+
+    data = []
+    offset = 0
+    while True:
+        response = session.query_bibStandardNo(
+            keywords=keywords, limit=limit, offset=offset)
+        status = platform_status_interpreter(response)
+        if status == 'hit':
+            page = response.json().get('data', [])
+            data.extend(page)
+            if len(page) < limit:
+                break
+            offset += limit
+        elif status == 'nohit':
+            break
+        else:
+            return [(status, None)] * len(metas)
+
+    # split retrieved bibs among vendor records
+    bibs_numbers = [
+        normalize_standard_numbers(bib.get('standardNumbers', []))
+        for bib in data]
+    results = []
+    attributed = set()
+    for meta_keywords in metas_keywords:
+        meta_keywords = normalize_standard_numbers(meta_keywords)
+        matched = []
+        for n, numbers in enumerate(bibs_numbers):
+            if meta_keywords & numbers:
+                matched.append(data[n])
+                attributed.add(n)
+        if matched:
+            results.append(('hit', {'data': matched}))
+        else:
+            results.append(('nohit', None))
+
+    # Platform matched some bibs differently than the numbers
+    # can be compared here; records left without a hit are queried
+    # on their own, so their matches are not lost
+    if len(attributed) < len(data):
+        module_logger.debug(
+            'Not all bibs of batch request attributed to vendor records. '
+            'Querying records without a hit individually.')
+        for n, meta in enumerate(metas):
+            if results[n][0] == 'nohit':
+                results[n] = query_runner(
+                    'Platform API', session, meta, matchpoint)
+    module_logger.debug(
+        'Platform batch request results: %s',
+        [status for status, _ in results])
+    return results
+
+
 def query_runner(request_dst, session, bibmeta, matchpoint):
     """
     picks api endpoint and runs the query
@@ -63,8 +202,8 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
             if len(bibmeta.t020) > 0:
                 module_logger.info(
                     'Platform bibStandardNo endpoint request, '
-                    'keywords (020): {}'.format(
-                        bibmeta.t020))
+                    'keywords (020): %s',
+                    bibmeta.t020)
                 response = session.query_bibStandardNo(keywords=bibmeta.t020)
             else:
                 # do not attempt even to make a request to API
@@ -73,8 +212,8 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
             if len(bibmeta.t024) > 0:
                 module_logger.info(
                     'Platform bibStandardNo endpoint request, '
-                    'keywords (024): {}'.format(
-                        bibmeta.t024))
+                    'keywords (024): %s',
+                    bibmeta.t024)
                 response = session.query_bibStandardNo(keywords=bibmeta.t024)
             else:
                 response = None
@@ -83,8 +222,8 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
                 # sierraID must be passed as a list to query_bibId
                 module_logger.info(
                     'Platform bibId endpoint request, '
-                    'keywords (sierra id): {}'.format(
-                        bibmeta.sierraId))
+                    'keywords (sierra id): %s',
+                    bibmeta.sierraId)
                 response = session.query_bibId(keywords=[bibmeta.sierraId])
             else:
                 response = None
@@ -92,8 +231,8 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
             if bibmeta.t001 is not None:
                 module_logger.info(
                     'Platform bibControlNo endpoint request, '
-                    'keywords (001): {}'.format(
-                        bibmeta.t001))
+                    'keywords (001): %s',
+                    bibmeta.t001)
                 stripped, controlNo_without_prefix = remove_oclc_prefix(
                     bibmeta.t001)
                 if stripped:
@@ -102,23 +241,22 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
                     keywords = [bibmeta.t001]
                 module_logger.info(
                     'Platform bibControlNo endpoint request, '
-                    'keywords (001): {}'.format(
-                        keywords))
+                    'keywords (001): %s',
+                    keywords)
                 response = session.query_bibControlNo(
                     keywords=keywords)
             else:
                 response = None
         else:
             module_logger.error(
-                'Unsupported matchpoint specified: {}'.format(
-                    matchpoint))
+                'Unsupported matchpoint specified: %s',
+                matchpoint)
             raise ValueError(
                 'unsupported matchpoint specified: {}'.format(
                     matchpoint))
 
         status = platform_status_interpreter(response)
-        module_logger.debug('Platform response: {}'.format(
-            status))
+        module_logger.debug('Platform response: %s', status)
 
         if response is not None:
             module_logger.debug(
@@ -131,20 +269,20 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
     elif request_dst == 'Z3950':
         if matchpoint == '020':
             module_logger.debug(
-                'Vendor query keywords (020): {}'.format(
-                    bibmeta.t020))
+                'Vendor query keywords (020): %s',
+                bibmeta.t020)
             qualifier = Z3950_QUALIFIERS['isbn']
             keywords = bibmeta.t020
         elif matchpoint == '022':
             module_logger.debug(
-                'Vendor query keywords (022): {}'.format(
-                    bibmeta.t022))
+                'Vendor query keywords (022): %s',
+                bibmeta.t022)
             qualifier = Z3950_QUALIFIERS['issn']
             keywords = bibmeta.t022
         elif matchpoint == 'sierra_id':
             module_logger.debug(
-                'Vendor query keywords (sierra id): {}'.format(
-                    bibmeta.sierraId))
+                'Vendor query keywords (sierra id): %s',
+                bibmeta.sierraId)
             qualifier = Z3950_QUALIFIERS['bib number']
             keywords = bibmeta.sierraId
 
@@ -153,9 +291,9 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
         if matchpoint in ('020', '022'):
             for keyword in keywords:
                 module_logger.info(
-                    'Z3950 request params: host={}, keyword={}, '
-                    'qualifier={}'.format(
-                        session['host'], keyword, qualifier))
+                    'Z3950 request params: host=%s, keyword=%s, '
+                    'qualifier=%s',
+                    session['host'], keyword, qualifier)
                 success, results = z3950_query(
                     target=session,
                     keyword=keyword,
@@ -167,9 +305,9 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
         elif matchpoint == 'sierra_id':
             if keywords and len(keywords) == 8:
                 module_logger.info(
-                    'Z3950 query params: host={}, keyword={}, '
-                    'qualifier={}'.format(
-                        session['host'], keywords, qualifier))
+                    'Z3950 query params: host=%s, keyword=%s, '
+                    'qualifier=%s',
+                    session['host'], keywords, qualifier)
                 success, results = z3950_query(
                     target=session,
                     keyword=keywords,
@@ -188,13 +326,12 @@ def query_runner(request_dst, session, bibmeta, matchpoint):
             status = 'hit'
             response = retrieved_bibs
         module_logger.info(
-            'Z3950 request results: {}, number of matches: {}'.format(
-                status, len(retrieved_bibs)))
+            'Z3950 request results: %s, number of matches: %s',
+            status, len(retrieved_bibs))
         return status, response
 
     else:
-        module_logger.error('Unsupported query target: {}'.format(
-            request_dst))
+        module_logger.error('Unsupported query target: %s', request_dst)
         raise ValueError(
             'Unsupported query target: {}'.format(
                 request_dst))
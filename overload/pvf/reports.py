@@ -10,6 +10,8 @@ from sqlalchemy import func
 
 from datastore import PVR_Batch, PVR_File, Vendor, session_scope
 from logging_setup import LogglyAdapter
+from pvf.batch_stats import read_batch_stats
+from pvf.stage_timer import format_stage_times
 
 
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
@@ -48,6 +50,16 @@ def generate_processing_summary(batch_meta):
     summary.append(
         'processing time: {}\n'.format(
             meta['processing_time']))
+    if meta.get('stage_times'):
+        summary.append('stage times:\n')
+        summary.extend(format_stage_times(meta['stage_times']))
+    retries = meta.get('platform_retries')
+    if retries:
+        summary.append(
+            'Platform retries: {retries} retries of {retried_requests} '
+            'requests (out of {requests}), added latency: '
+            '{added_latency:.1f}s, failed requests: {failed_requests}, '
+            'suspended requests: {rejected_requests}\n'.format(**retries))
     if agent == 'cat':
         try:
             summary.append(
@@ -58,6 +70,14 @@ def generate_processing_summary(batch_meta):
                     meta['missing_barcodes']))
         except KeyError:
             pass
+        if meta.get('extra_barcodes'):
+            summary.append(
+                'unexpected barcodes in processed files: {}\n'.format(
+                    meta['extra_barcodes']))
+        if meta.get('duplicate_barcodes'):
+            summary.append(
+                'duplicate barcodes in processed files: {}\n'.format(
+                    meta['duplicate_barcodes']))
         try:
             summary.append(
                 'duplicates: {}\n'.format(meta['duplicate_bibs']))
@@ -71,30 +91,18 @@ def generate_processing_summary(batch_meta):
     return system, library, agent, summary
 
 
-def shelf2dataframe(batch_stats, system):
-    stats = shelve.open(batch_stats)
-    frames = []
-    list2str = ['inhouse_dups', 'mixed', 'other']
-    for key, value in stats.iteritems():
-        if value['target_sierraId'] is not None:
-            if len(value['target_sierraId']) == 8:
-                value['target_sierraId'] = 'b{}a'.format(
-                    value['target_sierraId'])
-            elif len(value['target_sierraId']) == 7:
-                value['target_sierraId'] = 'o{}a'.format(
-                    value['target_sierraId'])
-            else:
-                value['target_sierraId'] = None
-        for cat in list2str:
-            if cat in value:
-                if value[cat] == []:
-                    value[cat] = None
-                else:
-                    value[cat] = ','.join(
-                        ['b{}a'.format(bid) for bid in value[cat]])
-        frames.append(pd.DataFrame(value, index=[int(key)]))
-    df = pd.concat(frames)
-    stats.close()
+def stats2dataframe(batch_stats, system):
+    """
+    loads stats of processed batch into a dataframe
+    args:
+        batch_stats: str, path to the stats file
+        system: str, nypl or bpl
+    returns:
+        pandas.DataFrame
+    """
+    df = read_batch_stats(batch_stats)
+    if df.empty:
+        raise ValueError('No records in batch stats.')
     return df
 
 
@@ -0,0 +1,102 @@
+# lightweight timing of PVF batch processing stages
+
+from contextlib import contextmanager
+import math
+import threading
+from timeit import default_timer
+
+
+def percentile(samples, q):
+    """
+    nearest-rank percentile of sorted samples
+    args:
+        samples: sorted list of floats
+        q: float, 0-1
+    """
+    if not samples:
+        return None
+    rank = int(math.ceil(q * len(samples))) - 1
+    return samples[max(rank, 0)]
+
+
+class StageTimer:
+    """
+    Collects durations of processing stages of a batch and latencies of
+    requests sent to each endpoint; samples can be added from worker
+    threads
+    usage:
+        timer = StageTimer()
+        with timer.stage('analysis'):
+            ...
+        timer.summary()
+    """
+
+    def __init__(self):
+        self.samples = dict()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add(name, default_timer() - start)
+
+    def timed_iter(self, name, iterable):
+        """
+        yields items of the iterable timing how long each item took
+        to produce
+        """
+        iterator = iter(iterable)
+        while True:
+            start = default_timer()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, default_timer() - start)
+            yield item
+
+    def summary(self):
+        """
+        returns:
+            dict (key: stage name, value: dict of count, total, p50,
+                  p95 and max in seconds)
+        """
+        with self._lock:
+            samples = dict(
+                (name, sorted(values))
+                for name, values in self.samples.iteritems())
+        summary = dict()
+        for name, values in samples.iteritems():
+            summary[name] = {
+                'count': len(values),
+                'total': sum(values),
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+                'max': values[-1]}
+        return summary
+
+
+def format_stage_times(stage_times):
+    """
+    creates summary lines of stage times saved in BATCH_META
+    args:
+        stage_times: dict created by StageTimer.summary
+    returns:
+        list of str
+    """
+    lines = []
+    for name in sorted(stage_times.keys()):
+        stats = stage_times[name]
+        lines.append(
+            '  {}: count={}, total={:.2f}s, p50={:.3f}s, p95={:.3f}s, '
+            'max={:.3f}s\n'.format(
+                name, stats['count'], stats['total'], stats['p50'],
+                stats['p95'], stats['max']))
+    return lines
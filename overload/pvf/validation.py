@@ -5,8 +5,10 @@ import logging
 from validators import marcedit, local_specs, default
 from errors import OverloadError
 from logging_setup import LogglyAdapter
+from pipeline import RecordStream, BarcodeDupsVisitor, LocalSpecsVisitor
+from rules_cache import load_rules
 from utils import remove_files
-from setup_dirs import MVAL_REP, LSPEC_REP, DVAL_REP
+from setup_dirs import LSPEC_REP, DVAL_REP
 
 
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
@@ -15,10 +17,37 @@ module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 def validate_files(system, agent, files, marcval=False, locval=False):
 
     valid_files = True
-    # mandatory, default validation
+
+    # delete previous local spec report
+    if not remove_files([LSPEC_REP]):
+        module_logger.error(
+            'Unable to delete pevious local spec validation report.')
+        raise OverloadError(
+            'Unable to remove previous local spec validation report.')
+
+    # default validation (mandatory) and local specs validation share
+    # a single pass over records; records are counted beforehand by
+    # the pre-flight scan of files (bibs.count_bibs)
+    stream = RecordStream(files)
+    barcodes_check = stream.register(BarcodeDupsVisitor(system))
+    if locval:
+        module_logger.debug('Local specs validation launch.')
+
+        # define local specs rules for each system, agent, and vendor
+        try:
+            rules = './rules/vendor_specs.xml'
+            specs = load_rules(
+                rules, local_specs.compiled_local_specs, system, agent, rules)
+        except AttributeError as e:
+            module_logger.error(
+                'Unable to parse local specs rules.'
+                'Error: {}'.format(e))
+            raise OverloadError(e)
+        specs_check = stream.register(LocalSpecsVisitor(system, specs))
 
     try:
-        dup_barcodes = default.barcode_duplicates(files, system)
+        stream.run()
+        dup_barcodes = barcodes_check.report()
         if dup_barcodes != {}:
             valid_files = False
         default.save_report(dup_barcodes, DVAL_REP)
@@ -43,16 +72,10 @@ def validate_files(system, agent, files, marcval=False, locval=False):
         else:
             cme = val_engine[0]
             rules = val_engine[1]
-            report_q = MVAL_REP
-            overwrite = True
-            for file in files:
-                file_q = file
-                success_process = marcedit.validate(
-                    cme, file_q, report_q, rules, overwrite)
-                overwrite = False
+            results = marcedit.validate_batch(cme, files, rules)
+            for file, success_process, passed in results:
                 if success_process:
-                    result = marcedit.validation_check(MVAL_REP)
-                    if not result[0]:
+                    if not passed:
                         valid_files = False
                 else:
                     valid_files = False
@@ -61,30 +84,9 @@ def validate_files(system, agent, files, marcval=False, locval=False):
                         '{}.\nNot able to validate in MARCEdit'.format(
                             file))
 
-    # delete previous local spec report
-    if not remove_files([LSPEC_REP]):
-        module_logger.error(
-            'Unable to delete pevious local spec validation report.')
-        raise OverloadError(
-            'Unable to remove previous local spec validation report.')
-
     # local specification validation
     if locval:
-        module_logger.debug('Local specs validation launch.')
-
-        # define local specs rules for each system, agent, and vendor
-        try:
-            rules = './rules/vendor_specs.xml'
-            specs = local_specs.local_specs(system, agent, rules)
-        except AttributeError as e:
-            module_logger.error(
-                'Unable to parse local specs rules.'
-                'Error: {}'.format(e))
-            raise OverloadError(e)
-
-        # run the local specs validation
-        locval_passed, report = local_specs.local_specs_validation(
-            system, files, specs)
+        locval_passed, report = specs_check.report()
         if not locval_passed:
             valid_files = False
 
@@ -130,56 +130,134 @@ def parse_identification_method(tag, type):
     return (tag_to_check, subfield)
 
 
+class VendorMatcher:
+    """
+    Compiled form of the vendor index used to identify vendors;
+    identification conditions of all vendors are grouped by MARC tag
+    with their match values lowercased upfront, so each bib is matched
+    by a single scan of its relevant fields regardless of number of
+    vendors; matching follows find_matches counting rules
+    args:
+        vendor_index dict (created by vendor_index function)
+    """
+
+    def __init__(self, vendor_index):
+        self.index = vendor_index
+        # tag: list of (condition id, subfield, value)
+        self.conditions_by_tag = dict()
+        # condition id: vendor
+        self.condition_vendor = []
+        # vendor: (list of main condition ids, list of alt condition ids)
+        self.vendor_conditions = dict()
+
+        for vendor, data in vendor_index.iteritems():
+            main = []
+            alternative = []
+            for tag, conditions in data['identification'].iteritems():
+                operator = conditions['operator']
+                if operator == 'main':
+                    ids = main
+                elif operator == 'alternative':
+                    ids = alternative
+                else:
+                    continue
+                tag_to_check, subfield = parse_identification_method(
+                    tag, conditions['type'])
+                value = conditions['value']
+                if subfield is not None and value is not None:
+                    value = value.lower()
+                condition_id = len(self.condition_vendor)
+                self.condition_vendor.append(vendor)
+                ids.append(condition_id)
+                if tag_to_check is not None:
+                    self.conditions_by_tag.setdefault(
+                        tag_to_check, []).append(
+                            (condition_id, subfield, value))
+            self.vendor_conditions[vendor] = (main, alternative)
+
+    def __getitem__(self, vendor):
+        return self.index[vendor]
+
+    def _count_matches(self, bib):
+        counts = dict()
+        for field in bib.fields:
+            conditions = self.conditions_by_tag.get(field.tag)
+            if conditions is None:
+                continue
+            for condition_id, subfield, value in conditions:
+                if subfield is not None:
+                    for sub in field.get_subfields(subfield):
+                        if value in sub.lower():
+                            counts[condition_id] = counts.get(
+                                condition_id, 0) + 1
+                else:
+                    if value == field.data:
+                        counts[condition_id] = counts.get(
+                            condition_id, 0) + 1
+        return counts
+
+    def identify(self, bib):
+        counts = self._count_matches(bib)
+        # only vendors with at least one matched condition are candidates
+        candidates = set(
+            [self.condition_vendor[condition_id] for condition_id in counts])
+        matching_vendors = []
+        for vendor in candidates:
+            main, alternative = self.vendor_conditions[vendor]
+            # all main conditions must be met
+            if len(main) > 0:
+                matches_found = sum([counts.get(c, 0) for c in main])
+                if matches_found == len(main):
+                    matching_vendors.append(vendor)
+                elif len(alternative) > 0:
+                    # go to alternarive method
+                    # all alt conditions must be met
+                    matches_found = sum(
+                        [counts.get(c, 0) for c in alternative])
+                    if matches_found == len(alternative):
+                        matching_vendors.append(vendor)
+
+        # set to unknown if not found
+        if len(matching_vendors) != 1:
+            return 'UNKNOWN'
+        else:
+            return matching_vendors[0]
+
+
+def compile_vendor_index(vendor_index):
+    """
+    args:
+        vendor_index dict
+    return:
+        VendorMatcher obj
+    """
+    return VendorMatcher(vendor_index)
+
+
+def vendor_matcher(vendor_fh, library):
+    """
+    creates compiled vendor index of the library
+    args:
+        vendor_fh str (path to cat_rules.xml)
+        library str (nypl or bpl)
+    return:
+        VendorMatcher obj
+    """
+    return VendorMatcher(vendor_index(vendor_fh, library))
+
+
 def identify_vendor(bib, vendor_index):
     """
     identifies vendor in the bib based on vendor_index
     args:
         bib obj (pymarc)
-        vendor_index dict
+        vendor_index dict or VendorMatcher obj
     return
         vendor str
     """
-    matching_vendors = []
-    for vendor, data in vendor_index.iteritems():
-        # module_logger.debug('Matching bib to {} vendor.'.format(
-        #     vendor))
-        main = []
-        alternative = []
-        identification = data['identification']
-        for tag, conditions in identification.iteritems():
-            operator = conditions['operator']
-            type = conditions['type']
-            value = conditions['value']
-            if operator == 'main':
-                main.append(parse_identification_method(
-                    tag, type) + (value, ))
-            elif operator == 'alternative':
-                alternative.append(parse_identification_method(
-                    tag, type) + (value, ))
-
-        # all main conditions must be met
-        matches_needed = len(main)
-        if matches_needed > 0:
-            matches_found = find_matches(bib, main)
-            if matches_found == matches_needed:
-                # module_logger.debug('Vendor matched to bib sucessfully!')
-                matching_vendors.append(vendor)
-            else:
-                # go to alternarive method
-                # all alt conditions must be met
-                matches_needed = len(alternative)
-                if matches_needed > 0:
-                    matches_found = find_matches(bib, alternative)
-                    if matches_found == matches_needed:
-                        # module_logger.debug(
-                        #     'Vendor matched to bib sucessfully.')
-                        matching_vendors.append(vendor)
-
-    # set to unknown if not found
-    if len(matching_vendors) != 1:
-        return 'UNKNOWN'
-    else:
-        return matching_vendors[0]
+    if not isinstance(vendor_index, VendorMatcher):
+        vendor_index = VendorMatcher(vendor_index)
+    return vendor_index.identify(bib)
 
 
 def get_query_matchpoint(vendor, vendor_index):
@@ -1,8 +1,12 @@
 import logging
+from timeit import default_timer
 
 
+from connectors.sierra_z3950 import close_z3950_pools
 from errors import OverloadError
 from pvf import queries
+from pvf.match_cache import query_keywords, z3950_target, \
+    serialize_z3950_result, deserialize_z3950_result
 from logging_setup import LogglyAdapter
 from PyZ3950.zoom import ConnectionError
 
@@ -10,21 +14,48 @@ from PyZ3950.zoom import ConnectionError
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 
 
-def z3950_query_manager(target, meta, matchpoint):
+def close_z3950_connections():
+    """
+    closes connections kept open for queries of the batch
+    """
+    module_logger.debug('Closing Z3950 connections.')
+    close_z3950_pools()
+
+
+def z3950_query_manager(target, meta, matchpoint, cache=None, timer=None):
     """
     Oversees queries send to Sierra Z3950
     args:
         api_name
         meta obj
         matchpoint
+        cache MatchCache obj (optional)
+        timer StageTimer obj, records latency of requests (optional)
     return:
         query result
     """
+    key = None
+    if cache is not None:
+        keywords = query_keywords(meta, matchpoint)
+        if keywords is not None:
+            key = cache.make_key(z3950_target(target), matchpoint, keywords)
+            result = cache.get(key)
+            if result is not None:
+                module_logger.debug(
+                    'Using cached Z3950 result for {}.'.format(key))
+                return deserialize_z3950_result(result)
+
     module_logger.debug('Making new Z3950 request to: {}'.format(
         target['host']))
     try:
+        start = default_timer()
         result = queries.query_runner(
             'Z3950', target, meta, matchpoint)
+        if timer is not None:
+            timer.add(
+                'z3950 {}'.format(target['host']), default_timer() - start)
+        if key is not None:
+            cache.set(key, serialize_z3950_result(result))
         return result
     except ConnectionError:
         module_logger.error('Z3950 Connection error on host {}'.format(
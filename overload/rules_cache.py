@@ -0,0 +1,53 @@
+# process-wide cache of parsed rules files
+
+import json
+import logging
+import os
+import threading
+
+
+from logging_setup import LogglyAdapter
+
+
+module_logger = LogglyAdapter(logging.getLogger('overload'), None)
+
+
+_cache = dict()
+_lock = threading.Lock()
+
+
+def load_rules(fh, loader, *args):
+    """
+    returns structure created by loader(*args) from a rules file;
+    the structure is built once per process and rebuilt only when
+    modification time of the rules file changes
+    args:
+        fh: str, path to rules file watched for changes
+        loader: function parsing the rules file
+        args: arguments passed to the loader
+    returns:
+        loader's result (shared, must not be modified by callers)
+    """
+    path = os.path.abspath(fh)
+    mtime = os.path.getmtime(path)
+    key = (path, loader, args)
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    module_logger.debug('Parsing rules file {}.'.format(fh))
+    data = loader(*args)
+    with _lock:
+        _cache[key] = (mtime, data)
+    return data
+
+
+def load_json(fh):
+    with open(fh, 'r') as file:
+        return json.load(file)
+
+
+def clear_rules_cache():
+    with _lock:
+        _cache.clear()
@@ -11,8 +11,10 @@ TEMP_DIR = os.path.join(APP_DIR, "temp")
 BARCODES = os.path.join(TEMP_DIR, "batch_barcodes.txt")
 USER_DATA = os.path.join(APP_DIR, "user_data")
 DATASTORE = os.path.join(APP_DIR, "datastore.db")  # move some user_data here
-BATCH_STATS = os.path.join(TEMP_DIR, "batch_stats")
+MATCH_CACHE = os.path.join(APP_DIR, "match_cache")
+BATCH_STATS = os.path.join(TEMP_DIR, "batch_stats.csv")
 BATCH_META = os.path.join(TEMP_DIR, "batch_meta")
+BATCH_JOURNAL = os.path.join(TEMP_DIR, "batch_journal.txt")
 GETBIB_REP = os.path.join(TEMP_DIR, "getbib-report.csv")
 W2S_MULTI_ORD = os.path.join(TEMP_DIR, "w2s-multi-orders.csv")
 W2S_SKIPPED_ORD = os.path.join(TEMP_DIR, "w2s-skipped-orders.csv")
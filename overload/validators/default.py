@@ -1,12 +1,50 @@
 # mandatory, default validation
+from collections import Counter
 import os
 
 
-from bibs.bibs import read_marc21
+from bibs.raw_marc import iter_raw_marc21
 from errors import OverloadError
 from utils import remove_files
 
 
+def item_barcodes(record, system):
+    """
+    returns list of barcodes found in item tags of a record
+    args:
+        record: pymarc Record or bibs.raw_marc.RawRecord obj
+        system: str, nypl or bpl
+    """
+    if system == 'nypl':
+        item_tag = '949'
+        item_tag_ind = [' ', '1']
+        item_tag_sub = 'i'
+    elif system == 'bpl':
+        item_tag = '960'
+        item_tag_ind = [' ', ' ']
+        item_tag_sub = 'i'
+
+    barcodes = []
+    for tag in record.get_fields(item_tag):
+        if tag.indicators == item_tag_ind:
+            barcodes.extend(tag.get_subfields(item_tag_sub))
+    return barcodes
+
+
+def find_barcode_duplicates(barcodes):
+    """
+    args:
+        barcodes: dict (key: barcode, value: list of (file, bib position))
+    returns:
+        dict of dups (key: barcode, value: list of (file, bib position))
+    """
+    dup_barcodes = dict()
+    for k, v in barcodes.iteritems():
+        if len(v) > 1:
+            dup_barcodes[k] = v
+    return dup_barcodes
+
+
 def barcode_duplicates(batch, system):
     """
     Verifies there are no duplicate barcodes in the batch;
@@ -19,40 +57,20 @@ def barcode_duplicates(batch, system):
         dict of dups (key: barcode, value: tuple (file, bib position))
     """
     barcodes = dict()
-    dup_barcodes = dict()
-
-    if system == 'nypl':
-        item_tag = '949'
-        item_tag_ind = [' ', '1']
-        item_tag_sub = 'i'
-    elif system == 'bpl':
-        item_tag = '960'
-        item_tag_ind = [' ', ' ']
-        item_tag_sub = 'i'
 
     for fh in batch:
         try:
-            reader = read_marc21(fh)
+            # barcodes are read from raw records, no full decoding needed
+            reader = iter_raw_marc21(fh)
             pos = 0
             for record in reader:
                 pos += 1
-                for tag in record.get_fields(item_tag):
-                    if tag.indicators == item_tag_ind:
-                        for b in tag.get_subfields(item_tag_sub):
-                            if b in barcodes:
-                                new_value = barcodes[b]
-                                new_value.append((fh, pos))
-                                barcodes[b] = new_value
-                            else:
-                                barcodes[b] = [(fh, pos)]
+                for b in item_barcodes(record, system):
+                    barcodes.setdefault(b, []).append((fh, pos))
         except UnicodeDecodeError as e:
             raise OverloadError(e)
 
-    for k, v in barcodes.iteritems():
-        if len(v) > 1:
-            dup_barcodes[k] = v
-
-    return dup_barcodes
+    return find_barcode_duplicates(barcodes)
 
 
 def save_report(data, outfile):
@@ -81,36 +99,119 @@ def save_report(data, outfile):
             'Error: {}'.format(e))
 
 
+def processed_barcodes(record):
+    """
+    returns list of barcodes found in item tags of a processed record
+    of either system
+    args:
+        record: pymarc Record or bibs.raw_marc.RawRecord obj
+    """
+    barcodes = []
+    for tag in record.get_fields('960'):
+        if tag.indicators == [' ', ' ']:
+            barcodes.extend(tag.get_subfields('i'))
+    for tag in record.get_fields('949'):
+        if tag.indicators == [' ', '1']:
+            barcodes.extend(tag.get_subfields('i'))
+    return barcodes
+
+
+class BarcodeVerifier(object):
+    """
+    Compares barcodes of vendor records with barcodes found in processed
+    files; processed barcodes are counted as records are written, so
+    output files do not need to be read again unless they are rewritten
+    (rescan)
+    usage:
+        verifier = BarcodeVerifier()
+        verifier.add_record(outfile, record)
+        verifier.load_expected(BARCODES)
+        verifier.valid
+    """
+
+    def __init__(self):
+        self.expected = Counter()
+        self._found = dict()
+
+    def load_expected(self, barcodes_fh):
+        """
+        reads barcodes of vendor records stored during processing
+        args:
+            barcodes_fh: str, path to file with one barcode per line
+        """
+        with open(barcodes_fh, 'r') as file:
+            for line in file:
+                barcode = line.strip()
+                if barcode:
+                    self.expected[barcode] += 1
+
+    def add_record(self, outfile, record):
+        """
+        counts barcodes of a record written to an output file
+        args:
+            outfile: str, path to the output file
+            record: pymarc Record or bibs.raw_marc.RawRecord obj
+        """
+        found = self._found.setdefault(outfile, Counter())
+        for barcode in processed_barcodes(record):
+            found[str(barcode)] += 1
+
+    def rescan(self, outfile):
+        """
+        recounts barcodes of an output file that has been rewritten
+        (for example deduped)
+        """
+        self._found[outfile] = Counter()
+        if os.path.isfile(outfile):
+            for record in iter_raw_marc21(outfile):
+                self.add_record(outfile, record)
+
+    @property
+    def found(self):
+        found = Counter()
+        for counts in self._found.values():
+            found.update(counts)
+        return found
+
+    def missing(self):
+        """
+        returns:
+            set of vendor barcodes absent in processed files
+        """
+        return set(self.expected - self.found)
+
+    def extra(self):
+        """
+        returns:
+            set of barcodes in processed files not present in vendor records
+        """
+        return set(self.found - self.expected)
+
+    def duplicates(self):
+        """
+        returns:
+            set of barcodes found more than once in processed files
+        """
+        return set(
+            barcode for barcode, count in self.found.iteritems()
+            if count > 1)
+
+    @property
+    def valid(self):
+        return self.expected == self.found
+
+
 def validate_processed_files_integrity(files, barcodes_fh):
     valid = True
-    proc_barcodes = []
     if os.path.isfile(barcodes_fh):
-        with open(barcodes_fh, 'r') as file:
-            orig_barcodes = sorted([line.strip() for line in file])
-            # original barcodes cannot include duplicates, because
-            # batch with duplicates never will be processed - error
-            # is raised in default validation
+        # original barcodes cannot include duplicates, because
+        # batch with duplicates never will be processed - error
+        # is raised in default validation
+        verifier = BarcodeVerifier()
+        verifier.load_expected(barcodes_fh)
         for file in files:
-            reader = read_marc21(file)
-            for bib in reader:
-                for tag in bib.get_fields('960'):
-                    if tag.indicators == [' ', ' ']:
-                        for barcode in tag.get_subfields('i'):
-                            proc_barcodes.append(str(barcode))
-                for tag in bib.get_fields('949'):
-                    if tag.indicators == [' ', '1']:
-                        for barcode in tag.get_subfields('i'):
-                            proc_barcodes.append(str(barcode))
-        missing_barcodes = set()
-        for barcode in orig_barcodes:
-            if barcode not in proc_barcodes:
-                valid = False
-                missing_barcodes.add(barcode)
-
-        if sorted(orig_barcodes) != sorted(proc_barcodes):
-            valid = False
-
-        return valid, missing_barcodes
+            verifier.rescan(file)
+        return verifier.valid, verifier.missing()
     else:
         # no barcodes to check
         return valid, []
@@ -109,150 +109,194 @@ def price_check(subfield):
     return correct
 
 
-def local_specs_validation(system, files, specs):
+def barcode_check(system, subfield):
     """
-    launches validation for bibs if they conform to criteria defined
-    in vendor_specs.xml file
+    verifies barcode is correctly formated for the system
     args:
-        files (list)
-        specs (dictionary)
+        system, subfield
+    returns:
+        Boolean (valid or not)
+    """
+    correct = True
+    if system == 'nypl':
+        if subfield[:2] != '33':
+            correct = False
+    elif system == 'bpl':
+        if subfield[:2] != '34':
+            correct = False
+    if len(subfield) != 14:
+        correct = False
+    try:
+        int(subfield)
+    except ValueError:
+        correct = False
+    except TypeError:
+        correct = False
+
+    return correct
+
+
+class LocalSpecsValidator:
+    """
+    Compiled local specification; indicators are pre-parsed, list values
+    are kept in frozensets, and fields of each record are bucketed by
+    tag once, so each spec checks only fields with its own tag
+    args:
+        specs (list of dictionaries created by local_specs function)
+    """
+
+    def __init__(self, specs):
+        self.specs = []
+        for spec in specs:
+            ind = [
+                ' ' if i == 'blank' else i for i in spec['ind'].split(',')]
+            subs = []
+            for sub in spec['subfields']:
+                subs.append((
+                    sub['code'],
+                    sub['check'],
+                    frozenset(sub['value']),
+                    sub['mandatory'] == 'y',
+                    sub['repeatable'] == 'n'))
+            self.specs.append((
+                spec['tag'],
+                ind,
+                ''.join(ind),
+                spec['mandatory'] == 'y',
+                spec['repeatable'] == 'n',
+                subs))
+        self.tags = frozenset([spec[0] for spec in self.specs])
+
+    def _subfield_issues(self, system, field, subs):
+        sub_issues = []
+        for code, check, values, mandatory, not_repeatable in subs:
+            subfields = field.get_subfields(code)
+
+            # check mandatory subfield criteria
+            if mandatory:
+                if code not in field.subfields:
+                    sub_issues.append(
+                        '\t"{}" subfield is mandatory.'.format(code))
+
+            # check repeatable critera
+            if not_repeatable and len(subfields) > 1:
+                sub_issues.append(
+                    '\t"{}" subfield is not repeatable.'.format(code))
+
+            # specific value checks
+            if check == 'list':
+                for s in subfields:
+                    if s not in values:
+                        sub_issues.append(
+                            '\t"{}" subfield has incorrect value.'.format(
+                                code))
+            elif check == 'barcode':
+                for s in subfields:
+                    if not barcode_check(system, s):
+                        sub_issues.append(
+                            '\t"{}" subfield has incorrect '
+                            'barcode.'.format(code))
+            elif check == 'location':
+                for s in subfields:
+                    if not location_check(system, s):
+                        sub_issues.append(
+                            '\t"{}" subfield has incorrect '
+                            'location code.'.format(code))
+            elif check == 'price':
+                for s in subfields:
+                    if not price_check(s):
+                        sub_issues.append(
+                            '\t"{}" subfield has incorrect '
+                            'price format.'.format(code))
+        return sub_issues
+
+    def validate_bib(self, system, bib):
+        """
+        args:
+            system (str: nypl or bpl)
+            bib (pymarc Record)
+        returns:
+            bib_issues (list of strings)
+        """
+        fields_by_tag = dict()
+        for field in bib.fields:
+            if field.tag in self.tags:
+                fields_by_tag.setdefault(field.tag, []).append(field)
+
+        bib_issues = []
+        for tag, ind, ind_str, mandatory, not_repeatable, subs in \
+                self.specs:
+            fields = fields_by_tag.get(tag, [])
+            matching = [
+                field for field in fields if field.indicators == ind]
+
+            # check mandatory tag criteria
+            if mandatory and not matching:
+                bib_issues.append(
+                    '"{}{}" mandatory tag not found.'.format(tag, ind_str))
+
+            # check repeatable criteria
+            if not_repeatable and len(matching) > 1:
+                bib_issues.append(
+                    '"{}{}" is not repeatable'.format(tag, ind_str))
+
+            # subfields checks; occurances are counted among all
+            # fields with the tag
+            for i, field in enumerate(fields):
+                if field.indicators != ind:
+                    continue
+                sub_issues = self._subfield_issues(system, field, subs)
+                if sub_issues != []:
+                    tag_head = '"{}": tag occurance {}:'.format(tag, i + 1)
+                    bib_issues.append(
+                        '\n'.join([tag_head, '\n'.join(sub_issues)]))
+
+        return bib_issues
+
+
+def compile_specs(specs):
+    """
+    args:
+        specs (list of dictionaries created by local_specs function)
+    returns:
+        LocalSpecsValidator obj
+    """
+    if isinstance(specs, LocalSpecsValidator):
+        return specs
+    return LocalSpecsValidator(specs)
+
+
+def compiled_local_specs(system, agent, fh):
+    """
+    creates compiled local specification for given system and agent
+    """
+    return LocalSpecsValidator(local_specs(system, agent, fh))
+
+
+def validate_bib(system, bib, specs):
+    """
+    validates a single bib against local specification
+    args:
+        system (str: nypl or bpl)
+        bib (pymarc Record)
+        specs (list of dictionaries or LocalSpecsValidator obj)
+    returns:
+        bib_issues (list of strings)
+    """
+    return compile_specs(specs).validate_bib(system, bib)
+
+
+def format_report(files_issues):
+    """
+    creates local specs validation report
+    args:
+        files_issues (list of tuples: (file, list of record issues))
     returns:
         result (tupe: (boolean result, report string)
     """
     issues = []
     validates = True
-    for file in files:
-        file_issues = []
-        bib_count = 0
-        reader = read_marc21(file)
-        for bib in reader:
-            bib_count += 1
-            bib_issues = []
-            for spec in specs:
-                mandat = spec['mandatory']
-                repeat = spec['repeatable']
-                ind = [' ' if i == 'blank' else i for i in spec['ind'].split(',')]
-
-                # check mandatory tag criteria
-                if mandat == 'y':
-                    found = False
-                    if spec['tag'] in bib:
-                        for tag in bib.get_fields(spec['tag']):
-                            if tag.indicators == ind:
-                                found = True
-                    if not found:
-                        bib_issues.append(
-                            '"{}{}" mandatory tag not found.'.format(
-                                spec['tag'],
-                                ''.join(ind)))
-
-                # check repeatable criteria
-                if repeat == 'n':
-                    match_count = 0
-                    if spec['tag'] in bib:
-                        for tag in bib.get_fields(spec['tag']):
-                            if tag.indicators == ind:
-                                match_count += 1
-                    if match_count > 1:
-                        bib_issues.append(
-                            '"{}{}" is not repeatable'.format(
-                                spec['tag'],
-                                ''.join(ind)))
-
-                # subfields checks
-                for i, tag in enumerate(bib.get_fields(spec['tag'])):
-                    tag_issues = []
-                    tag_head = '"{}": tag occurance {}:'.format(
-                        spec['tag'],
-                        i + 1)
-                    sub_issues = []
-                    if tag.indicators == ind:
-                        for sub in spec['subfields']:
-                            sub_check = sub['check']
-                            sub_value = sub['value']
-                            sub_mandat = sub['mandatory']
-                            sub_repeat = sub['repeatable']
-
-                            # check mandatory subfield criteria
-                            if sub_mandat == 'y':
-                                found = False
-                                if sub['code'] in tag.subfields:
-                                    found = True
-                                if not found:
-                                    sub_issues.append(
-                                        '\t"{}" subfield is mandatory.'.format(
-                                            sub['code']))
-
-                            # check repeatable critera
-                            if sub_repeat == 'n':
-                                match_count = 0
-
-                                for s in tag.get_subfields(sub['code']):
-                                    match_count += 1
-
-                                if match_count > 1:
-                                    sub_issues.append(
-                                        '\t"{}" subfield is not '
-                                        'repeatable.'.format(
-                                            sub['code']))
-
-                            # specific value checks
-                            if sub_check == 'none':
-                                pass
-                            elif sub_check == 'list':
-                                for s in tag.get_subfields(sub['code']):
-                                    if s not in sub_value:
-                                        sub_issues.append(
-                                            '\t"{}" subfield has '
-                                            'incorrect value.'.format(
-                                                sub['code']))
-                            elif sub_check == 'barcode':
-                                for s in tag.get_subfields(sub['code']):
-                                    found = False
-                                    if system == 'nypl':
-                                        if s[:2] != '33':
-                                            found = True
-                                    elif system == 'bpl':
-                                        if s[:2] != '34':
-                                            found = True
-                                    if len(s) != 14:
-                                        found = True
-                                    try:
-                                        int(s)
-                                    except ValueError:
-                                        found = True
-                                    except TypeError:
-                                        found = True
-
-                                    if found:
-                                        sub_issues.append(
-                                            '\t"{}" subfield has incorrect '
-                                            'barcode.'.format(
-                                                sub['code']))
-                            elif sub_check == 'location':
-                                for s in tag.get_subfields(sub['code']):
-                                    if not location_check(system, s):
-                                        sub_issues.append(
-                                            '\t"{}" subfield has incorrect '
-                                            'location code.'.format(
-                                                sub['code']))
-                            elif sub_check == 'price':
-                                for s in tag.get_subfields(sub['code']):
-                                    if not price_check(s):
-                                        sub_issues.append(
-                                            '\t"{}" subfield has incorrect '
-                                            'price format.'.format(
-                                                sub['code']))
-
-                    if sub_issues != []:
-                        tag_issues.append(tag_head)
-                        tag_issues.append('\n'.join(sub_issues))
-                        bib_issues.append('\n'.join(tag_issues))
-
-            if bib_issues != []:
-                bib_issues.insert(0, 'Record {}'.format(bib_count))
-                file_issues.append('\n'.join(bib_issues))
-
+    for file, file_issues in files_issues:
         issues.append('\nFile: {}\n{}'.format(file, '-' * 40))
         if file_issues != []:
             validates = False
@@ -263,3 +307,34 @@ def local_specs_validation(system, files, specs):
     issues = '\n'.join(issues)
 
     return (validates, issues)
+
+
+def record_issues(bib_count, bib_issues):
+    # formats issues of a single record for the report
+    return '\n'.join(['Record {}'.format(bib_count)] + bib_issues)
+
+
+def local_specs_validation(system, files, specs):
+    """
+    launches validation for bibs if they conform to criteria defined
+    in vendor_specs.xml file
+    args:
+        files (list)
+        specs (list of dictionaries or LocalSpecsValidator obj)
+    returns:
+        result (tupe: (boolean result, report string)
+    """
+    specs = compile_specs(specs)
+    files_issues = []
+    for file in files:
+        file_issues = []
+        bib_count = 0
+        reader = read_marc21(file)
+        for bib in reader:
+            bib_count += 1
+            bib_issues = validate_bib(system, bib, specs)
+            if bib_issues != []:
+                file_issues.append(record_issues(bib_count, bib_issues))
+        files_issues.append((file, file_issues))
+
+    return format_report(files_issues)
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import os
 import shelve
@@ -7,11 +8,16 @@ import datetime
 
 from logging_setup import LogglyAdapter
 from setup_dirs import CVAL_REP, MVAL_REP, USER_DATA, USER_NAME
+from utils import remove_files
 
 
 module_logger = LogglyAdapter(logging.getLogger('overload'), None)
 
 
+# maximum number of MARCEdit processes running at the same time
+MARCEDIT_WORKERS = 4
+
+
 def get_engine():
 
     module_logger.debug('Getting MARCEdit engine & MARC21 rules info')
@@ -60,9 +66,17 @@ def get_engine():
         return None
 
 
-def validate(cmarcedit, MARCfile, report, rules_fh, overwrite):
-
-    """uses MARCEdit engine to validate records in a file"""
+def run_validation(cmarcedit, MARCfile, report, rules_fh):
+    """
+    runs MARCEdit validation of a file writing its results to report
+    args:
+        cmarcedit: str, path to cmarcedit.exe
+        MARCfile: str, path to validated MARC file
+        report: str, path to MARCEdit report
+        rules_fh: str, path to MARC21 rules file
+    returns:
+        boolean, True if MARCEdit completed the validation
+    """
 
     args = [
         cmarcedit,
@@ -86,46 +100,111 @@ def validate(cmarcedit, MARCfile, report, rules_fh, overwrite):
         module_logger.exception(
             'MARCEdit validation error: {}'.format(
                 str(e)))
-        return False
-
-    # delete combined report from previous batch process
-    if overwrite:
-        if os.path.isfile(CVAL_REP):
-            module_logger.debug(
-                'deleting previous batch MARCEdit validation report')
-            try:
-                os.remove(CVAL_REP)
-            except WindowsError:
-                module_logger.error('not able to delete previous batch report')
+        return None
 
     if 'completed' in h:
         module_logger.debug('MARC file successfully processed by MARCEdit')
+        return True
+    else:
+        module_logger.error(
+            'MARCEdit encounted error while validating file: {}'.format(
+                MARCfile))
+        return False
+
 
-        with open(CVAL_REP, 'a') as combined_report:
+def delete_combined_report():
+    if os.path.isfile(CVAL_REP):
+        module_logger.debug(
+            'deleting previous batch MARCEdit validation report')
+        try:
+            os.remove(CVAL_REP)
+        except WindowsError:
+            module_logger.error('not able to delete previous batch report')
+
+
+def add_to_combined_report(MARCfile, report, completed):
+    """
+    appends MARCEdit report of a file to the combined batch report
+    """
+    with open(CVAL_REP, 'a') as combined_report:
+        if completed:
             module_logger.debug('adding new report to the batch')
             combined_report.write(
                 'timestamp: {}\nfile: {}\n'.format(
                     datetime.datetime.now(), MARCfile))
             combined_report.write('-' * 50 + '\n')
-            marcedit_report = open(MVAL_REP, 'r')
-            for line in marcedit_report:
-                combined_report.write(line)
+            with open(report, 'r') as marcedit_report:
+                for line in marcedit_report:
+                    combined_report.write(line)
             combined_report.write(('-' * 50 + '\n') * 2)
-            marcedit_report.close()
-        return True
-    else:
-        module_logger.error(
-            'MARCEdit encounted error while validating file: {}'.format(
-                args[3]))
-        with open(CVAL_REP, 'a') as combined_report:
+        else:
             combined_report.write(
                 'timestamp: {}\nMARCEdit validation could not'
                 'be completed for {}.\n Please check the file.'.format(
                     datetime.datetime.now(),
                     MARCfile))
             combined_report.write('-' * 50 + '\n')
+
+
+def validate(cmarcedit, MARCfile, report, rules_fh, overwrite):
+
+    """uses MARCEdit engine to validate records in a file"""
+
+    completed = run_validation(cmarcedit, MARCfile, report, rules_fh)
+    if completed is None:
         return False
 
+    # delete combined report from previous batch process
+    if overwrite:
+        delete_combined_report()
+
+    add_to_combined_report(MARCfile, report, completed)
+    return completed
+
+
+def validate_batch(cmarcedit, files, rules_fh, workers=MARCEDIT_WORKERS):
+    """
+    validates files using a bounded pool of concurrent MARCEdit
+    processes, each writing to its own temporary report numbered
+    after MVAL_REP; reports are merged into the combined batch report in the order of files
+    args:
+        cmarcedit: str, path to cmarcedit.exe
+        files: list of MARC files
+        rules_fh: str, path to MARC21 rules file
+        workers: int, maximum number of concurrent MARCEdit processes
+    returns:
+        list of tuples (file, completed, passed) in the order of files;
+        completed is None if MARCEdit could not be launched
+    """
+    name, ext = os.path.splitext(MVAL_REP)
+    reports = [
+        '{}-{}{}'.format(name, n, ext) for n in range(len(files))]
+    remove_files(reports)
+
+    executor = ThreadPoolExecutor(max_workers=max(min(workers, len(files)), 1))
+    try:
+        futures = [
+            executor.submit(run_validation, cmarcedit, file, report, rules_fh)
+            for file, report in zip(files, reports)]
+        outcomes = [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=True)
+
+    results = []
+    delete_combined_report()
+    for file, report, completed in zip(files, reports, outcomes):
+        passed = False
+        if completed is not None:
+            add_to_combined_report(file, report, completed)
+            if completed:
+                passed = validation_check(report)[0]
+        results.append((file, completed, passed))
+        try:
+            os.remove(report)
+        except OSError:
+            pass
+    return results
+
 
 def validation_check(report):
     result = []
@@ -6,7 +6,7 @@ import os
 from bibs.bibs import (
     BibOrderMeta,
     create_initials_field,
-    write_marc21,
+    MarcFileWriter,
     create_controlfield,
     create_target_id_field,
     create_command_line_field,
@@ -792,7 +792,7 @@ def persist_choice(meta_ids, selected, barcode_var=None):
 
 
 def create_marc_file(system, dst_fh, no_holdings_msg=None):
-    with session_scope() as db_session:
+    with session_scope() as db_session, MarcFileWriter() as writer:
         recs = retrieve_related(
             db_session, WCSourceMeta, "wchits", selected=True)
         for r in recs:
@@ -818,7 +818,7 @@ def create_marc_file(system, dst_fh, no_holdings_msg=None):
                     else:
                         field["h"] = msg
                 try:
-                    write_marc21(dst_fh, marc)
+                    writer.write(dst_fh, marc)
                 except TypeError:
                     module_logger.error(
                         "Unable to create marc file for record: "
@@ -7,8 +7,20 @@ sys.path.insert(0, p)
 
 
 from overload import setup_dirs
-from overload.connectors.sierra_z3950 import z3950_query
-from overload.connectors.platform import AuthorizeAccess, PlatformSession
+from overload.connectors.sierra_z3950 import (
+    z3950_query,
+    z3950_pool,
+    close_z3950_pools,
+)
+from overload.connectors.platform import (
+    AuthorizeAccess,
+    PlatformSession,
+    RetryPolicy,
+    CircuitBreaker,
+    RetryStats,
+    parse_retry_after,
+    PlatformTokenProvider,
+)
 from overload.connectors import goo
 from overload.connectors.goo_settings.access_names import GAPP, GUSER
 from overload.connectors.worldcat.accesstoken import WorldcatAccessToken
@@ -17,13 +29,17 @@ from overload.connectors.worldcat.metadata_session import (
     holdings_responses,
 )
 from overload import credentials
+from overload import rules_cache
+from overload import logging_setup
 from overload.utils import *
 from overload.bibs import (
     bibs,
     crosswalks,
     patches,
     dedup,
+    marc_index,
     parsers,
+    raw_marc,
     sierra_dicts,
 )
 from overload.bibs.nypl_callnum import (
@@ -45,8 +61,17 @@ from overload.pvf import vendors
 from overload.pvf.analyzer import PVRReport, PVR_NYPLReport
 from overload.pvf import reports
 from overload.pvf import goo_comms
+from overload.pvf import platform_comms
+from overload.pvf import queries
+from overload.pvf import match_cache
+from overload.pvf import pipeline
+from overload.pvf import stage_timer
+from overload.pvf import batch_worker
+from overload.pvf import batch_stats
+from overload.pvf import batch_journal
+from overload.pvf import validation
 from overload.errors import OverloadError, APITokenError, APITokenExpiredError
-from overload.validators import local_specs, default
+from overload.validators import local_specs, default, marcedit
 from overload.wc2sierra.source_parsers import (
     sierra_export_data,
     find_order_field,
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+from mock import MagicMock, patch
+from PyZ3950 import zoom
 
 from context import setup_dirs
-from context import z3950_query
+from context import z3950_query, z3950_pool, close_z3950_pools
 
 
 class TestZ3950(unittest.TestCase):
@@ -38,5 +40,77 @@ class TestZ3950(unittest.TestCase):
         user_data.close()
 
 
+class TestZ3950ConnectionPool(unittest.TestCase):
+    """Test reuse of Z3950 connections"""
+
+    def setUp(self):
+        self.target = {'host': 'z3950.example.org',
+                       'library': 'test',
+                       'syntax': 'USMARC',
+                       'port': 210,
+                       'user': None,
+                       'password': None,
+                       'database': 'TEST'}
+        self.conn = MagicMock()
+        self.conn.search.side_effect = lambda query: iter(['rec'])
+        patcher = patch.object(zoom, 'Connection', return_value=self.conn)
+        self.mock_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(zoom, 'Query')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(close_z3950_pools)
+
+    def test_connection_reused(self):
+        z3950_query(self.target, keyword='8392203313', qualifier='(1,7)')
+        z3950_query(self.target, keyword='9780439136358', qualifier='(1,7)')
+        self.assertEqual(self.mock_connection.call_count, 1)
+        self.assertEqual(self.conn.search.call_count, 2)
+        self.assertEqual(self.conn.databaseName, 'TEST')
+
+    def test_pool_shared_by_target(self):
+        self.assertIs(z3950_pool(self.target), z3950_pool(dict(self.target)))
+
+    def test_results_retrieved(self):
+        success, results = z3950_query(self.target, keyword='8392203313')
+        self.assertTrue(success)
+        self.assertEqual(results, ['rec'])
+
+    def test_broken_connection_replaced(self):
+        broken = MagicMock()
+        broken.search.side_effect = zoom.ConnectionError
+        self.mock_connection.side_effect = [broken, self.conn]
+        success, results = z3950_query(self.target, keyword='8392203313')
+        self.assertEqual(results, ['rec'])
+        self.assertTrue(broken.close.called)
+        self.assertEqual(self.mock_connection.call_count, 2)
+
+    def test_connection_error_raised_after_reconnect(self):
+        self.conn.search.side_effect = zoom.ConnectionError
+        with self.assertRaises(zoom.ConnectionError):
+            z3950_query(self.target, keyword='8392203313')
+        self.assertEqual(self.mock_connection.call_count, 2)
+
+    def test_stale_idle_connections_not_retried(self):
+        stale = [MagicMock(), MagicMock()]
+        for conn in stale:
+            conn.search.side_effect = zoom.ConnectionError
+        z3950_pool(self.target)._idle.extend(stale)
+        success, results = z3950_query(self.target, keyword='8392203313')
+        self.assertEqual(results, ['rec'])
+        self.assertEqual(self.mock_connection.call_count, 1)
+        self.assertEqual(
+            sum(conn.search.call_count for conn in stale), 1)
+        for conn in stale:
+            self.assertTrue(conn.close.called)
+
+    def test_connections_closed_at_batch_end(self):
+        z3950_query(self.target, keyword='8392203313')
+        close_z3950_pools()
+        self.assertTrue(self.conn.close.called)
+        z3950_query(self.target, keyword='8392203313')
+        self.assertEqual(self.mock_connection.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
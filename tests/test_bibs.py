@@ -103,6 +103,20 @@ class TestBibsUtilities(unittest.TestCase):
             "00266nam a2200085u  4500001002400000245001500024949004700039949004700086960004700133\x1e0001-test-control_field\x1e00\x1faTest title\x1e 1\x1fi33333818132462\x1flfea0f\x1fp9.99\x1ft102\x1fvAMALIVRE\x1e 1\x1fi33333818132464\x1flfea0f\x1fp9.99\x1ft102\x1fvAMALIVRE\x1e  \x1fi33333818132466\x1flfea0f\x1fp9.99\x1ft102\x1fvAMALIVRE\x1e\x1d",
         )
 
+    def test_marc_file_writer_matches_write_marc21(self):
+        with bibs.MarcFileWriter() as writer:
+            writer.write(self.fh_out, self.marc_bib)
+            writer.write(self.fh_out, self.marc_bib)
+        contents = open(self.fh_out, "rb").read()
+        self.assertEqual(contents, self.marc_bib.as_marc() * 2)
+
+    def test_marc_file_writer_flushes_when_buffer_full(self):
+        writer = bibs.MarcFileWriter(flush_size=1)
+        writer.write(self.fh_out, self.marc_bib)
+        self.assertEqual(
+            open(self.fh_out, "rb").read(), self.marc_bib.as_marc())
+        writer.close()
+
     def test_read_marc21_returns_pymarc_reader(self):
         # should return an instance of pymarc reader
         reader = bibs.read_marc21("test.mrc")
@@ -267,6 +281,12 @@ class TestBibsUtilities(unittest.TestCase):
             meta.barcodes, ["33333818132462", "33333818132464", "33333818132466"]
         )
 
+    def test_bibmeta_objects_use_slots(self):
+        meta = bibs.VendorBibMeta(self.marc_bib, vendor="Amalivre")
+        self.assertFalse(hasattr(meta, "__dict__"))
+        with self.assertRaises(AttributeError):
+            meta.unknown_attribute = "test"
+
     def test_vendor_bibmeta_object_when_sierra_id_is_provided(self):
         # nypl scenario
         self.marc_bib.add_field(
@@ -429,6 +449,51 @@ class TestTemplate_to_960(unittest.TestCase):
         self.assertEqual(str(field), "=960  \\\\$s9.99$u2$aa$dd$ee$ii$mm$vv")
 
 
+class TestOrderTemplatePlan(unittest.TestCase):
+    """
+    Tests of order template merge plan compiled once per batch
+    """
+
+    def setUp(self):
+        class template:
+            pass
+
+        self.temp = template()
+        for code, attr in bibs.ORDER_960_SUBFIELDS + bibs.ORDER_961_SUBFIELDS:
+            setattr(self.temp, attr, None)
+        self.temp.status = "1"
+        self.temp.internalNote = "TEST"
+
+    def test_plans_tags(self):
+        plan_960, plan_961 = bibs.order_template_plans(self.temp)
+        self.assertEqual(plan_960.tag, "960")
+        self.assertEqual(plan_961.tag, "961")
+
+    def test_plan_reused_for_multiple_fields(self):
+        plan_960, plan_961 = bibs.order_template_plans(self.temp)
+        vfield1 = Field(
+            tag="960", indicators=[" ", " "], subfields=["a", "1", "m", "2"]
+        )
+        vfield2 = Field(tag="960", indicators=[" ", " "], subfields=["s", "9.99"])
+        self.assertEqual(str(plan_960.apply(vfield1)), "=960  \\\\$a1$m1")
+        self.assertEqual(str(plan_960.apply(vfield2)), "=960  \\\\$s9.99$m1")
+        self.assertEqual(str(plan_961.apply(None)), "=961  \\\\$dTEST")
+
+    def test_extra_subfields_carried_over_in_vendor_order(self):
+        plan_960, _ = bibs.order_template_plans(self.temp)
+        vfield = Field(
+            tag="960",
+            indicators=[" ", " "],
+            subfields=["u", "2", "s", "9.99", "u", "3", "t", "4"],
+        )
+        self.assertEqual(str(plan_960.apply(vfield)), "=960  \\\\$u2$s9.99$t4$m1")
+
+    def test_template_not_read_when_applied(self):
+        plan_960, _ = bibs.order_template_plans(self.temp)
+        self.temp.status = "2"
+        self.assertEqual(str(plan_960.apply(None)), "=960  \\\\$m1")
+
+
 class TestTemplate_to_961(unittest.TestCase):
     """
     Tests of creation of order varied fields in 961 MARC tag
@@ -4,7 +4,7 @@ import unittest
 import os
 
 
-from context import dedup, bibs
+from context import dedup, bibs, marc_index
 
 
 class TestDedup_MARC_File(unittest.TestCase):
@@ -69,6 +69,15 @@ class TestDedup_MARC_File(unittest.TestCase):
                 for sub in tag.get_subfields('i'):
                     self.assertIn(sub, combined_barcodes)
 
+    def test_merge_bibs_combine_items_with_index(self):
+        index = marc_index.MarcIndex(self.fh, persist=False)
+        new_record, dedup_count = dedup.merge_bibs_combine_items(
+            self.fh, [1, 2, 3], index)
+        record, count = dedup.merge_bibs_combine_items(
+            self.fh, [1, 2, 3])
+        self.assertEqual(dedup_count, count)
+        self.assertEqual(new_record.as_marc(), record.as_marc())
+
     def test_dedup_marc_file_no_dups_return(self):
         self.assertEqual(
             dedup.dedup_marc_file(self.fh_no_dups),
@@ -168,5 +168,92 @@ class TestDefaultValidation(unittest.TestCase):
             {u'34444849044538': [('barcode1_dup_test.mrc', 2), ('barcode2_dup_test.mrc', 1)]})
 
 
+class TestBarcodeVerifier(unittest.TestCase):
+    """
+    Tests verification of barcodes in processed files
+    """
+
+    def setUp(self):
+        self.barcodes_fh = 'barcodes_verifier_test.txt'
+        self.out_fh = 'barcodes_verifier_test.mrc'
+        with open(self.barcodes_fh, 'w') as file:
+            file.write('33333849044538\n33333849044539\n34444849044540\n')
+
+    def tearDown(self):
+        for fh in (self.barcodes_fh, self.out_fh):
+            if os.path.isfile(fh):
+                os.remove(fh)
+
+    def make_bib(self, tag, indicators, barcodes):
+        bib = Record()
+        bib.leader = '00000nam a2200000u  4500'
+        bib.add_ordered_field(
+            Field(tag='245',
+                  indicators=['0', '0'],
+                  subfields=['a', 'Test title 1']))
+        for barcode in barcodes:
+            bib.add_ordered_field(
+                Field(tag=tag,
+                      indicators=indicators,
+                      subfields=['i', barcode, 'l', 'moa0f']))
+        return bib
+
+    def test_all_barcodes_present(self):
+        verifier = default.BarcodeVerifier()
+        verifier.load_expected(self.barcodes_fh)
+        verifier.add_record('dups.mrc', self.make_bib(
+            '949', [' ', '1'], ['33333849044538']))
+        verifier.add_record('new.mrc', self.make_bib(
+            '949', [' ', '1'], ['33333849044539']))
+        verifier.add_record('new.mrc', self.make_bib(
+            '960', [' ', ' '], ['34444849044540']))
+        self.assertTrue(verifier.valid)
+        self.assertEqual(verifier.missing(), set())
+        self.assertEqual(verifier.extra(), set())
+        self.assertEqual(verifier.duplicates(), set())
+
+    def test_missing_extra_and_duplicate_barcodes(self):
+        verifier = default.BarcodeVerifier()
+        verifier.load_expected(self.barcodes_fh)
+        verifier.add_record('new.mrc', self.make_bib(
+            '949', [' ', '1'], ['33333849044538', '33333849044538']))
+        verifier.add_record('new.mrc', self.make_bib(
+            '949', [' ', '1'], ['33333849044541']))
+        # item field with other indicators is not counted
+        verifier.add_record('new.mrc', self.make_bib(
+            '949', [' ', ' '], ['33333849044539']))
+        self.assertFalse(verifier.valid)
+        self.assertEqual(
+            verifier.missing(), set(['33333849044539', '34444849044540']))
+        self.assertEqual(
+            verifier.extra(), set(['33333849044538', '33333849044541']))
+        self.assertEqual(verifier.duplicates(), set(['33333849044538']))
+
+    def test_rescan_rewritten_file(self):
+        verifier = default.BarcodeVerifier()
+        verifier.load_expected(self.barcodes_fh)
+        bib = self.make_bib(
+            '949', [' ', '1'], ['33333849044538', '33333849044539'])
+        verifier.add_record(self.out_fh, bib)
+        verifier.add_record(self.out_fh, bib)
+        verifier.add_record('dups.mrc', self.make_bib(
+            '960', [' ', ' '], ['34444849044540']))
+        self.assertEqual(
+            verifier.duplicates(), set(['33333849044538', '33333849044539']))
+
+        # deduped file includes merged record only
+        bibs.write_marc21(self.out_fh, bib)
+        verifier.rescan(self.out_fh)
+        self.assertTrue(verifier.valid)
+
+    def test_validate_processed_files_integrity(self):
+        bibs.write_marc21(self.out_fh, self.make_bib(
+            '949', [' ', '1'], ['33333849044538', '33333849044539']))
+        valid, missing = default.validate_processed_files_integrity(
+            [self.out_fh], self.barcodes_fh)
+        self.assertFalse(valid)
+        self.assertEqual(missing, set(['34444849044540']))
+
+
 if __name__ == '__main__':
     unittest.main()
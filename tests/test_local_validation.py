@@ -163,6 +163,29 @@ class Test_NYPL_CAT_Specs(unittest.TestCase):
             '"091  " is not repeatable',
             report)
 
+    def test_compiled_specs_report_the_same(self):
+        b = Record()
+        b.add_field(
+            Field(
+                tag='091',
+                indicators=[' ', ' '],
+                subfields=['p', 'TEST', 'p', 'TEST', 'c', 'TEST']))
+        b.add_field(
+            Field(
+                tag='091',
+                indicators=[' ', ' '],
+                subfields=['a', 'TEST2']))
+        bibs.write_marc21('specs_test.mrc', b)
+        compiled = local_specs.compile_specs(self.ncl)
+        self.assertEqual(
+            local_specs.local_specs_validation(
+                'nypl', ['specs_test.mrc'], compiled),
+            local_specs.local_specs_validation(
+                'nypl', ['specs_test.mrc'], self.ncl))
+        self.assertEqual(
+            local_specs.validate_bib('nypl', b, compiled),
+            local_specs.validate_bib('nypl', b, self.ncl))
+
     def test_091_subfields(self):
         b = Record()
         b.add_field(
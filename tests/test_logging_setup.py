@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import unittest
+
+
+from context import logging_setup
+
+
+class TestLogglyFormatter(unittest.TestCase):
+    """
+    tests escaping of JSON special characters after message arguments
+    are merged
+    """
+
+    def setUp(self):
+        self.formatter = logging_setup.LogglyFormatter(
+            fmt='{"message":"%(message)s"}')
+
+    def test_message_args_escaped(self):
+        record = logging.makeLogRecord(
+            {'msg': 'Record: %s', 'args': ('"a"\n\tb\\c',)})
+        self.assertEqual(
+            self.formatter.format(record),
+            '{"message":"Record: \'a\'\\n\\tb/c"}')
+
+    def test_record_not_modified(self):
+        record = logging.makeLogRecord(
+            {'msg': 'Record: %s', 'args': ('"a"',)})
+        self.formatter.format(record)
+        self.assertEqual(record.msg, 'Record: %s')
+        self.assertEqual(record.args, ('"a"',))
+
+
+class TestLogglyBulkHandler(unittest.TestCase):
+    """
+    tests queuing of log events shipped by background listener
+    """
+
+    def setUp(self):
+        self.handler = logging_setup.LogglyBulkHandler(
+            'http://localhost/bulk', capacity=2)
+        # keep events in the queue
+        self.handler.listener.start = lambda: None
+
+    def test_events_formatted_on_emit(self):
+        self.handler.emit(logging.makeLogRecord(
+            {'msg': 'Record: %s', 'args': (1,)}))
+        self.assertEqual(self.handler.queue.get_nowait(), 'Record: 1')
+
+    def test_events_dropped_when_queue_full(self):
+        for n in range(5):
+            self.handler.emit(logging.makeLogRecord({'msg': n}))
+        self.assertEqual(self.handler.queue.qsize(), 2)
+        self.assertEqual(self.handler.dropped, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import os
+
+
+from context import bibs, marc_index
+
+
+class TestMarcIndex(unittest.TestCase):
+    """
+    tests random access to records in MARC file using byte offset index
+    """
+
+    def setUp(self):
+        self.fh = 'dups.mrc'
+        self.fh_index = self.fh + marc_index.INDEX_EXT
+
+    def tearDown(self):
+        try:
+            os.remove(self.fh_index)
+        except OSError:
+            pass
+
+    def test_index_length(self):
+        index = marc_index.MarcIndex(self.fh, persist=False)
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.offsets[0], 0)
+        self.assertEqual(
+            index.offsets[1], index.offsets[0] + index.lengths[0])
+
+    def test_get_record(self):
+        index = marc_index.MarcIndex(self.fh, persist=False)
+        reader = bibs.read_marc21(self.fh)
+        for n, record in enumerate(reader):
+            self.assertEqual(
+                index.get_record(n).as_marc(), record.as_marc())
+
+    def test_iter_records_in_requested_order(self):
+        index = marc_index.MarcIndex(self.fh, persist=False)
+        records = list(index.iter_records([3, 1]))
+        self.assertEqual(
+            records[0].as_marc(), index.get_record(3).as_marc())
+        self.assertEqual(
+            records[1].as_marc(), index.get_record(1).as_marc())
+
+    def test_get_record_out_of_range(self):
+        index = marc_index.MarcIndex(self.fh, persist=False)
+        with self.assertRaises(IndexError):
+            index.get_record(6)
+
+    def test_index_persisted_and_reused(self):
+        index = marc_index.MarcIndex(self.fh)
+        self.assertTrue(os.path.isfile(self.fh_index))
+        reused = marc_index.MarcIndex(self.fh)
+        self.assertTrue(reused._load())
+        self.assertEqual(reused.offsets, index.offsets)
+        self.assertEqual(reused.lengths, index.lengths)
+
+    def test_stale_index_ignored(self):
+        marc_index.MarcIndex(self.fh)
+        with open(self.fh_index, 'w') as idx:
+            idx.write('{"size": 1, "mtime": 1, "offsets": [], "lengths": []}')
+        index = marc_index.MarcIndex(self.fh)
+        self.assertEqual(len(index), 6)
+
+
+class TestScanMarcFile(unittest.TestCase):
+    """
+    tests leader-only pre-flight scan of MARC files
+    """
+
+    def setUp(self):
+        self.fh = 'dups.mrc'
+        self.fh_bad = 'scan_test.mrc'
+        self.data = open(self.fh, 'rb').read()
+
+    def tearDown(self):
+        try:
+            os.remove(self.fh_bad)
+        except OSError:
+            pass
+
+    def test_scan_valid_file(self):
+        scan = marc_index.scan_marc_file(self.fh)
+        self.assertEqual(scan.count, 6)
+        self.assertEqual(scan.errors, [])
+
+    def test_scan_non_marc_file(self):
+        scan = marc_index.scan_marc_file('test.json')
+        self.assertEqual(scan.positions('length'), [0])
+
+    def test_scan_missing_record_terminator(self):
+        with open(self.fh_bad, 'wb') as f:
+            f.write(self.data[:-1] + b'x')
+        scan = marc_index.scan_marc_file(self.fh_bad)
+        self.assertEqual(scan.positions('length'), [5])
+
+    def test_scan_malformed_directory(self):
+        length = int(self.data[:5])
+        record = self.data[:30] + b'x' + self.data[31:length]
+        with open(self.fh_bad, 'wb') as f:
+            f.write(record + self.data)
+        scan = marc_index.scan_marc_file(self.fh_bad)
+        self.assertEqual(scan.count, 7)
+        self.assertEqual(scan.errors, [(0, 'directory')])
+
+    def test_scan_invalid_utf8(self):
+        length = int(self.data[:5])
+        record = self.data[:9] + b'a' + self.data[10:length - 3] + \
+            b'\xff' + self.data[length - 2:length]
+        with open(self.fh_bad, 'wb') as f:
+            f.write(record)
+        scan = marc_index.scan_marc_file(self.fh_bad)
+        self.assertEqual(scan.errors, [(0, 'encoding')])
+
+    def test_count_bibs(self):
+        self.assertEqual(bibs.count_bibs(self.fh), 6)
+
+    def test_count_bibs_when_not_marc_file(self):
+        with self.assertRaises(bibs.OverloadError):
+            bibs.count_bibs('test.json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import os
+import threading
+import time
+import unittest
+from mock import patch
+
+
+from context import marcedit, validation
+
+
+class TestValidateBatch(unittest.TestCase):
+    """
+    Tests concurrent MARCEdit validation of a batch of files
+    """
+
+    def setUp(self):
+        self.fh = 'combined_validation_report_test.txt'
+        self.files = ['first.mrc', 'second.mrc', 'third.mrc']
+        self.reports = []
+        self.completion_order = []
+        self.lock = threading.Lock()
+        self.subprocess = patch.object(marcedit, 'subprocess').start()
+        self.subprocess.check_output.side_effect = self.fake_marcedit
+        patch.object(
+            marcedit, 'MVAL_REP', 'marcedit_validation_report.txt').start()
+        patch.object(marcedit, 'CVAL_REP', self.fh).start()
+
+    def tearDown(self):
+        patch.stopall()
+        for fh in glob.glob('marcedit_validation_report-*') + [self.fh]:
+            if os.path.isfile(fh):
+                os.remove(fh)
+
+    def fake_marcedit(self, args, **kwargs):
+        marc_file = args[args.index('-s') + 1]
+        report = args[args.index('-d') + 1]
+        # the first file finishes last
+        if marc_file == self.files[0]:
+            time.sleep(0.1)
+        with open(report, 'w') as file:
+            file.write('report of {}\nNo errors were reported\n'.format(
+                marc_file))
+        with self.lock:
+            self.reports.append(report)
+            self.completion_order.append(marc_file)
+        return 'completed'
+
+    def test_each_file_reported_separately(self):
+        marcedit.validate_batch('cmarcedit.exe', self.files, 'rules.txt')
+        self.assertEqual(len(set(self.reports)), 3)
+
+    def test_reports_combined_in_order_of_files(self):
+        results = marcedit.validate_batch(
+            'cmarcedit.exe', self.files, 'rules.txt')
+        self.assertEqual(self.completion_order[-1], 'first.mrc')
+        self.assertEqual(
+            results,
+            [('first.mrc', True, True), ('second.mrc', True, True),
+             ('third.mrc', True, True)])
+        with open(self.fh, 'r') as file:
+            combined = [
+                line.strip() for line in file
+                if line.startswith('report of')]
+        self.assertEqual(
+            combined,
+            ['report of first.mrc', 'report of second.mrc',
+             'report of third.mrc'])
+
+    def test_temporary_reports_removed(self):
+        marcedit.validate_batch('cmarcedit.exe', self.files, 'rules.txt')
+        self.assertEqual(len(self.reports), 3)
+        for report in self.reports:
+            self.assertFalse(os.path.isfile(report))
+
+    def test_failed_launch_not_completed(self):
+        self.subprocess.check_output.side_effect = OSError('not found')
+        results = marcedit.validate_batch(
+            'cmarcedit.exe', self.files[:1], 'rules.txt')
+        self.assertEqual(results, [('first.mrc', None, False)])
+
+
+class TestValidateFilesWithMARCEdit(unittest.TestCase):
+    """
+    Tests handling of MARCEdit results by validation of a batch
+    """
+
+    def setUp(self):
+        self.lspec = 'local_specs_report_test.txt'
+        self.dval = 'default_validation_report_test.txt'
+        self.cval = 'combined_validation_report_test.txt'
+        # validation module may import marcedit under another name
+        validator = validation.marcedit
+        patch.object(validation, 'LSPEC_REP', self.lspec).start()
+        patch.object(validation, 'DVAL_REP', self.dval).start()
+        patch.object(
+            validator, 'MVAL_REP', 'marcedit_validation_report.txt').start()
+        patch.object(validator, 'CVAL_REP', self.cval).start()
+        patch.object(
+            validator, 'get_engine',
+            return_value=('cmarcedit.exe', 'rules.txt')).start()
+        self.subprocess = patch.object(validator, 'subprocess').start()
+
+    def tearDown(self):
+        patch.stopall()
+        for fh in [self.lspec, self.dval, self.cval]:
+            if os.path.isfile(fh):
+                os.remove(fh)
+
+    def test_failed_launch_raises_error(self):
+        self.subprocess.check_output.side_effect = OSError('not found')
+        with self.assertRaises(validation.OverloadError):
+            validation.validate_files(
+                'nypl', 'cat', ['test.mrc'], marcval=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,15 +2,18 @@
 
 import unittest
 from datetime import datetime, timedelta
-from mock import patch
+from mock import MagicMock, patch
 import requests_mock
 
 import json
 import requests
+import time
 from requests.exceptions import ConnectionError, Timeout
 
 from context import APITokenError, APITokenExpiredError
 from context import AuthorizeAccess, PlatformSession
+from context import RetryPolicy, CircuitBreaker, RetryStats, parse_retry_after
+from context import PlatformTokenProvider
 
 
 class TestAuthorizeAccessLogic(unittest.TestCase):
@@ -135,10 +138,12 @@ class TestAuthorizeAccessLogic(unittest.TestCase):
                 "__str__",
                 "__subclasshook__",
                 "__weakref__",
+                "_request",
                 "_validate_token",
                 "adapters",
                 "auth",
                 "base_url",
+                "breaker",
                 "cert",
                 "close",
                 "cookies",
@@ -176,10 +181,13 @@ class TestAuthorizeAccessLogic(unittest.TestCase):
                 "rebuild_proxies",
                 "request",
                 "resolve_redirects",
+                "retry_policy",
+                "retry_stats",
                 "send",
                 "stream",
                 "timeout",
                 "token",
+                "token_provider",
                 "trust_env",
                 "verify",
             ],
@@ -274,5 +282,192 @@ class TestAuthorizeAccessLogic(unittest.TestCase):
             sess.query_bibUpdatedDate(keywords)
 
 
+class TestPlatformSessionRetries(unittest.TestCase):
+    def setUp(self):
+        self.base_url = "https://our_platform.org/api/v0.1"
+        self.endpoint = self.base_url + "/bibs"
+        token = {"expires_on": datetime.now() + timedelta(seconds=60), "id": "abc"}
+        self.sess = PlatformSession(
+            self.base_url,
+            token,
+            retry_policy=RetryPolicy(max_attempts=3, backoff=0, deadline=5),
+            breaker=CircuitBreaker(failure_threshold=4, reset_timeout=60),
+        )
+
+    def test_retry_policy_backoff_with_jitter(self):
+        policy = RetryPolicy(backoff=1, max_backoff=4)
+        for attempt, cap in ((1, 1), (2, 2), (3, 4), (6, 4)):
+            delay = policy.delay(attempt)
+            self.assertTrue(0 <= delay <= cap)
+
+    def test_retry_policy_honors_retry_after(self):
+        policy = RetryPolicy(backoff=0.1, max_backoff=0.1)
+        self.assertEqual(policy.delay(1, retry_after=3), 3)
+
+    def test_parse_retry_after(self):
+        response = requests.Response()
+        self.assertIsNone(parse_retry_after(response))
+        response.headers["Retry-After"] = "2"
+        self.assertEqual(parse_retry_after(response), 2.0)
+        response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+        self.assertEqual(parse_retry_after(response), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_circuit_breaker_opens_and_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        # single trial request allowed after reset timeout
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half-open")
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_circuit_breaker_rejects_when_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    @requests_mock.Mocker()
+    def test_transient_error_retried(self, m):
+        m.get(
+            self.endpoint,
+            [
+                {"status_code": 503},
+                {"exc": ConnectionError},
+                {"status_code": 200, "json": {"data": []}},
+            ],
+        )
+        res = self.sess.query_bibStandardNo(keywords=["12345"])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(m.call_count, 3)
+        stats = self.sess.retry_stats.summary()
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["retried_requests"], 1)
+        self.assertEqual(stats["failed_requests"], 0)
+        self.assertEqual(self.sess.breaker.state, "closed")
+
+    @requests_mock.Mocker()
+    def test_not_found_not_retried(self, m):
+        m.get(self.endpoint, status_code=404)
+        res = self.sess.query_bibId(keywords=["12345678"])
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(m.call_count, 1)
+
+    @requests_mock.Mocker()
+    def test_error_response_returned_after_max_attempts(self, m):
+        m.get(self.endpoint, status_code=500)
+        res = self.sess.query_bibControlNo(keywords=["ocm0001"])
+        self.assertEqual(res.status_code, 500)
+        self.assertEqual(m.call_count, 3)
+        self.assertEqual(self.sess.retry_stats.summary()["failed_requests"], 1)
+
+    @requests_mock.Mocker()
+    def test_timeout_raised_after_max_attempts(self, m):
+        m.get(self.endpoint, exc=Timeout)
+        with self.assertRaises(Timeout):
+            self.sess.query_bibStandardNo(keywords=["12345"])
+        self.assertEqual(m.call_count, 3)
+
+    @requests_mock.Mocker()
+    def test_deadline_limits_retries(self, m):
+        m.get(self.endpoint, status_code=503, headers={"Retry-After": "10"})
+        res = self.sess.query_bibStandardNo(keywords=["12345"])
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(m.call_count, 1)
+
+    @requests_mock.Mocker()
+    def test_open_breaker_fails_fast(self, m):
+        m.get(self.endpoint, exc=ConnectionError)
+        with self.assertRaises(ConnectionError):
+            self.sess.query_bibStandardNo(keywords=["12345"])
+        # fourth failed attempt opens the breaker and stops retries
+        with self.assertRaises(ConnectionError):
+            self.sess.query_bibStandardNo(keywords=["12345"])
+        self.assertEqual(m.call_count, 4)
+        self.assertEqual(self.sess.breaker.state, "open")
+        with self.assertRaises(Exception) as cm:
+            self.sess.query_bibStandardNo(keywords=["12345"])
+        self.assertEqual(type(cm.exception).__name__, "APICriticalError")
+        self.assertEqual(m.call_count, 4)
+        self.assertEqual(self.sess.retry_stats.summary()["rejected_requests"], 1)
+
+
+class TestPlatformTokenProvider(unittest.TestCase):
+    def setUp(self):
+        self.base_url = "https://our_platform.org/api/v0.1"
+        self.auth = MagicMock()
+        self.auth.get_token.side_effect = lambda: {
+            "id": "new",
+            "expires_on": datetime.now() + timedelta(seconds=3600),
+        }
+
+    def test_valid_token_reused(self):
+        token = {"id": "last", "expires_on": datetime.now() + timedelta(hours=1)}
+        provider = PlatformTokenProvider(self.auth, token=token)
+        self.assertIs(provider.get_token(), token)
+        self.assertFalse(self.auth.get_token.called)
+
+    def test_token_renewed_before_expiration(self):
+        token = {"id": "last", "expires_on": datetime.now() + timedelta(seconds=30)}
+        saved = []
+        provider = PlatformTokenProvider(
+            self.auth, token=token, refresh_margin=60, on_refresh=saved.append
+        )
+        self.assertEqual(provider.get_token()["id"], "new")
+        self.assertEqual(provider.get_token()["id"], "new")
+        self.assertEqual(self.auth.get_token.call_count, 1)
+        self.assertEqual([t["id"] for t in saved], ["new"])
+
+    def test_latest_token_kept_by_provider(self):
+        token = {"id": "last", "expires_on": datetime.now() + timedelta(seconds=30)}
+        provider = PlatformTokenProvider(self.auth, token=token, refresh_margin=60)
+        self.assertIs(provider.token, token)
+        provider.get_token()
+        self.assertEqual(provider.token["id"], "new")
+
+    def test_failed_renewal_keeps_unexpired_token(self):
+        self.auth.get_token.side_effect = ConnectionError
+        token = {"id": "last", "expires_on": datetime.now() + timedelta(seconds=30)}
+        provider = PlatformTokenProvider(self.auth, token=token, refresh_margin=60)
+        self.assertIs(provider.get_token(), token)
+
+    def test_failed_renewal_of_expired_token_raises(self):
+        self.auth.get_token.side_effect = APITokenError("error")
+        token = {"id": "last", "expires_on": datetime.now() - timedelta(seconds=1)}
+        provider = PlatformTokenProvider(self.auth, token=token)
+        with self.assertRaises(APITokenError):
+            provider.get_token()
+
+    def test_background_renewal(self):
+        provider = PlatformTokenProvider(self.auth, refresh_margin=60).start()
+        try:
+            for _ in range(100):
+                if self.auth.get_token.called:
+                    break
+                time.sleep(0.01)
+        finally:
+            provider.stop()
+        self.assertEqual(self.auth.get_token.call_count, 1)
+
+    def test_session_uses_renewed_token(self):
+        token = {"id": "last", "expires_on": datetime.now() + timedelta(seconds=30)}
+        provider = PlatformTokenProvider(
+            self.auth, token=token, refresh_margin=10
+        )
+        sess = PlatformSession(self.base_url, token_provider=provider)
+        self.assertEqual(sess.headers["Authorization"], "Bearer last")
+        # token expires without raising APITokenExpiredError
+        provider.refresh_margin = 60
+        sess._validate_token()
+        self.assertEqual(sess.headers["Authorization"], "Bearer new")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+
+from context import batch_journal
+
+
+class TestBatchJournal(unittest.TestCase):
+    """
+    Tests write-ahead journal of PVF batch
+    """
+
+    def setUp(self):
+        self.fh = 'batch_journal_test.txt'
+        self.out = 'batch_journal_test.mrc'
+        self.params = {
+            'files': ['vendor.mrc'],
+            'system': 'nypl',
+            'agent': 'cat',
+            'outfiles': [self.out]}
+
+    def tearDown(self):
+        for fh in (self.fh, self.out):
+            if os.path.isfile(fh):
+                os.remove(fh)
+
+    def test_load_missing_journal(self):
+        self.assertIsNone(batch_journal.BatchJournal.load(self.fh))
+
+    def test_last_checkpoint_is_resumable(self):
+        journal = batch_journal.BatchJournal.start(self.fh, self.params)
+        journal.checkpoint(100, 1, 100, {self.out: 1000})
+        journal.checkpoint(200, 2, 50, {self.out: 2000})
+        journal.close()
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        self.assertEqual(journal.params, self.params)
+        self.assertTrue(journal.resumable)
+        self.assertEqual(journal.last_checkpoint['n'], 200)
+        self.assertEqual(journal.last_checkpoint['f'], 2)
+        self.assertEqual(journal.last_checkpoint['pos'], 50)
+        self.assertEqual(
+            journal.last_checkpoint['offsets'], {self.out: 2000})
+        self.assertEqual(journal.last_checkpoint['stage'], 'records')
+
+    def test_torn_entry_ignored(self):
+        journal = batch_journal.BatchJournal.start(self.fh, self.params)
+        journal.checkpoint(100, 1, 100, {self.out: 1000})
+        journal.close()
+        with open(self.fh, 'a') as file:
+            file.write('{"type": "checkpoint", "n": 2')
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        self.assertEqual(journal.last_checkpoint['n'], 100)
+
+    def test_completed_batch_not_resumable(self):
+        journal = batch_journal.BatchJournal.start(self.fh, self.params)
+        journal.checkpoint(100, 1, 100, {self.out: 1000})
+        journal.complete()
+        journal.close()
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        self.assertTrue(journal.completed)
+        self.assertFalse(journal.resumable)
+
+    def test_reopened_journal_appends_checkpoints(self):
+        journal = batch_journal.BatchJournal.start(self.fh, self.params)
+        journal.checkpoint(100, 1, 100, {self.out: 1000})
+        journal.close()
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        journal.reopen()
+        journal.checkpoint(150, 1, 150, {self.out: 1500}, 'deduped')
+        journal.close()
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        self.assertEqual(journal.params, self.params)
+        self.assertEqual(journal.last_checkpoint['n'], 150)
+        self.assertEqual(journal.last_checkpoint['stage'], 'deduped')
+
+    def test_closed_journal_reopened_by_next_entry(self):
+        journal = batch_journal.BatchJournal.start(self.fh, self.params)
+        journal.checkpoint(100, 1, 100, {self.out: 1000})
+        journal.close()
+        journal.complete()
+        journal.close()
+
+        journal = batch_journal.BatchJournal.load(self.fh)
+        self.assertEqual(journal.last_checkpoint['n'], 100)
+        self.assertTrue(journal.completed)
+
+    def test_truncate_files_to_committed_offsets(self):
+        with open(self.out, 'wb') as file:
+            file.write(b'committed|uncommitted')
+        offsets = batch_journal.file_offsets([self.out, 'missing.mrc'])
+        self.assertEqual(offsets, {self.out: 21, 'missing.mrc': 0})
+
+        batch_journal.truncate_files({self.out: 10, 'missing.mrc': 0})
+        with open(self.out, 'rb') as file:
+            self.assertEqual(file.read(), b'committed|')
+
+    def test_truncate_files_shorter_than_committed(self):
+        with open(self.out, 'wb') as file:
+            file.write(b'short')
+        with self.assertRaises(batch_journal.OverloadError):
+            batch_journal.truncate_files({self.out: 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
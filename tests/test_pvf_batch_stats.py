@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+
+from context import batch_stats
+
+
+class TestBatchStats(unittest.TestCase):
+    """
+    Tests storing analysis of processed records in a csv file
+    """
+
+    def setUp(self):
+        self.fh = 'batch_stats_test.csv'
+        self.analysis = {
+            'vendor_id': u'ven0001',
+            'vendor': u'TEST VENDOR',
+            'updated_by_vendor': False,
+            'callNo_match': True,
+            'target_callNo': u'J FIC ŁÓDŹ',
+            'vendor_callNo': u'NA',
+            'inhouse_dups': ['00000008', '00000009'],
+            'target_sierraId': '00000008',
+            'target_title': u'Zażółć gęślą jaźń, "test"',
+            'mixed': [],
+            'other': ['00000004'],
+            'action': 'attach'}
+
+    def tearDown(self):
+        if os.path.isfile(self.fh):
+            os.remove(self.fh)
+
+    def test_format_sierra_id(self):
+        self.assertEqual(
+            batch_stats.format_sierra_id('01234567'), 'b01234567a')
+        self.assertEqual(
+            batch_stats.format_sierra_id('1234567'), 'o1234567a')
+        self.assertIsNone(batch_stats.format_sierra_id(''))
+        self.assertIsNone(batch_stats.format_sierra_id(None))
+
+    def test_format_bib_ids(self):
+        self.assertEqual(
+            batch_stats.format_bib_ids(['00000004', '00000005']),
+            'b00000004a,b00000005a')
+        self.assertIsNone(batch_stats.format_bib_ids([]))
+        self.assertIsNone(batch_stats.format_bib_ids(None))
+
+    def test_analysis2row_bpl_analysis(self):
+        analysis = self.analysis.copy()
+        del analysis['mixed']
+        del analysis['other']
+        del analysis['target_title']
+        row = batch_stats.analysis2row(3, analysis)
+        self.assertEqual(
+            row,
+            [3, u'ven0001', u'TEST VENDOR', False, True, u'J FIC ŁÓDŹ',
+             u'NA', 'b00000008a,b00000009a', 'b00000008a', None, None,
+             None, 'attach'])
+
+    def test_round_trip(self):
+        with batch_stats.BatchStatsWriter(self.fh) as writer:
+            writer.write(1, self.analysis)
+            writer.write(2, dict(
+                self.analysis, callNo_match=False, updated_by_vendor=None))
+        df = batch_stats.read_batch_stats(self.fh)
+        self.assertEqual(df.index.tolist(), [1, 2])
+        self.assertEqual(df['callNo_match'].dtype, bool)
+        self.assertEqual(df['callNo_match'].tolist(), [True, False])
+        self.assertEqual(df['updated_by_vendor'].tolist(), [False, False])
+        self.assertEqual(
+            df.loc[1, 'target_title'], u'Zażółć gęślą jaźń, "test"')
+        self.assertEqual(df.loc[1, 'target_callNo'], u'J FIC ŁÓDŹ')
+        # literal NA call number is not a missing value
+        self.assertEqual(df.loc[1, 'vendor_callNo'], u'NA')
+        self.assertIsNone(df.loc[1, 'mixed'])
+        self.assertEqual(df.loc[2, 'other'], 'b00000004a')
+
+    def test_clear_batch_stats(self):
+        with batch_stats.BatchStatsWriter(self.fh) as writer:
+            writer.write(1, self.analysis)
+        batch_stats.clear_batch_stats(self.fh)
+        df = batch_stats.read_batch_stats(self.fh)
+        self.assertTrue(df.empty)
+        self.assertEqual(
+            df.columns.tolist(),
+            [column for column, dtype in batch_stats.STATS_COLUMNS])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import Queue
+import time
+import unittest
+
+
+from context import batch_worker
+
+
+def fake_processing(progbar, current_process_label, control=None):
+    current_process_label.set('quering...')
+    for n in range(1, 4):
+        progbar['value'] = n
+        progbar.update()
+        if control is not None:
+            control.checkpoint()
+    return progbar['value']
+
+
+class TestBatchWorker(unittest.TestCase):
+    """
+    Tests running PVF batch on a worker thread
+    """
+
+    def setUp(self):
+        self.events = Queue.Queue()
+        self.progbar = batch_worker.ProgressbarProxy(
+            self.events, maximum=3, value=0)
+        self.label = batch_worker.StringVarProxy(self.events)
+
+    def run_worker(self, control=None):
+        worker = batch_worker.BatchWorker(
+            self.events, fake_processing, self.progbar, self.label,
+            control=control)
+        worker.start()
+        return worker
+
+    def wait(self, worker):
+        for _ in range(100):
+            if not worker.is_alive():
+                break
+            time.sleep(0.01)
+
+    def test_progress_posted_as_events(self):
+        worker = self.run_worker()
+        self.wait(worker)
+        self.assertEqual(worker.result(), 3)
+        self.assertEqual(
+            worker.drain(),
+            [('label', None, 'quering...'),
+             ('progbar', 'value', 1),
+             ('progbar', 'value', 2),
+             ('progbar', 'value', 3)])
+        self.assertEqual(worker.drain(), [])
+
+    def test_proxies_keep_last_values(self):
+        self.progbar['value'] = 2
+        self.label.set('deduping...')
+        self.assertEqual(self.progbar['maximum'], 3)
+        self.assertEqual(self.progbar['value'], 2)
+        self.assertEqual(self.label.get(), 'deduping...')
+
+    def test_paused_worker_waits_between_records(self):
+        control = batch_worker.BatchControl()
+        control.pause()
+        worker = self.run_worker(control)
+        time.sleep(0.05)
+        self.assertTrue(worker.is_alive())
+        self.assertEqual(self.progbar['value'], 1)
+        control.resume()
+        self.wait(worker)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(worker.result(), 3)
+
+    def test_cancelled_worker_raises_on_result(self):
+        control = batch_worker.BatchControl()
+        control.pause()
+        worker = self.run_worker(control)
+        control.cancel()
+        self.wait(worker)
+        self.assertTrue(control.cancelled)
+        with self.assertRaises(batch_worker.BatchCancelledError):
+            worker.result()
+        self.assertEqual(self.progbar['value'], 1)
+
+    def test_exception_marshalled_to_result(self):
+        worker = batch_worker.BatchWorker(
+            self.events, fake_processing, None, self.label)
+        worker.start()
+        self.wait(worker)
+        with self.assertRaises(TypeError):
+            worker.result()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import unittest
+from mock import MagicMock
+import os
+import time
+
+
+from context import match_cache
+
+
+class TestQueryKeywords(unittest.TestCase):
+    """
+    Tests normalization of cache keywords
+    """
+
+    def setUp(self):
+        self.meta = MagicMock(
+            t001='ocm00000001',
+            t020=['9780439136358', '0439136350', '9780439136358'],
+            t022=[],
+            t024=[],
+            sierraId=None)
+
+    def test_standard_numbers_sorted_and_deduped(self):
+        self.assertEqual(
+            match_cache.query_keywords(self.meta, '020'),
+            '0439136350,9780439136358')
+
+    def test_control_number(self):
+        self.assertEqual(
+            match_cache.query_keywords(self.meta, '001'),
+            'ocm00000001')
+
+    def test_no_keywords(self):
+        self.assertIsNone(match_cache.query_keywords(self.meta, '024'))
+        self.assertIsNone(
+            match_cache.query_keywords(self.meta, 'sierra_id'))
+
+
+class TestMatchCache(unittest.TestCase):
+    """
+    Tests persistent cache of query results
+    """
+
+    def setUp(self):
+        self.fh = 'match_cache_test'
+        self.key = match_cache.MatchCache.make_key(
+            'https://platform', '020', '9780439136358')
+
+    def tearDown(self):
+        for fh in glob.glob(self.fh + '*'):
+            os.remove(fh)
+
+    def test_result_persists_between_runs(self):
+        cache = match_cache.MatchCache(fh=self.fh)
+        cache.set(self.key, ('nohit', None))
+        cache.close()
+
+        cache = match_cache.MatchCache(fh=self.fh)
+        self.assertEqual(cache.get(self.key), ('nohit', None))
+        self.assertEqual(cache.hits, 1)
+        cache.close()
+
+    def test_expired_result_not_returned(self):
+        cache = match_cache.MatchCache(fh=self.fh, ttl=0.01)
+        cache.set(self.key, ('nohit', None))
+        cache.close()
+        time.sleep(0.05)
+        cache = match_cache.MatchCache(fh=self.fh, ttl=0.01)
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(cache.misses, 1)
+        cache.close()
+
+    def test_bypass_ignores_cached_results(self):
+        cache = match_cache.MatchCache(fh=self.fh)
+        cache.set(self.key, ('nohit', None))
+        cache.close()
+        cache = match_cache.MatchCache(fh=self.fh, bypass=True)
+        self.assertIsNone(cache.get(self.key))
+        cache.close()
+
+    def test_least_recently_used_evicted(self):
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=2)
+        cache.set('a', ('nohit', None))
+        time.sleep(0.01)
+        cache.set('b', ('nohit', None))
+        time.sleep(0.01)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.set('c', ('nohit', None))
+        cache.close()
+
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=2)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        cache.close()
+
+    def test_size_capped_before_close(self):
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=10)
+        for n in range(11):
+            cache.set(str(n), ('nohit', None))
+        self.assertEqual(len(cache._store), 9)
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('10'))
+        cache.close()
+
+    def test_access_time_persists_between_runs(self):
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=2)
+        cache.set('a', ('nohit', None))
+        time.sleep(0.01)
+        cache.set('b', ('nohit', None))
+        cache.close()
+        time.sleep(0.01)
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=2)
+        cache.get('a')
+        cache.close()
+
+        cache = match_cache.MatchCache(fh=self.fh, maxsize=2)
+        cache.set('c', ('nohit', None))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
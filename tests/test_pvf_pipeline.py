@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+
+from context import pipeline, default, local_specs
+
+
+class TestRecordStream(unittest.TestCase):
+    """
+    Tests single pass record stream and its visitors produce
+    the same results as stand-alone validators
+    """
+
+    def setUp(self):
+        self.files = ['dups.mrc', 'no_dups.mrc']
+
+    def test_visitors_receive_each_record(self):
+        stream = pipeline.RecordStream(self.files)
+        counter = stream.register(pipeline.RecordCounter())
+        stream.run()
+        self.assertEqual(counter.counts['dups.mrc'], 6)
+        self.assertEqual(
+            counter.report(), sum(counter.counts.values()))
+
+    def test_barcode_dups_visitor_matches_default_validation(self):
+        stream = pipeline.RecordStream(self.files)
+        check = stream.register(pipeline.BarcodeDupsVisitor('nypl'))
+        stream.run()
+        self.assertEqual(
+            check.report(),
+            default.barcode_duplicates(self.files, 'nypl'))
+
+    def test_local_specs_visitor_matches_local_specs_validation(self):
+        specs = local_specs.local_specs(
+            'nypl', 'cat', '../overload/rules/vendor_specs.xml')
+        stream = pipeline.RecordStream(self.files)
+        check = stream.register(pipeline.LocalSpecsVisitor('nypl', specs))
+        stream.run()
+        self.assertEqual(
+            check.report(),
+            local_specs.local_specs_validation('nypl', self.files, specs))
+
+
+if __name__ == '__main__':
+    unittest.main()
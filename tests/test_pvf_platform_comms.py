@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+import glob
+import os
+import shelve
+import unittest
+from mock import MagicMock, patch
+import time
+
+
+from context import platform_comms, queries, stage_timer
+
+
+class TestPlatformQueryEngine(unittest.TestCase):
+    """
+    Tests concurrent Platform queries of vendor records
+    """
+
+    def setUp(self):
+        self.session = MagicMock()
+        self.matchpoints = {
+            'primary': ('tag', '020'),
+            'secondary': ('tag', '001')}
+
+    def test_results_returned_in_original_order(self):
+        def fake_query(api_type, session, meta, matchpoint, cache=None):
+            # earlier records take longer to answer
+            time.sleep(0.01 * (10 - meta))
+            return ('nohit', None)
+
+        engine = platform_comms.PlatformQueryEngine(
+            'Platform API', 'test', self.session, workers=4, window=8,
+            batch_size=1)
+        items = [(n, self.matchpoints, n) for n in range(10)]
+        with patch.object(
+                platform_comms, 'platform_queries_manager',
+                side_effect=fake_query):
+            results = [payload for payload, _, _ in engine.map(items)]
+        engine.close()
+        self.assertEqual(results, range(10))
+
+    def test_only_waiting_for_results_timed(self):
+        def slow_records():
+            # reading and identifying records takes longer than queries
+            for n in range(3):
+                time.sleep(0.05)
+                yield (n, self.matchpoints, n)
+
+        timer = stage_timer.StageTimer()
+        engine = platform_comms.PlatformQueryEngine(
+            'Platform API', 'test', self.session, workers=2, window=2,
+            batch_size=1, timer=timer)
+        with patch.object(
+                platform_comms, 'platform_queries_manager',
+                return_value=('nohit', None)):
+            list(engine.map(slow_records()))
+        engine.close()
+        waits = timer.summary()['query results']
+        self.assertEqual(waits['count'], 3)
+        self.assertLess(waits['total'], 0.05)
+
+    def test_fallback_on_secondary_matchpoint(self):
+        engine = platform_comms.PlatformQueryEngine(
+            'Platform API', 'test', self.session, workers=1)
+        with patch.object(
+                platform_comms, 'platform_queries_manager',
+                return_value=('nohit', None)) as mock_query:
+            meta_out = engine.query('meta', self.matchpoints)
+        self.assertEqual(meta_out, [])
+        self.assertEqual(mock_query.call_count, 2)
+        self.assertEqual(mock_query.call_args[0][3], '001')
+
+    def test_server_error_raises_overload_error(self):
+        engine = platform_comms.PlatformQueryEngine(
+            'Platform API', 'test', self.session, workers=1)
+        with patch.object(
+                platform_comms, 'platform_queries_manager',
+                return_value=('error', None)):
+            with self.assertRaises(platform_comms.OverloadError):
+                engine.query('meta', self.matchpoints)
+
+    def test_primary_standard_numbers_batched(self):
+        engine = platform_comms.PlatformQueryEngine(
+            'Platform API', 'test', self.session, workers=1, batch_size=3)
+        items = [(n, self.matchpoints, n) for n in range(4)]
+        with patch.object(
+                platform_comms, 'platform_batch_queries_manager',
+                side_effect=lambda s, metas, m, cache=None: [
+                    ('nohit', None) for _ in metas]) as mock_batch:
+            with patch.object(
+                    platform_comms, 'platform_queries_manager',
+                    return_value=('nohit', None)) as mock_query:
+                results = [payload for payload, _, _ in engine.map(items)]
+        self.assertEqual(results, [0, 1, 2, 3])
+        # one batch of 3 records, the last record queried on its own
+        self.assertEqual(mock_batch.call_count, 1)
+        self.assertEqual(mock_batch.call_args[0][1], [0, 1, 2])
+        # secondary queries for each record + primary for the last one
+        self.assertEqual(mock_query.call_count, 5)
+
+
+class TestOpenPlatformSession(unittest.TestCase):
+    """
+    Tests sharing of token provider among Platform sessions
+    """
+
+    def setUp(self):
+        self.provider = MagicMock()
+        self.provider.get_token.return_value = {
+            'id': 'abc', 'expires_on': datetime.now() + timedelta(hours=1)}
+        self.connect = patch.object(
+            platform_comms, '_connect_platform',
+            return_value=('https://platform', self.provider))
+        self.mock_connect = self.connect.start()
+
+    def tearDown(self):
+        self.connect.stop()
+        platform_comms.discard_platform_connection('test')
+
+    def test_settings_read_once(self):
+        sess1 = platform_comms.open_platform_session('test')
+        sess2 = platform_comms.open_platform_session('test')
+        self.assertEqual(self.mock_connect.call_count, 1)
+        self.assertIs(sess1.token_provider, sess2.token_provider)
+
+    def test_discarded_connection_reconnects(self):
+        platform_comms.open_platform_session('test')
+        platform_comms.discard_platform_connection('test')
+        self.assertTrue(self.provider.stop.called)
+        platform_comms.open_platform_session('test')
+        self.assertEqual(self.mock_connect.call_count, 2)
+
+    def test_token_error_raises_overload_error(self):
+        self.mock_connect.side_effect = platform_comms.APITokenError('error')
+        with self.assertRaises(platform_comms.OverloadError):
+            platform_comms.open_platform_session('test')
+
+
+class TestSavePlatformTokens(unittest.TestCase):
+    """
+    Tests storing tokens renewed in the background in user_data
+    """
+
+    def setUp(self):
+        self.fh = 'user_data_test'
+        ud = shelve.open(self.fh)
+        ud['PlatformAPIs'] = {'test': {'last_token': None}}
+        ud.close()
+        self.token = {
+            'id': 'abc', 'expires_on': datetime.now() + timedelta(hours=1)}
+        self.provider = MagicMock(token=self.token)
+        self.provider.get_token.return_value = self.token
+        patch.object(platform_comms, 'USER_DATA', self.fh).start()
+        patch.object(
+            platform_comms, '_connect_platform',
+            return_value=('https://platform', self.provider)).start()
+
+    def tearDown(self):
+        patch.stopall()
+        platform_comms.discard_platform_connection('test')
+        for fh in glob.glob(self.fh + '*'):
+            os.remove(fh)
+
+    def test_latest_token_saved(self):
+        platform_comms.open_platform_session('test')
+        platform_comms.save_platform_tokens()
+        ud = shelve.open(self.fh)
+        self.assertEqual(ud['PlatformAPIs']['test']['last_token'], self.token)
+        ud.close()
+
+    def test_removed_connection_not_saved(self):
+        platform_comms.open_platform_session('test')
+        ud = shelve.open(self.fh)
+        ud['PlatformAPIs'] = {}
+        ud.close()
+        platform_comms.save_platform_tokens()
+        ud = shelve.open(self.fh)
+        self.assertEqual(ud['PlatformAPIs'], {})
+        ud.close()
+
+
+class TestBatchQueryRunner(unittest.TestCase):
+    """
+    Tests splitting of batched Platform results among vendor records
+    """
+
+    def setUp(self):
+        self.meta1 = MagicMock(t020=['9780439136358'])
+        self.meta2 = MagicMock(t020=['9781234567897'])
+        self.meta3 = MagicMock(t020=[])
+
+    def test_results_split_among_vendor_records(self):
+        session = MagicMock()
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'data': [
+                {'id': '10000001', 'standardNumbers': [
+                    '0439136350', '978-0-439-13635-8']},
+                {'id': '10000002', 'standardNumbers': [
+                    '9780439136358 (pbk.)']}]}
+        session.query_bibStandardNo.return_value = response
+        results = queries.batch_query_runner(
+            session, [self.meta1, self.meta2, self.meta3], '020')
+        self.assertEqual(
+            session.query_bibStandardNo.call_args[1]['keywords'],
+            ['9780439136358', '9781234567897'])
+        self.assertEqual(results[0][0], 'hit')
+        self.assertEqual(
+            [b['id'] for b in results[0][1]['data']],
+            ['10000001', '10000002'])
+        self.assertEqual(results[1], ('nohit', None))
+        self.assertEqual(results[2], ('nohit', None))
+
+    def test_isbn10_matched_with_isbn13(self):
+        session = MagicMock()
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'data': [{'id': '10000001', 'standardNumbers': [
+                '9780439136358']}]}
+        session.query_bibStandardNo.return_value = response
+        meta = MagicMock(t020=['0439136350'])
+        results = queries.batch_query_runner(
+            session, [meta, self.meta2], '020')
+        self.assertEqual(results[0][0], 'hit')
+        self.assertEqual(results[1], ('nohit', None))
+        self.assertEqual(session.query_bibStandardNo.call_count, 1)
+
+    def test_unattributed_hit_queried_individually(self):
+        session = MagicMock()
+        batch_response = MagicMock(status_code=200)
+        batch_response.json.return_value = {
+            'data': [{'id': '10000001', 'standardNumbers': ['n/a']}]}
+        single_response = MagicMock(status_code=200)
+        single_response.json.return_value = {
+            'data': [{'id': '10000001', 'standardNumbers': ['n/a']}]}
+        session.query_bibStandardNo.side_effect = [
+            batch_response, single_response]
+        results = queries.batch_query_runner(
+            session, [self.meta1, self.meta3], '020')
+        self.assertEqual(session.query_bibStandardNo.call_count, 2)
+        self.assertEqual(
+            session.query_bibStandardNo.call_args[1]['keywords'],
+            ['9780439136358'])
+        self.assertEqual(results[0][0], 'hit')
+        self.assertEqual(results[0][1]['data'][0]['id'], '10000001')
+        # records without keywords are not queried again
+        self.assertEqual(results[1], ('nohit', None))
+
+    def test_paging_through_results(self):
+        session = MagicMock()
+        page1 = MagicMock(status_code=200)
+        page1.json.return_value = {
+            'data': [{'id': '10000001', 'standardNumbers': [
+                '9780439136358']}]}
+        page2 = MagicMock(status_code=404)
+        session.query_bibStandardNo.side_effect = [page1, page2]
+        results = queries.batch_query_runner(
+            session, [self.meta1], '020', limit=1)
+        self.assertEqual(session.query_bibStandardNo.call_count, 2)
+        self.assertEqual(
+            session.query_bibStandardNo.call_args[1]['offset'], 1)
+        self.assertEqual(results[0][0], 'hit')
+
+    def test_no_keywords_skips_request(self):
+        session = MagicMock()
+        results = queries.batch_query_runner(session, [self.meta3], '020')
+        self.assertFalse(session.query_bibStandardNo.called)
+        self.assertEqual(results, [('nohit', None)])
+
+
+class TestTimedPlatformSession(unittest.TestCase):
+    """
+    Tests recording of Platform endpoints latency
+    """
+
+    def test_endpoint_requests_timed(self):
+        timer = stage_timer.StageTimer()
+        session = platform_comms.TimedPlatformSession(MagicMock(), timer)
+        session.query_bibStandardNo(keywords=['1'])
+        session.query_bibStandardNo(keywords=['2'])
+        session.query_bibId(keywords=['1'])
+        summary = timer.summary()
+        self.assertEqual(summary['platform bibStandardNo']['count'], 2)
+        self.assertEqual(summary['platform bibId']['count'], 1)
+
+    def test_other_attributes_not_timed(self):
+        timer = stage_timer.StageTimer()
+        session = MagicMock()
+        session.base_url = 'http://platform'
+        timed_session = platform_comms.TimedPlatformSession(session, timer)
+        timed_session.close()
+        self.assertEqual(timed_session.base_url, 'http://platform')
+        self.assertTrue(session.close.called)
+        self.assertEqual(timer.summary(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
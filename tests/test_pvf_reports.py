@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import os
 import unittest
-import shelve
 from datetime import datetime
 
 import pandas as pd
 
-from context import reports
+from context import reports, batch_stats
 
 
 class Test_Reports(unittest.TestCase):
@@ -86,40 +86,45 @@ class Test_Reports(unittest.TestCase):
                 'action': 'insert'}
         }
 
-        stats_shelf = shelve.open('temp')
-        for key, value in d.iteritems():
-            stats_shelf[key] = value
-        stats_shelf.close()
+        with batch_stats.BatchStatsWriter('temp.csv') as writer:
+            for key in sorted(d.keys()):
+                writer.write(int(key), d[key])
 
         # today's date
         self.report_date = datetime.now().strftime('%y-%m-%d')
 
-    def cleanUp(self):
-        stats_shelf = shelve.open('temp')
-        stats_shelf.clear()
-        stats_shelf.close()
+    def tearDown(self):
+        if os.path.isfile('temp.csv'):
+            os.remove('temp.csv')
 
-    def test_shelf2dataframe(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+    def test_stats2dataframe(self):
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         self.assertIsInstance(
             df, pd.DataFrame)
         self.assertEqual(
             list(df.columns.values),
-            ['action', 'callNo_match', 'inhouse_dups', 'mixed', 'other', 'target_callNo', 'target_sierraId', 'updated_by_vendor', 'vendor', 'vendor_callNo', 'vendor_id'])
+            ['vendor_id', 'vendor', 'updated_by_vendor', 'callNo_match', 'target_callNo', 'vendor_callNo', 'inhouse_dups', 'target_sierraId', 'target_title', 'mixed', 'other', 'action'])
         self.assertEqual(
-            df.shape, (6, 11))
-        # check if replaces empty strings with np.NaN values
+            df.shape, (6, 12))
+        # check if replaces empty lists with null values
         self.assertEqual(
             df.index[df['mixed'].isnull()].tolist(),
-            [2, 4, 6, 3, 5])
+            [2, 3, 4, 5, 6])
 
-    def test_shelf2dataframe_sierra_id_formatting(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
-        # more tests here
-        # print df.head()
+    def test_stats2dataframe_sierra_id_formatting(self):
+        df = reports.stats2dataframe('temp.csv', 'nypl')
+        self.assertEqual(
+            df['target_sierraId'].tolist(),
+            ['b01234567a', 'b02345678a', 'o2345678a', None, None,
+             'b00000008a'])
+
+    def test_stats2dataframe_empty_batch(self):
+        batch_stats.clear_batch_stats('temp.csv')
+        with self.assertRaises(ValueError):
+            reports.stats2dataframe('temp.csv', 'nypl')
 
     def test_create_nypl_stats(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         stats = reports.create_stats('nypl', df)
         self.assertEqual(
             stats.shape, (5, 7))
@@ -156,7 +161,7 @@ class Test_Reports(unittest.TestCase):
             stats.iloc[1]['other'], 0)
 
     def test_create_bpl_stats(self):
-        df = reports.shelf2dataframe('temp', 'bpl')
+        df = reports.stats2dataframe('temp.csv', 'bpl')
         stats = reports.create_stats('bpl', df)
         self.assertEqual(
             stats.shape, (5, 5))
@@ -185,13 +190,13 @@ class Test_Reports(unittest.TestCase):
             stats.iloc[1]['total'], 1)
 
     def test_report_dups(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         dups = reports.report_dups('NYPL', 'branches', df)
         self.assertEqual(
             dups.index.tolist(), [1, 4, 5, 6])
 
     def test_callNo_issues(self):
-        df = reports.shelf2dataframe('temp', 'bpl')
+        df = reports.stats2dataframe('temp.csv', 'bpl')
         callNo = reports.report_callNo_issues(df, 'cat')
         self.assertEqual(
             list(callNo.columns.values),
@@ -200,7 +205,7 @@ class Test_Reports(unittest.TestCase):
             callNo.index.tolist(),[2])
 
     def test_nypl_branches_dup_report_for_sheet(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         dups = reports.report_dups('NYPL', 'branches', df)
         sheet_data = reports.dups_report_for_sheet(
             'NYPL', 'branches', 'CAT', dups)
@@ -209,7 +214,7 @@ class Test_Reports(unittest.TestCase):
             [[self.report_date, 'CAT', 'TEST VENDOR1', 'ven0001', 'b01234567a', None, 'b00000003a', 'b00000004a', 'no'], [self.report_date, 'CAT', 'TEST VENDOR4', 'ven0004', None, None, None, 'b00000006a', 'no action'], [self.report_date, 'CAT', 'TEST VENDOR5', 'ven0005', None, None, None, 'b00000004a,b00000005a', 'no'], [self.report_date, 'CAT', 'TEST VENDOR5', 'ven0006', 'b00000008a', 'b00000008a,b00000009a', None, None, 'no']])
 
     def test_nypl_research_dup_report_for_sheet(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         dups = reports.report_dups('NYPL', 'research', df)
         sheet_data = reports.dups_report_for_sheet(
             'NYPL', 'research', 'ACQ', dups)
@@ -218,7 +223,7 @@ class Test_Reports(unittest.TestCase):
             [[self.report_date, 'ACQ', 'TEST VENDOR1', 'ven0001', 'b01234567a', None, 'b00000003a', 'b00000004a', 'no'], [self.report_date, 'ACQ', 'TEST VENDOR4', 'ven0004', None, None, None, 'b00000006a', 'no action'], [self.report_date, 'ACQ', 'TEST VENDOR5', 'ven0005', None, None, None, 'b00000004a,b00000005a', 'no'], [self.report_date, 'ACQ', 'TEST VENDOR5', 'ven0006', 'b00000008a', 'b00000008a,b00000009a', None, None, 'no']])
 
     def test_bpl_dup_report_for_sheet(self):
-        df = reports.shelf2dataframe('temp', 'bpl')
+        df = reports.stats2dataframe('temp.csv', 'bpl')
         dups = reports.report_dups('BPL', None, df)
         sheet_data = reports.dups_report_for_sheet(
             'BPL', None, 'CAT', dups)
@@ -227,7 +232,7 @@ class Test_Reports(unittest.TestCase):
             [[self.report_date, 'CAT', 'TEST VENDOR5', 'ven0006', 'b00000008a', 'b00000008a,b00000009a', 'no']])
 
     def test_CAT_callNos_report_for_sheet(self):
-        df = reports.shelf2dataframe('temp', 'nypl')
+        df = reports.stats2dataframe('temp.csv', 'nypl')
         callNos = reports.report_callNo_issues(df, 'cat')
         sheet_data = reports.callNos_report_for_sheet(callNos)
         self.assertEqual(
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+
+from context import stage_timer
+
+
+class TestStageTimer(unittest.TestCase):
+    """
+    Tests collection of PVF stage durations
+    """
+
+    def setUp(self):
+        self.timer = stage_timer.StageTimer()
+
+    def test_percentile(self):
+        samples = [float(n) for n in range(1, 101)]
+        self.assertEqual(stage_timer.percentile(samples, 0.5), 50.0)
+        self.assertEqual(stage_timer.percentile(samples, 0.95), 95.0)
+        self.assertEqual(stage_timer.percentile([2.0], 0.95), 2.0)
+        self.assertIsNone(stage_timer.percentile([], 0.5))
+
+    def test_summary(self):
+        for n in (3, 1, 2):
+            self.timer.add('analysis', float(n))
+        summary = self.timer.summary()['analysis']
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['total'], 6.0)
+        self.assertEqual(summary['p50'], 2.0)
+        self.assertEqual(summary['p95'], 3.0)
+        self.assertEqual(summary['max'], 3.0)
+
+    def test_stage_recorded_on_exception(self):
+        with self.assertRaises(ValueError):
+            with self.timer.stage('writing'):
+                raise ValueError
+        self.assertEqual(self.timer.summary()['writing']['count'], 1)
+
+    def test_timed_iter(self):
+        items = list(self.timer.timed_iter('parsing', ['a', 'b']))
+        self.assertEqual(items, ['a', 'b'])
+        self.assertEqual(self.timer.summary()['parsing']['count'], 2)
+
+    def test_format_stage_times(self):
+        self.timer.add('writing', 0.5)
+        lines = stage_timer.format_stage_times(self.timer.summary())
+        self.assertEqual(
+            lines,
+            ['  writing: count=1, total=0.50s, p50=0.500s, p95=0.500s, '
+             'max=0.500s\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -316,5 +316,20 @@ class TestIdentifyVendor(unittest.TestCase):
             vendors.identify_vendor(
                 self.bib5, self.nypl_rules), 'Sulaiman')
 
+    def test_compiled_matcher_agrees_with_vendor_index(self):
+        matcher = vendors.compile_vendor_index(self.vendor_index)
+        for bib in (self.bib1, self.bib2, self.bib3, self.bib4):
+            self.assertEqual(
+                vendors.identify_vendor(bib, matcher),
+                vendors.identify_vendor(bib, self.vendor_index))
+
+    def test_compiled_matcher_based_on_cat_rules(self):
+        matcher = vendors.compile_vendor_index(self.nypl_rules)
+        self.assertEqual(matcher.identify(self.bib5), 'Sulaiman')
+        self.assertEqual(
+            vendors.get_query_matchpoint('Sulaiman', matcher),
+            self.nypl_rules['Sulaiman']['query'])
+
+
 if __name__ == '__main__':
     unittest.main()
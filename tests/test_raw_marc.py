@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+
+from context import bibs, raw_marc
+
+
+class TestRawMarc(unittest.TestCase):
+    """
+    tests reading fields of raw MARC21 records without pymarc decoding
+    """
+
+    def setUp(self):
+        self.fh = 'dups.mrc'
+
+    def test_record_count(self):
+        self.assertEqual(len(list(raw_marc.iter_raw_marc21(self.fh))), 6)
+
+    def test_fields_match_pymarc(self):
+        raw_reader = raw_marc.iter_raw_marc21(self.fh)
+        for record, raw in zip(bibs.read_marc21(self.fh), raw_reader):
+            self.assertEqual(raw.leader, record.leader)
+            self.assertEqual(
+                [f.tag for f in raw.fields],
+                [f.tag for f in record.fields])
+            for field, raw_field in zip(record.fields, raw.fields):
+                if field.is_control_field():
+                    self.assertEqual(raw_field.data, field.data)
+                else:
+                    self.assertEqual(raw_field.indicators, field.indicators)
+                    self.assertEqual(raw_field.value(), field.value())
+
+    def test_item_subfields_match_pymarc(self):
+        raw_reader = raw_marc.iter_raw_marc21(self.fh)
+        for record, raw in zip(bibs.read_marc21(self.fh), raw_reader):
+            self.assertEqual(
+                [f.get_subfields('i', 'l') for f in raw.get_fields('949')],
+                [f.get_subfields('i', 'l') for f in record.get_fields('949')])
+
+    def test_record_lookup(self):
+        raw = next(raw_marc.iter_raw_marc21(self.fh))
+        record = next(bibs.read_marc21(self.fh))
+        self.assertEqual('001' in raw, '001' in record)
+        self.assertFalse('999' in raw)
+        self.assertIsNone(raw['999'])
+        self.assertEqual(raw['245']['a'], record['245']['a'])
+
+    def test_as_marc(self):
+        raw = next(raw_marc.iter_raw_marc21(self.fh))
+        record = next(bibs.read_marc21(self.fh))
+        self.assertEqual(raw.as_marc(), record.as_marc())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import os
+
+
+from context import rules_cache
+
+
+class TestRulesCache(unittest.TestCase):
+    """
+    Tests rules files are parsed once and reloaded only when changed
+    """
+
+    def setUp(self):
+        self.fh = 'rules_cache_test.json'
+        with open(self.fh, 'w') as file:
+            file.write('{"a": 1}')
+        self.calls = []
+        rules_cache.clear_rules_cache()
+
+    def tearDown(self):
+        rules_cache.clear_rules_cache()
+        try:
+            os.remove(self.fh)
+        except OSError:
+            pass
+
+    def loader(self, fh):
+        self.calls.append(fh)
+        return rules_cache.load_json(fh)
+
+    def test_rules_parsed_once(self):
+        data1 = rules_cache.load_rules(self.fh, self.loader, self.fh)
+        data2 = rules_cache.load_rules(self.fh, self.loader, self.fh)
+        self.assertEqual(data1, {'a': 1})
+        self.assertIs(data1, data2)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_rules_reloaded_when_file_changes(self):
+        rules_cache.load_rules(self.fh, self.loader, self.fh)
+        with open(self.fh, 'w') as file:
+            file.write('{"a": 2}')
+        mtime = os.path.getmtime(self.fh)
+        os.utime(self.fh, (mtime + 10, mtime + 10))
+        data = rules_cache.load_rules(self.fh, self.loader, self.fh)
+        self.assertEqual(data, {'a': 2})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_separate_entries_for_loader_args(self):
+        rules_cache.load_rules(self.fh, self.loader, self.fh)
+        rules_cache.load_rules(self.fh, rules_cache.load_json, self.fh)
+        self.assertEqual(len(self.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -68,7 +68,7 @@ class TestPaths(unittest.TestCase):
         self.assertEqual(
             os.path.join(
                 os.environ["USERPROFILE"],
-                "BookOps Apps\\Overload\\temp\\batch_stats"),
+                "BookOps Apps\\Overload\\temp\\batch_stats.csv"),
             sd.BATCH_STATS)
 
     def test_BATCH_META(self):
@@ -78,6 +78,13 @@ class TestPaths(unittest.TestCase):
                 "BookOps Apps\\Overload\\temp\\batch_meta"),
             sd.BATCH_META)
 
+    def test_BATCH_JOURNAL(self):
+        self.assertEqual(
+            os.path.join(
+                os.environ["USERPROFILE"],
+                "BookOps Apps\\Overload\\temp\\batch_journal.txt"),
+            sd.BATCH_JOURNAL)
+
     def test_GETBIB_REP(self):
         self.assertEqual(
             os.path.join(